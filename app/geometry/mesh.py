@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Triangle meshes read from Wavefront .obj files, as arrays for the solver.
+
+The file is read in chunks of whole lines, and every chunk is parsed with array operations on its bytes : the lines
+are classified by their first bytes, the numbers of the v / vt / vn / f records are read at once, and the polygons
+are triangulated as fans by index arithmetic. The arrays are cached in an .npz file next to the .obj file.
+'''
+
+import os
+import warnings
+import zipfile
+
+import numpy as np
+
+# Bytes read at once
+CHUNK = 1 << 24
+# Index of the missing texture coordinates or normals of a corner
+MISSING = np.iinfo(np.uint32).max
+# Version of the arrays of the cache, a cache of another version is parsed again
+CACHE_VERSION = 1
+
+NEWLINE, SPACE, SLASH, ZERO, HASH = (ord(c) for c in '\n /0#')
+
+
+def _tokens(text):
+    """
+    Whitespace separated tokens of newline terminated lines.
+
+        :param text: uint8 array
+        :return: start of every token, line of every token and number of lines
+    """
+    blank = (text == SPACE) | (text == NEWLINE)
+    start = np.flatnonzero(~blank & np.r_[True, blank[:-1]])
+    newline = np.flatnonzero(text == NEWLINE)
+    return start, np.searchsorted(newline, start), len(newline)
+
+
+def _numbers(text, count, dtype):
+    """
+    The count numbers of text, ValueError if a token is not a number.
+    """
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        values = np.fromstring(text.tobytes(), dtype=dtype, sep=' ')
+    if len(values) != count:
+        raise ValueError("malformed record near " + repr(text[:80].tobytes().decode(errors='replace')))
+    return values
+
+
+def _columns(text, width):
+    """
+    The first width numbers of every line, 0 when a line is shorter.
+    """
+    _, line, n = _tokens(text)
+    per_line = np.bincount(line, minlength=n)
+    values = _numbers(text, len(line), np.float64)
+    first = np.cumsum(per_line) - per_line
+    column = np.arange(width)
+    present = column < per_line[:, np.newaxis]
+    index = np.minimum(first[:, np.newaxis] + column, max(len(values) - 1, 0))
+    return np.where(present, values[index] if len(values) else 0., 0.).astype(np.float32)
+
+
+def _faces(text, before):
+    """
+    Triangles of the polygons of face records, as fans.
+
+        :param text: uint8 bodies of the f records
+        :param before: (F, 3) numbers of v, vt and vn records read before every face, for the negative indices
+        :return: (T, 3, 3) vertex, texture coordinate and normal indices of the corners of the triangles, from 0,
+                 -1 when missing
+    """
+    # v//vn : an empty texture coordinate reads as index 0, which is never valid
+    double = np.flatnonzero((text[:-1] == SLASH) & (text[1:] == SLASH))
+    text = np.insert(text, double + 1, ZERO)
+
+    start, line, n = _tokens(text)
+    slash = text == SLASH
+    corner = np.searchsorted(start, np.flatnonzero(slash), side='right') - 1
+    components = np.bincount(corner, minlength=len(start)) + 1
+    if np.any(components > 3):
+        raise ValueError("malformed face record")
+    text = np.where(slash, SPACE, text).astype(np.uint8)
+    values = _numbers(text, int(components.sum()), np.int64)
+
+    # Vertex, texture coordinate and normal index of every corner, 0 when absent
+    first = np.cumsum(components) - components
+    index = np.zeros((len(start), 3), dtype=np.int64)
+    for k in range(3):
+        has = components > k
+        index[has, k] = values[first[has] + k]
+    index = np.where(index > 0, index - 1, np.where(index < 0, before[line] + index, -1))
+
+    # Fan of every polygon : (c0, c_j, c_j+1) for j = 1 .. size - 2
+    size = np.bincount(line, minlength=n)
+    fans = np.maximum(size - 2, 0)
+    polygon = np.repeat(np.arange(n), fans)
+    offset = np.cumsum(size) - size
+    j = np.arange(fans.sum()) - np.repeat(np.cumsum(fans) - fans, fans) + 1
+    c0 = offset[polygon]
+    return index[np.stack((c0, c0 + j, c0 + j + 1), axis=1)]
+
+
+def _blank_comments(data, newline):
+    """
+    Replace the comments of data, from a # to the end of its line, by spaces, in place.
+    """
+    hashes = np.flatnonzero(data == HASH)
+    if not len(hashes):
+        return
+    line = np.searchsorted(newline, hashes)
+    first = np.r_[True, line[1:] != line[:-1]]
+    # +1 from the first # of a line, -1 at its newline
+    change = np.zeros(len(data) + 1, dtype=np.int8)
+    change[hashes[first]] = 1
+    change[newline[line[first]]] = -1
+    data[np.cumsum(change[:-1], dtype=np.int8) > 0] = SPACE
+
+
+def _parse_chunk(data, counts):
+    """
+    Records of a chunk of whole lines.
+
+        :param data: uint8 array ending with a newline
+        :param counts: numbers of v, vt and vn records of the previous chunks
+        :return: vertices, texture coordinates, normals and triangles of _faces
+    """
+    data = np.where((data == ord('\t')) | (data == ord('\r')), SPACE, data).astype(np.uint8)
+    newline = np.flatnonzero(data == NEWLINE)
+    _blank_comments(data, newline)
+    starts = np.r_[0, newline[:-1] + 1]
+    # First byte of every line after its leading blanks, its newline when it is blank
+    heads = starts.copy()
+    indented = np.flatnonzero(data[heads] == SPACE)
+    while len(indented):
+        heads[indented] += 1
+        indented = indented[data[heads[indented]] == SPACE]
+    padded = np.r_[data, np.full(3, SPACE, dtype=np.uint8)]
+    first, second, third = (padded[heads + k] for k in range(3))
+
+    is_v = (first == ord('v')) & (second == SPACE)
+    is_vt = (first == ord('v')) & (second == ord('t')) & (third == SPACE)
+    is_vn = (first == ord('v')) & (second == ord('n')) & (third == SPACE)
+    is_f = (first == ord('f')) & (second == SPACE)
+
+    # Blank the prefix of the records
+    data[np.r_[heads[is_v | is_f], heads[is_vt | is_vn], heads[is_vt | is_vn] + 1]] = SPACE
+    # Kind of every line, 1 to 4, spread to its bytes as the running sum of its changes
+    kind = (is_v + 2 * is_vt + 3 * is_vn + 4 * is_f).astype(np.int8)
+    change = np.zeros(len(data), dtype=np.int8)
+    change[starts] = np.diff(np.r_[np.int8(0), kind])
+    kind = np.cumsum(change, dtype=np.int8)
+
+    before = np.stack([np.cumsum(k) - k for k in (is_v, is_vt, is_vn)], axis=1) + counts
+    return (_columns(data[kind == 1], 3),
+            _columns(data[kind == 2], 2),
+            _columns(data[kind == 3], 3),
+            _faces(data[kind == 4], before[is_f]))
+
+
+def _chunks(filename, size=CHUNK):
+    """
+    Yield the file as uint8 arrays of whole lines, each ending with a newline.
+    """
+    rest = b''
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(size)
+            if not block:
+                break
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            if end:
+                yield np.frombuffer(block[:end], dtype=np.uint8)
+    if rest:
+        yield np.frombuffer(rest + b'\n', dtype=np.uint8)
+
+
+def read_obj(filename, chunk=CHUNK):
+    """
+    Parse the v, vt, vn and f records of an .obj file, the other records being ignored.
+
+        :param filename: path of the .obj file
+        :param chunk: bytes parsed at once
+        :return: float32 'vertices' (V, 3), 'tex_coords' (VT, 2) and 'normals' (VN, 3), and uint32 'triangles',
+                 'tex_triangles' and 'normal_triangles' (T, 3) indices of the corners, from 0, MISSING when a corner
+                 has no texture coordinate or normal, or one which is not in the file
+        :rtype: dict
+        :raise ValueError: on a malformed record or a vertex index out of range
+    """
+    parts = ([], [], [], [])
+    counts = np.zeros(3, dtype=np.int64)
+    for data in _chunks(filename, chunk):
+        records = _parse_chunk(data, counts)
+        for part, array in zip(parts, records):
+            part.append(array)
+        counts += [len(array) for array in records[:3]]
+
+    vertices, tex_coords, normals = (np.concatenate(p) if p else np.zeros((0, w), dtype=np.float32)
+                                     for p, w in zip(parts[:3], (3, 2, 3)))
+    corners = np.concatenate(parts[3]) if parts[3] else np.zeros((0, 3, 3), dtype=np.int64)
+    arrays = {'vertices': vertices, 'tex_coords': tex_coords, 'normals': normals}
+    for k, (name, n) in enumerate((('triangles', len(vertices)), ('tex_triangles', len(tex_coords)),
+                                   ('normal_triangles', len(normals)))):
+        index = corners[:, :, k]
+        unusable = (index < 0) | (index >= n)
+        if k == 0 and np.any(unusable):
+            raise ValueError(filename + ": vertex index out of range")
+        # The texture coordinates and normals only decorate the faces
+        arrays[name] = np.where(unusable, MISSING, index).astype(np.uint32)
+    return arrays
+
+
+def cache_path(filename):
+    return filename + '.npz'
+
+
+def load_obj_arrays(filename, cache=True):
+    """
+    read_obj, through a cache of the arrays in filename.npz, used while the modification time of the .obj file
+    is the one it was written for.
+
+        :param cache: read and write the cache
+        :rtype: dict
+    """
+    mtime = os.stat(filename).st_mtime_ns
+    path = cache_path(filename)
+    if cache and os.path.exists(path):
+        try:
+            with np.load(path) as stored:
+                if int(stored['version']) == CACHE_VERSION and int(stored['mtime']) == mtime:
+                    return {name: stored[name] for name in stored.files if name not in ('version', 'mtime')}
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # Unreadable cache, parsed again and overwritten
+            pass
+
+    arrays = read_obj(filename)
+    if cache:
+        temporary = path + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(temporary, 'wb') as f:
+                np.savez(f, version=CACHE_VERSION, mtime=mtime, **arrays)
+            os.replace(temporary, path)
+        except OSError:
+            # e.g. a read only directory : the arrays are only parsed every time
+            if os.path.exists(temporary):
+                os.remove(temporary)
+    return arrays
+
+
+def load_obj(filename, cache=True):
+    """
+    Vertices and triangles of the faces of an .obj file, the polygons being triangulated as fans.
+
+        :param filename: path of the .obj file
+        :param cache: see load_obj_arrays
+        :return: float32 (V, 3) vertices and uint32 (T, 3) vertex indices of the triangles, from 0
+        :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    arrays = load_obj_arrays(filename, cache)
+    return arrays['vertices'], arrays['triangles']
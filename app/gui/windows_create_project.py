@@ -39,6 +39,8 @@ class CreateProjectWindows(QDialog):
         self.layout_f = QFormLayout()
         self.layout_f.addRow("Total time", self.tt)
         self.layout_f.addRow("Time step", self.dt)
+        self.l.setPlaceholderText("From the kernel support")
+        self.n.setPlaceholderText("Automatic")
         self.layout_f.addRow("Grid size", self.l)
         self.layout_f.addRow("Number of particles", self.n)
 
@@ -54,6 +56,9 @@ class CreateProjectWindows(QDialog):
     def get_properties(parent=None):
         window = CreateProjectWindows(parent)
         window.exec_()
-        return float(window.tt.text()), float(window.dt.text()), float(window.l.text()), float(window.n.text())
+        # The hash table sizes itself, and takes its cell size from the particles, when they are left empty
+        l = float(window.l.text()) if window.l.text() else None
+        n = int(float(window.n.text())) if window.n.text() else 0
+        return float(window.tt.text()), float(window.dt.text()), l, n
 
 
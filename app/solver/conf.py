@@ -1,4 +1,5 @@
 RADIUS_MULTIPLICATIVE = 5
+KERNEL_MULTIPLICATIVE = 3
 NUM_WORKER = 25                      
 GROUP_BY_LOW = 12                    
                                      
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+'''
+Batched helpers for the vectorized solver : every function works on whole arrays of particles or of pairs.
+'''
+
+import numpy as np
+
+
+def expand_ranges(starts, counts):
+    """
+    Concatenate the ranges [starts[k], starts[k] + counts[k]) into one index array.
+
+        :return: owner of every produced index (k) and the index itself
+        :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    owner = np.repeat(np.arange(len(starts)), counts)
+    first = np.cumsum(counts) - counts
+    index = np.repeat(starts - first, counts) + np.arange(counts.sum())
+    return owner, index
+
+
+def scatter_add(index, values, n):
+    """
+    Sum values (M,) or (M, 3) into n rows according to index.
+    """
+    if values.ndim == 1:
+        return np.bincount(index, weights=values, minlength=n)
+    out = np.empty((n, values.shape[1]))
+    for k in range(values.shape[1]):
+        out[:, k] = np.bincount(index, weights=values[:, k], minlength=n)
+    return out
+
+
+def scatter_pairs(i, j, values_i, values_j, n):
+    """
+    Sum the contributions of unordered pairs to both of their particles : values_i into rows i and values_j into
+    rows j.
+    """
+    return scatter_add(np.concatenate((i, j)), np.concatenate((values_i, values_j)), n)
+
+
+### Kernels, one support radius h per pair
+
+def kernel_by_support(kernel_class, method, h, *arrays):
+    """
+    Evaluate kernel_class(h_k).method on the pairs of every distinct support radius h_k.
+
+        :param kernel_class: m_kern.Kernel subclass
+        :param method: 'evaluate', 'gradient' or 'laplacian'
+        :param h: (M,) support radius of every pair
+        :param arrays: per pair arguments of the method
+    """
+    if len(h) == 0 or np.all(h == h[0]):
+        # A single support, without sorting the pairs
+        return getattr(kernel_class(h[0] if len(h) else 1.), method)(*arrays)
+    supports, inverse = np.unique(h, return_inverse=True)
+    out = None
+    for k, support in enumerate(supports):
+        mask = inverse == k
+        values = getattr(kernel_class(support), method)(*(a[mask] for a in arrays))
+        if out is None:
+            out = np.empty((len(h),) + values.shape[1:])
+        out[mask] = values
+    return out
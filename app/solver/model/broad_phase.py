@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Broad phase of the collisions : only the particles in the cells overlapped by the bounding box of an obstacle are
+tested against it.
+'''
+
+import numpy as np
+
+import app.solver.model.batch as m_batch
+import app.solver.model.cell_key as m_key
+import app.solver.model.collision as m_col
+
+# Largest number of cells along an axis of the bounding box of one obstacle, the cells are enlarged beyond
+MAX_CELLS = 16
+
+
+class BroadPhase(m_col.CollisionObject):
+    """
+    Collision objects culled with a uniform grid.
+
+    The bounding boxes of the obstacles, expanded by a margin, are rasterized once into the cells of the grid.
+    Every step the particles are binned into the same cells, and every obstacle only reacts on the particles of the
+    cells it overlaps. Objects whose colliding locations are not bounded, e.g. containing primitives, react on all
+    the particles. The objects react in their order, as without the broad phase : the particles moved by a reaction
+    are binned again before the next object.
+    """
+    def __init__(self, collisions_objects, cell_size, margin=0.):
+        """
+
+            :param collisions_objects: narrow phase collision objects
+            :param cell_size: size of the cells, enlarged for obstacles spanning more than MAX_CELLS cells
+            :param margin: largest displacement of a particle during a step, the boxes are expanded by it
+            :type cell_size: float
+            :type margin: float
+        """
+        super().__init__()
+        self.__objects = list(collisions_objects)
+        self.__cell_size = cell_size
+        self.__margin = margin
+        self.__builds = 0
+        self.__tests = 0
+        self.__rows = 0
+        self.__build()
+
+    @property
+    def collisions_objects(self):
+        return self.__objects
+
+    @property
+    def cell_size(self):
+        return self.__cell_size
+
+    @property
+    def margin(self):
+        return self.__margin
+
+    @property
+    def statistics(self):
+        """
+        Number of grid builds, and of particles tested by the narrow phase, against the objects times the particles
+        tested without the broad phase.
+        """
+        return {'builds': self.__builds,
+                'tests': self.__tests,
+                'rows': self.__rows,
+                'culled': 1. - self.__tests / self.__rows if self.__rows else 0.}
+
+    def __build(self):
+        boxes = [o.aabb(self.__margin) for o in self.__objects]
+        extent = max((float(np.max(high - low)) for low, high in (b for b in boxes if b is not None)), default=0.)
+        self.__cell_size = max(self.__cell_size, extent / MAX_CELLS)
+        l = self.__cell_size
+
+        # Cells overlapped by every bounded object
+        self.__boxes = boxes
+        cells = []
+        owners = []
+        for k, box in enumerate(boxes):
+            if box is None:
+                continue
+            low = np.floor(box[0] / l).astype(np.int64)
+            high = np.floor(box[1] / l).astype(np.int64)
+            span = [np.arange(low[a], high[a] + 1) for a in range(3)]
+            grid = np.stack(np.meshgrid(*span, indexing='ij'), axis=-1).reshape(-1, 3)
+            cells.append(grid)
+            owners.append(np.full(len(grid), k, dtype=np.intp))
+        self.__cells = np.concatenate(cells) if cells else np.zeros((0, 3), dtype=np.int64)
+        self.__owners = np.concatenate(owners) if owners else np.zeros(0, dtype=np.intp)
+        self.__builds += 1
+
+    def reserve(self, margin):
+        """
+        Make sure the boxes are expanded by at least margin, rebuilding the grid with twice margin if they are not.
+        """
+        if margin > self.__margin:
+            self.__margin = 2 * margin
+            self.__build()
+
+    def candidates(self, positions):
+        """
+        Particles to test against every object.
+
+            :param positions: (N, 3) locations
+            :return: one sorted index array per object, None for the objects testing every particle
+            :rtype: list
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        candidates = [None if box is None else np.zeros(0, dtype=np.intp) for box in self.__boxes]
+        if len(positions) == 0 or len(self.__cells) == 0:
+            return candidates
+        cell = np.floor(positions / self.__cell_size).astype(np.int64)
+        origin = np.minimum(cell.min(axis=0), self.__cells.min(axis=0)) + m_key.KEY_OFFSET
+        try:
+            particle_keys = m_key.pack(cell - origin)
+            object_keys = m_key.pack(self.__cells - origin)
+        except ValueError:
+            # Particles too far from the obstacles for the keys, every bounded object tests every particle
+            return [np.arange(len(positions)) if c is not None else None for c in candidates]
+
+        # Objects of the cell of every particle, as (particle, object) pairs
+        sort = np.argsort(object_keys, kind='stable')
+        object_keys = object_keys[sort]
+        start = np.searchsorted(object_keys, particle_keys, side='left')
+        stop = np.searchsorted(object_keys, particle_keys, side='right')
+        particle, index = m_batch.expand_ranges(start, stop - start)
+        owner = self.__owners[sort][index]
+
+        by_owner = np.lexsort((particle, owner))
+        particle, owner = particle[by_owner], owner[by_owner]
+        bounds = np.searchsorted(owner, np.arange(len(self.__objects) + 1))
+        for k in range(len(self.__objects)):
+            if candidates[k] is not None:
+                candidates[k] = particle[bounds[k]:bounds[k + 1]]
+        return candidates
+
+    ### Collision object surface
+
+    def detect(self, x):
+        return any(o.detect(x) for o in self.__objects)
+
+    def react_batch(self, positions, velocities, dt, cr):
+        n = len(positions)
+        cr = np.broadcast_to(cr, (n,))
+        collided = np.zeros(n, dtype=bool)
+        # Particles moved by a reaction since the candidates were computed
+        moved = np.zeros(n, dtype=bool)
+        candidates = self.candidates(positions)
+        extra = [[] for coll_obj in self.__objects]
+        for k, coll_obj in enumerate(self.__objects):
+            self.__rows += n
+            if candidates[k] is None:
+                self.__tests += n
+                mask = coll_obj.react_batch(positions, velocities, dt, cr)
+                collided |= mask
+                moved |= mask
+                continue
+            if moved.any():
+                # Bin the moved particles again, for this object and the following ones
+                rows = np.flatnonzero(moved)
+                for j, index in enumerate(self.candidates(positions[rows])[k:], k):
+                    if index is not None and len(index):
+                        extra[j].append(rows[index])
+                moved[:] = False
+            index = candidates[k]
+            if extra[k]:
+                index = np.unique(np.concatenate([index] + extra[k]))
+            self.__tests += len(index)
+            if len(index) == 0:
+                continue
+            position, velocity = positions[index], velocities[index]
+            mask = coll_obj.react_batch(position, velocity, dt, cr[index])
+            positions[index] = position
+            velocities[index] = velocity
+            collided[index[mask]] = True
+            moved[index[mask]] = True
+        return collided
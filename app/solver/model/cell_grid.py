@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+from math import *
+
+import numpy as np
+
+import app.solver.model.batch as m_batch
+import app.solver.model.vector as m_vec
+
+
+def cell_offsets(reach):
+    """
+    Offsets of the (2 * reach + 1) ** 3 cells surrounding a cell, the cell itself included.
+    """
+    span = range(-reach, reach + 1)
+    return np.array([[x, y, z] for x in span for y in span for z in span], dtype=np.int64)
+
+
+class CellGrid(object):
+    """
+    Sorted cell list.
+
+    Particles are sorted (stable argsort) by the key of their cell, its linear index over the bounding box of the
+    particles. Only the occupied cells are stored : the particles of the occupied cell k are the contiguous slice
+    order[cell_start[k]:cell_end[k]], and the slice of any cell is found by binary search of its key, so the memory
+    does not grow with the extent of the particles. The grid is rebuilt lazily from the current locations after
+    insertions, removals and updates.
+
+    It offers the insert / remove / update / search surface of Hash, so it can be the acceleration structure of
+    ActiveParticle objects, and can also be built directly from an array of positions.
+    """
+    def __init__(self, l, n=0):
+        """
+        l : cell size
+        n : expected number of particles
+        """
+        self.__l = l
+        self.__objects = []
+        self.__row = {}
+        self.__dirty = True
+
+        self.__position = np.zeros((0, 3))
+        self.__cell = np.zeros((0, 3), dtype=np.int64)
+        self.__origin = np.zeros(3, dtype=np.int64)
+        self.__dims = np.ones(3, dtype=np.int64)
+        self.__reach = 1
+        self.__order = np.zeros(0, dtype=np.intp)
+        self.__sorted_keys = np.zeros(0, dtype=np.int64)
+        self.__cell_keys = np.zeros(0, dtype=np.int64)
+        self.__particle_cell = np.zeros(0, dtype=np.intp)
+        self.__cell_start = np.zeros(0, dtype=np.intp)
+        self.__cell_end = np.zeros(0, dtype=np.intp)
+
+    @property
+    def l(self):
+        return self.__l
+
+    @property
+    def order(self):
+        """
+        Particle indices sorted by cell.
+        """
+        self.__build_if_dirty()
+        return self.__order
+
+    @property
+    def cell_keys(self):
+        """
+        Keys of the occupied cells, increasing.
+        """
+        self.__build_if_dirty()
+        return self.__cell_keys
+
+    @property
+    def cell_start(self):
+        self.__build_if_dirty()
+        return self.__cell_start
+
+    @property
+    def cell_end(self):
+        self.__build_if_dirty()
+        return self.__cell_end
+
+    @property
+    def hash_table(self):
+        """
+        Occupied cells, by cell key, for the callers walking the buckets of a Hash.
+        """
+        self.__build_if_dirty()
+        table = {}
+        for key, start, end in zip(self.__cell_keys, self.__cell_start, self.__cell_end):
+            table[int(key)] = [self.__objects[k] for k in self.__order[start:end]]
+        return table
+
+    ### Construction
+
+    def build(self, position, reach=1):
+        """
+        Sort positions by cell.
+
+            :param position: (N, 3) locations
+            :param reach: number of cells around every cell that neighbour queries may visit
+        """
+        position = np.asarray(position, dtype=np.float64).reshape(-1, 3)
+        self.__position = position
+        self.__reach = reach
+        cell = np.floor(position / self.__l).astype(np.int64)
+        if len(cell):
+            # Pad the grid by reach cells, so that the cells around any particle are inside it
+            self.__origin = cell.min(axis=0) - reach
+            self.__dims = cell.max(axis=0) - self.__origin + reach + 1
+        else:
+            self.__origin = np.zeros(3, dtype=np.int64)
+            self.__dims = np.ones(3, dtype=np.int64)
+        self.__cell = cell - self.__origin
+        if np.prod(self.__dims.astype(object)) >= 1 << 63:
+            raise ValueError("the particles span too many cells for int64 cell keys")
+
+        # Sort by cell key, and keep the slice of every occupied cell
+        key = self.__linear(self.__cell)
+        self.__order = np.argsort(key, kind='stable')
+        self.__sorted_keys = key[self.__order]
+        first = np.flatnonzero(np.r_[True, self.__sorted_keys[1:] != self.__sorted_keys[:-1]]) if len(key) else \
+            np.zeros(0, dtype=np.intp)
+        self.__cell_keys = self.__sorted_keys[first]
+        self.__cell_start = first
+        self.__cell_end = np.r_[first[1:], len(key)].astype(np.intp)
+        # Occupied cell of every particle
+        self.__particle_cell = np.empty(len(key), dtype=np.intp)
+        self.__particle_cell[self.__order] = np.cumsum(np.r_[False, self.__sorted_keys[1:] != self.__sorted_keys[:-1]])
+        self.__dirty = False
+
+    def __linear(self, cell):
+        return (cell[..., 0] * self.__dims[1] + cell[..., 1]) * self.__dims[2] + cell[..., 2]
+
+    def __slice(self, first, last):
+        """
+        Start and end in order of the particles of the cells with a key in [first, last].
+        """
+        return (np.searchsorted(self.__sorted_keys, first, side='left'),
+                np.searchsorted(self.__sorted_keys, last, side='right'))
+
+    def __build_if_dirty(self):
+        if self.__dirty:
+            position = [o.current_location.value for o in self.__objects]
+            self.build(position, self.__reach)
+
+    def rebuild(self):
+        self.__dirty = True
+        self.__build_if_dirty()
+
+    ### Hash surface
+
+    def insert(self, _object):
+        """
+        Insert a new particle in the volume
+        """
+        self.__row[id(_object)] = len(self.__objects)
+        self.__objects.append(_object)
+        self.__dirty = True
+
+    def remove(self, _object):
+        """
+        Remove a particle, by moving the last particle into its slot
+        """
+        k = self.__row.pop(id(_object), None)
+        if k is None:
+            raise ValueError("particle not in the grid")
+        last = self.__objects.pop()
+        if last is not _object:
+            self.__objects[k] = last
+            self.__row[id(last)] = k
+        self.__dirty = True
+
+    def update(self, _object):
+        """
+        Update the particles in the volume
+        """
+        self.__dirty = True
+
+    def rebin(self):
+        """
+        Account for the particles having moved to their current location, the grid is sorted again lazily
+        """
+        self.__dirty = True
+
+    def compute_r_chap(self, _object, future=False):
+        """
+        Cell coordinates of a particle
+        """
+        l = self.__l
+        location = _object.future_location.value if future else _object.current_location.value
+        return m_vec.Vector([floor(location[0] / l), floor(location[1] / l), floor(location[2] / l)])
+
+    def cell_slice(self, x, y, z):
+        """
+        Indices of the particles of the cell (x, y, z), as a contiguous slice of order.
+        """
+        self.__build_if_dirty()
+        local = np.array([x, y, z], dtype=np.int64) - self.__origin
+        if np.any(local < 0) or np.any(local >= self.__dims):
+            return self.__order[0:0]
+        key = self.__linear(local)
+        start, end = self.__slice(key, key)
+        return self.__order[start:end]
+
+    def query(self, x, y, z):
+        """
+        Particles of the cell (x, y, z)
+        """
+        indices = self.cell_slice(x, y, z)
+        if len(indices):
+            return [self.__objects[k] for k in indices]
+
+    def search(self, _object, kernel_h, approx=True):
+        """
+        Particles of the cells within kernel_h of the cell of _object, filtered by distance unless approx
+        """
+        self.__build_if_dirty()
+        k = self.__row[id(_object)]
+        candidates = self.candidates(self.__position[k], kernel_h)
+        if not approx:
+            r = self.__position[candidates] - self.__position[k]
+            candidates = candidates[np.einsum('ij,ij->i', r, r) < kernel_h ** 2]
+        return [self.__objects[j] for j in candidates]
+
+    def candidates(self, location, kernel_h):
+        """
+        Indices of the particles of the cells overlapping the cube of half side kernel_h around location.
+        """
+        self.__build_if_dirty()
+        l = self.__l
+        low = np.floor((np.asarray(location) - kernel_h) / l).astype(np.int64) - self.__origin
+        high = np.floor((np.asarray(location) + kernel_h) / l).astype(np.int64) - self.__origin
+        low = np.maximum(low, 0)
+        high = np.minimum(high, self.__dims - 1)
+        slices = []
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                # Cells along z are consecutive, so a row of cells is one contiguous slice
+                first = self.__linear(np.array([x, y, low[2]]))
+                last = self.__linear(np.array([x, y, high[2]]))
+                if last >= first:
+                    start, end = self.__slice(first, last)
+                    slices.append(self.__order[start:end])
+        if not slices:
+            return np.zeros(0, dtype=np.intp)
+        return np.concatenate(slices)
+
+    ### Batched queries
+
+    def neighbour_pairs(self, search_radius):
+        """
+        Every ordered pair (i, j), i == j included, such that |x_i - x_j| < search_radius[i], for the positions of
+        the last build.
+
+            :return: i, j, r_ij = x_i - x_j and |r_ij|, sorted by i then j
+        """
+        self.__build_if_dirty()
+        position = self.__position
+        if len(position) == 0:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty, np.zeros((0, 3)), np.zeros(0)
+        reach = int(ceil(float(np.max(search_radius)) / self.__l))
+        if reach > self.__reach:
+            self.build(position, reach)
+
+        i_list = []
+        j_list = []
+        for offset in cell_offsets(reach):
+            # The key is linear in the cell : the neighbour cells of the occupied cells are increasing keys too
+            key = self.__cell_keys + self.__linear(offset)
+            k = np.minimum(np.searchsorted(self.__cell_keys, key), len(self.__cell_keys) - 1)
+            found = self.__cell_keys[k] == key
+            start = np.where(found, self.__cell_start[k], 0)[self.__particle_cell]
+            count = np.where(found, self.__cell_end[k] - self.__cell_start[k], 0)[self.__particle_cell]
+            owner, index = m_batch.expand_ranges(start, count)
+            i_list.append(owner)
+            j_list.append(self.__order[index])
+        i = np.concatenate(i_list)
+        j = np.concatenate(j_list)
+
+        r = position[i] - position[j]
+        distance = np.sqrt(np.einsum('ij,ij->i', r, r))
+        keep = distance < search_radius[i]
+        i, j, r, distance = i[keep], j[keep], r[keep], distance[keep]
+
+        # Sort by particle then by neighbour, so that sums are accumulated in a reproducible order
+        order = np.lexsort((j, i))
+        return i[order], j[order], r[order], distance[order]
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Exact keys of the cells of a spatial hash, and the open addressing table holding the buckets of a Hash built with
+them. Unlike the XOR of primes modulo n_h, two distinct cells never share a key, hence never share a bucket.
+'''
+
+import numpy as np
+
+# Bits per cell coordinate : three coordinates fit in the 63 non negative bits of an int64
+KEY_BITS = 21
+KEY_OFFSET = 1 << (KEY_BITS - 1)
+
+EMPTY = -1
+TOMBSTONE = -2
+
+MAX_LOAD = 0.5
+MIN_LOAD = 0.0625
+MIN_CAPACITY = 8
+MASK_64 = (1 << 64) - 1
+FIBONACCI = 0x9E3779B97F4A7C15
+
+
+def _biased(r_chap):
+    """
+    Cell coordinates shifted to [0, 2 ** KEY_BITS), as uint64.
+    """
+    r_chap = np.asarray(r_chap, dtype=np.int64).reshape(-1, 3) + KEY_OFFSET
+    if np.any(r_chap < 0) or np.any(r_chap >= 1 << KEY_BITS):
+        raise ValueError("cell coordinates out of the range of the keys")
+    return r_chap.astype(np.uint64)
+
+
+def pack(r_chap):
+    """
+    Keys of (N, 3) cell coordinates, one coordinate per group of KEY_BITS bits.
+
+        :rtype: numpy.ndarray of int64
+    """
+    r = _biased(r_chap)
+    key = (r[:, 0] << np.uint64(2 * KEY_BITS)) | (r[:, 1] << np.uint64(KEY_BITS)) | r[:, 2]
+    return key.astype(np.int64)
+
+
+def _spread(v):
+    """
+    Insert two zero bits between the KEY_BITS low bits of v.
+    """
+    v = v & np.uint64(0x1fffff)
+    v = (v | v << np.uint64(32)) & np.uint64(0x1f00000000ffff)
+    v = (v | v << np.uint64(16)) & np.uint64(0x1f0000ff0000ff)
+    v = (v | v << np.uint64(8)) & np.uint64(0x100f00f00f00f00f)
+    v = (v | v << np.uint64(4)) & np.uint64(0x10c30c30c30c30c3)
+    v = (v | v << np.uint64(2)) & np.uint64(0x1249249249249249)
+    return v
+
+
+def morton(r_chap):
+    """
+    Morton codes (Z-order) of (N, 3) cell coordinates : the bits of the coordinates are interleaved, so cells close
+    in space have close keys.
+
+        :rtype: numpy.ndarray of int64
+    """
+    r = _biased(r_chap)
+    key = _spread(r[:, 0]) | (_spread(r[:, 1]) << np.uint64(1)) | (_spread(r[:, 2]) << np.uint64(2))
+    return key.astype(np.int64)
+
+
+KEYS = {'packed': pack, 'morton': morton}
+
+
+class CellTable(object):
+    """
+    Open addressing table from exact cell keys to buckets, with linear probing.
+
+    Keys are stored in a power of two int64 array, their home slot being given by Fibonacci hashing. Removed keys
+    leave a tombstone. The table is rebuilt twice as large once the occupied and removed slots exceed MAX_LOAD, and
+    half as large once the occupied slots fall under MIN_LOAD.
+    It offers the mapping surface a Hash uses on its defaultdict : reading a missing key creates an empty bucket.
+    """
+    def __init__(self, n=0):
+        """
+        n : expected number of cells
+        """
+        capacity = MIN_CAPACITY
+        while capacity * MAX_LOAD < n:
+            capacity *= 2
+        self.__allocate(capacity)
+        self.__grows = 0
+        self.__shrinks = 0
+
+    def __allocate(self, capacity):
+        self.__keys = np.full(capacity, EMPTY, dtype=np.int64)
+        self.__buckets = [None] * capacity
+        self.__bits = capacity.bit_length() - 1
+        self.__count = 0
+        self.__used = 0
+
+    @property
+    def capacity(self):
+        return len(self.__keys)
+
+    def __home(self, key):
+        return ((key * FIBONACCI) & MASK_64) >> (64 - self.__bits)
+
+    def __probe(self, key):
+        """
+        Slot of key, or the slot where it would be inserted, and the length of the probe sequence.
+        """
+        mask = len(self.__keys) - 1
+        slot = self.__home(key)
+        free = None
+        probes = 1
+        while True:
+            k = self.__keys[slot]
+            if k == key:
+                return slot, probes
+            if k == EMPTY:
+                return (slot if free is None else free), probes
+            if k == TOMBSTONE and free is None:
+                free = slot
+            slot = (slot + 1) & mask
+            probes += 1
+
+    def __resize(self, capacity):
+        items = list(self.items())
+        self.__allocate(capacity)
+        for key, bucket in items:
+            slot, _ = self.__probe(key)
+            self.__keys[slot] = key
+            self.__buckets[slot] = bucket
+            self.__count += 1
+            self.__used += 1
+
+    def __grow(self):
+        if self.__count + 1 > len(self.__keys) * MAX_LOAD / 2:
+            self.__resize(2 * len(self.__keys))
+            self.__grows += 1
+        else:
+            # Mostly tombstones, they are dropped at the same size
+            self.__resize(len(self.__keys))
+
+    ### Mapping surface
+
+    def __len__(self):
+        return self.__count
+
+    def __contains__(self, key):
+        slot, _ = self.__probe(int(key))
+        return self.__keys[slot] == key
+
+    def __getitem__(self, key):
+        key = int(key)
+        slot, _ = self.__probe(key)
+        if self.__keys[slot] != key:
+            if self.__used + 1 > len(self.__keys) * MAX_LOAD:
+                self.__grow()
+                slot, _ = self.__probe(key)
+            if self.__keys[slot] == EMPTY:
+                self.__used += 1
+            self.__keys[slot] = key
+            self.__buckets[slot] = []
+            self.__count += 1
+        return self.__buckets[slot]
+
+    def __delitem__(self, key):
+        key = int(key)
+        slot, _ = self.__probe(key)
+        if self.__keys[slot] != key:
+            raise KeyError(key)
+        self.__keys[slot] = TOMBSTONE
+        self.__buckets[slot] = None
+        self.__count -= 1
+        if self.__count < len(self.__keys) * MIN_LOAD and len(self.__keys) > MIN_CAPACITY:
+            self.__resize(len(self.__keys) // 2)
+            self.__shrinks += 1
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [int(k) for k in self.__keys[self.__keys >= 0]]
+
+    def values(self):
+        return [self.__buckets[s] for s in np.flatnonzero(self.__keys >= 0)]
+
+    def items(self):
+        return [(int(self.__keys[s]), self.__buckets[s]) for s in np.flatnonzero(self.__keys >= 0)]
+
+    ### Statistics
+
+    @property
+    def statistics(self):
+        """
+        Size of the table and length of the probe sequences of the stored keys.
+        """
+        probes = [self.__probe(k)[1] for k in self.keys()]
+        return {'capacity': len(self.__keys),
+                'cells': self.__count,
+                'load_factor': self.__count / len(self.__keys),
+                'tombstones': self.__used - self.__count,
+                'grows': self.__grows,
+                'shrinks': self.__shrinks,
+                'mean_probe': float(np.mean(probes)) if probes else 0.,
+                'max_probe': max(probes, default=0)}
@@ -33,6 +33,53 @@ class CollisionObject(object):
     def detect(self, x):
         pass
 
+    def bounding_box(self):
+        """
+        Axis aligned bounding box of the object, None when it is not bounded.
+
+            :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        return None
+
+    def aabb(self, margin=0.):
+        """
+        Axis aligned box holding every location which may collide with the object, expanded by margin, None when
+        these locations are not bounded.
+
+            :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        return None
+
+    def contact(self, x):
+        """
+        Contact point, penetration depth and contact normal of a colliding location x.
+
+            :rtype: (vector, float, vector)
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def reaction_speed(u, cr, d, n_cp, dt):
+        """
+        Speed after the collision, for a penetration d along the contact normal n_cp.
+        """
+        norm = math.sqrt(np.dot(u, u))
+        if norm == 0:
+            return u
+        return u - (1 + cr * d / (dt * norm)) * np.dot(u, n_cp) * n_cp
+
+    @staticmethod
+    def reaction_speed_batch(u, cr, d, n_cp, dt):
+        """
+        reaction_speed for (N, 3) speeds, (N,) depths and (N, 3) normals. cr is a scalar or a (N,) array.
+        """
+        norm = np.sqrt(np.einsum('ij,ij->i', u, u))
+        moving = norm > 0
+        factor = np.zeros_like(norm)
+        cr = np.broadcast_to(cr, norm.shape)
+        factor[moving] = (1 + cr[moving] * d[moving] / (dt * norm[moving])) * np.einsum('ij,ij->i', u, n_cp)[moving]
+        return u - factor[:, np.newaxis] * n_cp
+
     @staticmethod
     def reaction(particle, cp, d, n_cp, dt):
         u = particle.future_speed.value
@@ -46,12 +93,65 @@ class CollisionObject(object):
     def react(self, particle, dt):
         pass
 
+    def detect_batch(self, positions):
+        """
+        detect of (N, 3) locations.
+
+            :return: mask of the colliding locations
+            :rtype: numpy.ndarray
+        """
+        return np.array([bool(self.detect(m_vec.Vector(x))) for x in positions], dtype=bool).reshape(-1)
+
+    def contact_batch(self, positions):
+        """
+        contact of (N, 3) colliding locations.
+
+            :return: (N, 3) contact points, (N,) penetration depths and (N, 3) contact normals
+            :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        """
+        cp = np.empty((len(positions), 3))
+        d = np.empty(len(positions))
+        n_cp = np.empty((len(positions), 3))
+        for i, x in enumerate(positions):
+            cp[i], d[i], n_cp[i] = self.contact(m_vec.Vector(x))
+        return cp, d, n_cp
+
+    def collide_batch(self, positions):
+        """
+        Colliding locations among (N, 3) locations, with their contact points, penetration depths and normals.
+
+            :return: mask, then the contact of the masked locations
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        mask = self.detect_batch(positions)
+        return (mask,) + self.contact_batch(positions[mask])
+
+    def react_batch(self, positions, velocities, dt, cr):
+        """
+        Apply the collision response to (N, 3) future locations and speeds, in place.
+
+            :param cr: collision coefficient, scalar or one per particle
+            :return: mask of the colliding particles
+            :rtype: numpy.ndarray
+        """
+        mask, cp, d, n_cp = self.collide_batch(positions)
+        if not mask.any():
+            return mask
+        cr = np.broadcast_to(cr, mask.shape)[mask]
+        velocities[mask] = self.reaction_speed_batch(velocities[mask], cr, d, n_cp, dt)
+        positions[mask] = cp
+        return mask
+
 
 class ImplicitPrimitive(CollisionObject):
     def __init__(self, cr_co=1, is_containing=True):
         super().__init__(cr_co)
         self.__is_containing = is_containing
 
+    @property
+    def is_containing(self):
+        return self.__is_containing
+
     def implicit_function(self, x):
         assert isinstance(x, m_vec.Vector)
         return 0
@@ -62,6 +162,26 @@ class ImplicitPrimitive(CollisionObject):
         f_neg = (f < 0)
         return (is_c and not f_neg) or (not is_c and f_neg)
 
+    def aabb(self, margin=0.):
+        if self.__is_containing:
+            # Every location outside of the primitive collides
+            return None
+        box = self.bounding_box()
+        if box is None:
+            return None
+        low, high = box
+        return low - margin, high + margin
+
+    def implicit_function_batch(self, positions):
+        """
+        implicit_function of (N, 3) locations.
+        """
+        return np.array([self.implicit_function(m_vec.Vector(x)) for x in positions], dtype=np.float64)
+
+    def detect_batch(self, positions):
+        f = self.implicit_function_batch(np.asarray(positions, dtype=np.float64).reshape(-1, 3))
+        return (f >= 0) if self.__is_containing else (f < 0)
+
 
 class Sphere(ImplicitPrimitive):
     def __init__(self, center, radius, cr_co=1, is_containing=True):
@@ -74,29 +194,55 @@ class Sphere(ImplicitPrimitive):
         r = self.__radius
         return (x - c) ** 2 - r ** 2
 
-    def react(self, particle, dt):
-        assert isinstance(particle, m_part.ActiveParticle)
-        x = particle.future_location.value
+    def contact(self, x):
         c = self.__center
         r = self.__radius
         f = self.implicit_function(x)
 
-        if self.detect(x):
-            cp = c + r * (x - c) / (x - c).norm()
-            d = math.fabs((x - c).norm() - r)
-            n_cp = math.copysign(1, f) * (x - c) / (c - x).norm()
+        cp = c + r * (x - c) / (x - c).norm()
+        d = math.fabs((x - c).norm() - r)
+        n_cp = math.copysign(1, f) * (x - c) / (c - x).norm()
+        return cp, d, n_cp
 
+    def react(self, particle, dt):
+        assert isinstance(particle, m_part.ActiveParticle)
+        x = particle.future_location.value
+
+        if self.detect(x):
+            cp, d, n_cp = self.contact(x)
             self.reaction(particle, cp, d, n_cp, dt)
         else:
             particle.reaction_location.value = particle.future_location.value
             particle.reaction_speed.value = particle.future_location.speed
 
+    def bounding_box(self):
+        c = np.asarray(self.__center, dtype=np.float64)
+        return c - self.__radius, c + self.__radius
+
+    def implicit_function_batch(self, positions):
+        offset = positions - np.asarray(self.__center, dtype=np.float64)
+        return np.einsum('ij,ij->i', offset, offset) - self.__radius ** 2
+
+    def contact_batch(self, positions):
+        c = np.asarray(self.__center, dtype=np.float64)
+        r = self.__radius
+        offset = np.asarray(positions, dtype=np.float64).reshape(-1, 3) - c
+        distance = np.sqrt(np.einsum('ij,ij->i', offset, offset))
+        # At the centre every direction is the closest one : +z is taken
+        centre = distance == 0
+        direction = offset / np.where(centre, 1., distance)[:, np.newaxis]
+        direction[centre] = (0., 0., 1.)
+        cp = c + r * direction
+        d = np.abs(distance - r)
+        n_cp = np.where(distance < r, -1., 1.)[:, np.newaxis] * direction
+        return cp, d, n_cp
+
 
 class Box(ImplicitPrimitive):
-    def __init__(self, c, r, e, cr_co=1):
+    def __init__(self, c, r, e, cr_co=1, is_containing=True):
         assert isinstance(e, m_vec.Vector)
         assert isinstance(r, m_vec.Vector)
-        super().__init__(cr_co)
+        super().__init__(cr_co, is_containing)
         self.__center = c
         self.__rotation = r
         self.__axis_extends = e
@@ -149,20 +295,70 @@ class Box(ImplicitPrimitive):
         ext = self.__axis_extends
         return (m_vec.Vector(np.abs(x_loc)) - ext).a_max()
 
-    def react(self, particle, dt):
-        assert isinstance(particle, m_part.ActiveParticle)
-        x = particle.future_location.value
+    def detect(self, x):
+        return super().detect(self.__x_local(x))
+
+    def bounding_box(self):
+        c = np.asarray(self.__center, dtype=np.float64)
+        half = np.abs(self.__rotation) @ np.asarray(self.__axis_extends, dtype=np.float64)
+        return c - half, c + half
+
+    def __surface_local(self, x_loc):
+        """
+        Closest point of the faces of the box to (N, 3) local locations : the clamped location outside of the box,
+        the projection on the nearest face inside of it.
+        """
+        a = np.asarray(self.__axis_extends, dtype=np.float64)
+        cp_loc = np.minimum(a, np.maximum(-a, x_loc))
+        inside = np.all(np.abs(x_loc) < a, axis=1)
+        if inside.any():
+            x_in = x_loc[inside]
+            rows = np.arange(len(x_in))
+            k = np.argmax(np.abs(x_in) - a, axis=1)
+            x_in[rows, k] = np.where(x_in[rows, k] < 0, -a[k], a[k])
+            cp_loc[inside] = x_in
+        return cp_loc
+
+    def contact(self, x):
         r = self.__rotation
         c = self.__center
-        a = self.__axis_extends
         x_loc = self.__x_local(x)
 
+        cp_loc = self.__surface_local(np.asarray(x_loc, dtype=np.float64).reshape(1, 3))[0]
+        cp = c + np.dot(r, cp_loc)
+        d = np.abs(m_vec.Vector(cp - x).norm())
+        vec = np.dot(r, (cp_loc - x_loc))
+        n_cp = vec * 1 / np.sqrt(vec.dot(vec))
+        return cp, d, n_cp
+
+    ### Batches : the rows of (N, 3) arrays are rotated with x_loc = (x - c) R, i.e. R^T (x - c) for every row
+
+    def implicit_function_batch(self, positions):
+        x_loc = (positions - np.asarray(self.__center, dtype=np.float64)) @ self.__rotation
+        return np.max(np.abs(x_loc) - np.asarray(self.__axis_extends, dtype=np.float64), axis=1)
+
+    def contact_batch(self, positions):
+        r = self.__rotation
+        c = np.asarray(self.__center, dtype=np.float64)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        x_loc = (positions - c) @ r
+
+        cp_loc = self.__surface_local(x_loc)
+        cp = c + cp_loc @ self.__rotation_t
+        vec = (cp_loc - x_loc) @ self.__rotation_t
+        d = np.sqrt(np.einsum('ij,ij->i', vec, vec))
+        # A location on the faces has no direction of contact, nor a penetration
+        n_cp = np.zeros_like(vec)
+        inside = d > 0
+        n_cp[inside] = vec[inside] / d[inside, np.newaxis]
+        return cp, d, n_cp
+
+    def react(self, particle, dt):
+        assert isinstance(particle, m_part.ActiveParticle)
+        x = particle.future_location.value
+
         if self.detect(x):
-            cp_loc = np.minimum(a, np.maximum(-a, x_loc))
-            cp = c + np.dot(r, cp_loc)
-            d = np.abs((cp - x).norm())
-            vec = np.dot(np.sign(r), (cp_loc - x_loc))
-            n_cp = vec * 1 / np.sqrt(vec.dot(vec))
+            cp, d, n_cp = self.contact(x)
             self.reaction(particle, cp, d, n_cp, dt)
 
 
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Collision object sampling a signed distance once into a 3D grid, for geometries expensive to evaluate.
+'''
+
+import json
+
+import numpy as np
+
+import app.solver.model.collision as m_col
+
+# Nodes evaluated at once while sampling
+CHUNK = 1 << 18
+
+
+def _npy(path):
+    return path if path.endswith(".npy") else path + ".npy"
+
+
+class SignedDistanceGrid(m_col.ImplicitPrimitive):
+    """
+    Signed distance phi sampled on the nodes of a regular grid, with its gradient.
+
+    phi is negative inside of the shape and positive outside of it, as the implicit functions of the primitives. Both
+    are read back by trilinear interpolation : the contact point of x is x - phi grad(phi) / |grad(phi)|. The grid
+    must hold the locations of the particles, a location outside of it is evaluated at the nearest node of the
+    grid, its distance to the grid being added to phi.
+    """
+    def __init__(self, field, origin, spacing, cr_co=1, is_containing=True):
+        """
+
+            :param field: (nx, ny, nz, 4) phi and its gradient on the nodes, the node (i, j, k) being at
+                          origin + (i, j, k) * spacing
+            :param origin: location of the first node
+            :param spacing: distance between two nodes
+            :type field: numpy.ndarray, possibly memory-mapped
+            :type spacing: float
+        """
+        super().__init__(cr_co, is_containing)
+        assert field.ndim == 4 and field.shape[3] == 4 and min(field.shape[:3]) >= 2
+        self.__field = field
+        self.__origin = np.asarray(origin, dtype=np.float64)
+        self.__spacing = float(spacing)
+        self.__shape = np.array(field.shape[:3])
+
+    @property
+    def field(self):
+        return self.__field
+
+    @property
+    def origin(self):
+        return self.__origin
+
+    @property
+    def spacing(self):
+        return self.__spacing
+
+    @property
+    def shape(self):
+        return tuple(self.__shape)
+
+    ### Construction
+
+    @classmethod
+    def from_function(cls, function, low, high, spacing, dtype=np.float64, **kwargs):
+        """
+        Sample a signed distance function on the grid of the box [low, high].
+
+            :param function: signed distance of (N, 3) locations
+            :param kwargs: cr_co and is_containing of the collision object
+        """
+        low = np.asarray(low, dtype=np.float64)
+        shape = np.ceil((np.asarray(high, dtype=np.float64) - low) / spacing).astype(int) + 1
+        shape = np.maximum(shape, 2)
+        phi = np.empty(int(np.prod(shape)), dtype=np.float64)
+        nodes = np.indices(shape).reshape(3, -1).T
+        for start in range(0, len(phi), CHUNK):
+            phi[start:start + CHUNK] = function(low + nodes[start:start + CHUNK] * spacing)
+        phi = phi.reshape(shape)
+
+        field = np.empty(tuple(shape) + (4,), dtype=dtype)
+        field[..., 0] = phi
+        for axis, gradient in enumerate(np.gradient(phi, spacing)):
+            field[..., axis + 1] = gradient
+        return cls(field, low, spacing, **kwargs)
+
+    @classmethod
+    def from_primitive(cls, primitive, low, high, spacing, dtype=np.float64):
+        """
+        Sample an ImplicitPrimitive : phi is the distance to its contact point, with the sign of its implicit
+        function.
+        """
+        def signed_distance(x):
+            f = primitive.implicit_function_batch(x)
+            _, d, _ = primitive.contact_batch(x)
+            return np.where(f < 0, -d, d)
+        return cls.from_function(signed_distance, low, high, spacing, dtype, is_containing=primitive.is_containing)
+
+    def save(self, path):
+        """
+        Write the grid to path, a .npy file which load can memory-map, and its parameters to path.json.
+        """
+        path = _npy(path)
+        np.save(path, self.__field)
+        with open(path + ".json", "w") as f:
+            json.dump({'origin': self.__origin.tolist(), 'spacing': self.__spacing,
+                       'is_containing': self.is_containing}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Read a grid written by save, memory-mapped unless mmap is False so that only the pages read are loaded.
+        """
+        path = _npy(path)
+        with open(path + ".json") as f:
+            parameters = json.load(f)
+        field = np.load(path, mmap_mode='r' if mmap else None)
+        return cls(field, parameters['origin'], parameters['spacing'], is_containing=parameters['is_containing'])
+
+    ### Queries
+
+    def sample(self, positions):
+        """
+        phi and its gradient at (N, 3) locations, by trilinear interpolation.
+
+            :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        g = (positions - self.__origin) / self.__spacing
+        clamped = np.clip(g, 0, self.__shape - 1)
+        i = np.minimum(np.floor(clamped).astype(np.intp), self.__shape - 2)
+        t = clamped - i
+
+        # Corners gathered from the flattened nodes, (ny * nz, nz, 1) apart along the axes
+        field = self.__field.reshape(-1, 4)
+        stride = np.array([self.__shape[1] * self.__shape[2], self.__shape[2], 1])
+        base = i @ stride
+        values = np.zeros((len(positions), 4))
+        for corner in range(8):
+            o = np.array([(corner >> 2) & 1, (corner >> 1) & 1, corner & 1])
+            weight = np.prod(np.where(o == 1, t, 1 - t), axis=1)
+            values += weight[:, np.newaxis] * np.take(field, base + o @ stride, axis=0)
+
+        outside = (g - clamped) * self.__spacing
+        phi = values[:, 0] + np.sqrt(np.einsum('ij,ij->i', outside, outside))
+        return phi, values[:, 1:]
+
+    def implicit_function(self, x):
+        return self.sample(x)[0][0]
+
+    def implicit_function_batch(self, positions):
+        return self.sample(positions)[0]
+
+    def contact(self, x):
+        cp, d, n_cp = self.contact_batch(x)
+        return cp[0], d[0], n_cp[0]
+
+    def contact_batch(self, positions):
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        phi, gradient = self.sample(positions)
+        norm = np.sqrt(np.einsum('ij,ij->i', gradient, gradient))
+        n_cp = np.zeros_like(gradient)
+        defined = norm > 0
+        n_cp[defined] = gradient[defined] / norm[defined, np.newaxis]
+        cp = positions - phi[:, np.newaxis] * n_cp
+        return cp, np.abs(phi), n_cp
+
+    def bounding_box(self):
+        """
+        Box of the nodes inside of the shape, grown by one spacing.
+        """
+        inside = np.argwhere(np.asarray(self.__field[..., 0]) < self.__spacing)
+        if len(inside) == 0:
+            return None
+        return (self.__origin + (inside.min(axis=0) - 1) * self.__spacing,
+                self.__origin + (inside.max(axis=0) + 1) * self.__spacing)
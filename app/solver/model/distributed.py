@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Domain decomposition of the vectorized step over processes.
+
+The domain is split in slabs along one axis, at multiples of the cell size of the neighbour grid. Every slab is
+owned by a Subdomain living in its own process, which receives from its neighbour slabs the particles within the
+largest search radius of its boundaries (ghosts) and computes the density and the forces of its own particles.
+Particles leaving a slab are migrated to the slab containing them, and the boundaries are moved to the quantiles
+of the particles when the load gets unbalanced.
+'''
+
+import math
+import multiprocessing
+
+import numpy as np
+
+import app.solver.model.neighbour_list as m_nl
+import app.solver.model.parallel as m_par
+import app.solver.model.particle_arrays as m_arr
+
+from app.solver.conf import *
+
+# Columns exchanged between the subdomains
+FIELDS = ('position', 'velocity', 'acceleration', 'density', 'pressure', 'radius', 'mass', 'fluid_id')
+
+
+def empty_payload():
+    payload = {key: np.zeros((0, 3)) for key in ('position', 'velocity', 'acceleration')}
+    payload.update({key: np.zeros(0) for key in ('density', 'pressure', 'radius', 'mass')})
+    payload['fluid_id'] = np.zeros(0, dtype=np.intp)
+    payload['tag'] = np.zeros(0, dtype=np.intp)
+    return payload
+
+
+def concatenate(payloads):
+    """
+    Concatenate payloads, in order.
+    """
+    payloads = list(payloads) or [empty_payload()]
+    return {key: np.concatenate([p[key] for p in payloads]) for key in payloads[0]}
+
+
+def select(payload, rows):
+    return {key: value[rows] for key, value in payload.items()}
+
+
+class Subdomain(object):
+    """
+    Particles of one slab, with the phases of the vectorized step computed on them and on their ghosts.
+
+    Every particle carries a tag, its row in the store given to the DistributedSphSolver, so that the particles
+    can be gathered back in their original order.
+    """
+    def __init__(self, fluids, collisions_objects, dt, lower, upper, axis=0):
+        self.__store = m_arr.ParticleArrays()
+        for fluid in fluids:
+            self.__store.fluid_index(fluid)
+        self.__tag = np.zeros(0, dtype=np.intp)
+        self.__collisions_objects = collisions_objects
+        self.__dt = dt
+        self.__lower = lower
+        self.__upper = upper
+        self.__axis = axis
+        self.__layers = None
+        self.__state = None
+
+    def __len__(self):
+        return len(self.__store)
+
+    ### Particles
+
+    def payload(self, rows=None):
+        store = self.__store
+        rows = slice(None) if rows is None else rows
+        payload = {key: getattr(store, key)[rows].copy() for key in FIELDS}
+        payload['tag'] = self.__tag[rows].copy()
+        return payload
+
+    def add(self, payload):
+        store = self.__store
+        for k in range(len(payload['tag'])):
+            i = store.append(payload['position'][k], store.fluids[payload['fluid_id'][k]], payload['radius'][k],
+                             speed=payload['velocity'][k], acceleration=payload['acceleration'][k])
+            store.density[i] = payload['density'][k]
+            store.pressure[i] = payload['pressure'][k]
+        self.__tag = np.concatenate((self.__tag, payload['tag']))
+        return len(store)
+
+    def remove(self, rows):
+        """
+        Remove rows and return them as a payload.
+        """
+        payload = self.payload(rows)
+        # Swap removal, from the last row, keeps the rows still to remove in place
+        for i in sorted(np.flatnonzero(rows) if rows.dtype == bool else rows, reverse=True):
+            self.__store.remove(i)
+            self.__tag[i] = self.__tag[len(self.__store)]
+        self.__tag = self.__tag[:len(self.__store)]
+        return payload
+
+    def coordinates(self):
+        return self.__store.position[:, self.__axis].copy()
+
+    def set_bounds(self, lower, upper):
+        """
+        Move the boundaries of the slab and return the particles now outside of it.
+        """
+        self.__lower = lower
+        self.__upper = upper
+        x = self.__store.position[:, self.__axis]
+        return self.remove((x < lower) | (x >= upper))
+
+    ### Phases
+
+    def layers(self, width):
+        """
+        Particles within width of the lower and of the upper boundaries, to send to the neighbour slabs.
+        """
+        x = self.__store.position[:, self.__axis]
+        self.__layers = (np.flatnonzero(x < self.__lower + width), np.flatnonzero(x >= self.__upper - width))
+        return self.payload(self.__layers[0]), self.payload(self.__layers[1])
+
+    def density(self, ghosts):
+        """
+        Density and pressure of the particles of the slab.
+
+            :param ghosts: payload of the particles of the neighbour slabs within reach
+            :return: densities of the lower and upper layers
+        """
+        store = self.__store
+        n = len(store)
+        fluids = store.fluids
+        position = np.concatenate((store.position, ghosts['position']))
+        radius = np.concatenate((store.radius, ghosts['radius']))
+        fluid_id = np.concatenate((store.fluid_id, ghosts['fluid_id']))
+        neighbours = m_nl.NeighbourList.from_positions(position, RADIUS_MULTIPLICATIVE * radius)
+        state = {'offsets': neighbours.offsets,
+                 'owner': neighbours.owner,
+                 'indices': neighbours.indices,
+                 'r': neighbours.r,
+                 'distance': neighbours.distance,
+                 'radius': radius,
+                 'mass': np.concatenate((store.mass, ghosts['mass'])),
+                 'velocity': np.concatenate((store.velocity, ghosts['velocity']))}
+        for name in ('rho0', 'k', 'mu', 'sigma', 'l', 'cr'):
+            state[name] = np.array([getattr(f, name) for f in fluids], dtype=np.float64)[fluid_id]
+        store.density[:] = m_par.density_rows(state, 0, n)
+        store.pressure[:] = (store.density - state['rho0'][:n]) * state['k'][:n]
+        self.__state = state
+        return store.density[self.__layers[0]].copy(), store.density[self.__layers[1]].copy()
+
+    def forces(self, ghost_density):
+        """
+        Forces, integration and collisions of the particles of the slab.
+
+            :param ghost_density: densities of the ghosts given to density
+            :return: particles which left the slab
+        """
+        store = self.__store
+        state = self.__state
+        n = len(store)
+        state['density'] = np.concatenate((store.density, ghost_density))
+        state['pressure'] = (state['density'] - state['rho0']) * state['k']
+        store.force[:] = m_par.force_rows(state, 0, n)
+        store.acceleration[:] = store.force / store.mass[:, np.newaxis]
+        future_speed = store.velocity + store.acceleration * self.__dt
+        future_location = store.position + future_speed * self.__dt
+        for coll_obj in self.__collisions_objects:
+            coll_obj.react_batch(future_location, future_speed, self.__dt, state['cr'][:n])
+        store.position[:] = future_location
+        store.velocity[:] = future_speed
+        self.__state = None
+        return self.set_bounds(self.__lower, self.__upper)
+
+
+def _serve(connection, *args):
+    """
+    Run a Subdomain in a worker process : execute the commands received until None.
+    """
+    domain = Subdomain(*args)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        command, args = message
+        try:
+            connection.send((True, getattr(domain, command)(*args)))
+        except Exception as e:
+            connection.send((False, e))
+    connection.close()
+
+
+class DistributedSphSolver(object):
+    """
+    Vectorized step of a ParticleArrays store, distributed over slabs owned by worker processes.
+
+    Every step exchanges the ghost layers twice between neighbour slabs (positions, then densities), migrates the
+    particles crossing a boundary, and rebalances the slabs when the largest one holds more than imbalance times
+    the mean number of particles.
+    """
+    def __init__(self, tt, dt, particles, collisions_objects=None, domains=2, axis=0, cell_size=None,
+                 imbalance=1.25, bounds=None):
+        """
+
+        :param tt: total times
+        :param dt: interval / step
+        :param particles: initial particles, which are copied to the slabs
+        :param domains: number of slabs and processes
+        :param axis: axis cut by the slabs
+        :param cell_size: size of the cells the boundaries are aligned to, the largest search radius by default
+        :param imbalance: largest ratio of the particles of a slab to the mean before rebalancing
+        :param bounds: domains - 1 increasing inner boundaries, at least one search radius apart, the quantiles of the
+            particles by default
+        :type particles: m_arr.ParticleArrays
+        :type domains: int
+        :type axis: int
+        :type cell_size: float
+        :type imbalance: float
+        """
+        assert isinstance(particles, m_arr.ParticleArrays)
+        assert domains >= 1
+        self.__tt = tt
+        self.__t = 0
+        self.__dt = dt
+        self.__axis = axis
+        self.__imbalance = imbalance
+        self.__fluids = list(particles.fluids)
+        self.__n = len(particles)
+        self.__width = RADIUS_MULTIPLICATIVE * float(np.max(particles.radius, initial=0.))
+        self.__cell_size = cell_size or self.__width or 1.
+        self.__statistics = {'steps': 0, 'migrations': 0, 'rebalances': 0, 'ghosts': 0}
+
+        initial = {key: getattr(particles, key).copy() for key in FIELDS}
+        initial['tag'] = np.arange(len(particles))
+        x = initial['position'][:, axis]
+        if bounds is None:
+            self.__edges = self.__balanced_edges(x, domains)
+        else:
+            bounds = np.asarray(bounds, dtype=np.float64)
+            assert len(bounds) == domains - 1
+            # A slab thinner than the search radius would need ghosts from beyond its neighbours
+            assert np.all(np.diff(bounds) >= self.__width)
+            self.__edges = np.concatenate(([-np.inf], bounds, [np.inf]))
+
+        self.__connections = []
+        self.__processes = []
+        for k in range(domains):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve, daemon=True,
+                                              args=(child, self.__fluids, collisions_objects or [], dt,
+                                                    self.__edges[k], self.__edges[k + 1], axis))
+            process.start()
+            child.close()
+            self.__connections.append(parent)
+            self.__processes.append(process)
+        self.__counts = self.__route([initial])
+
+    @property
+    def t(self):
+        return self.__t
+
+    @t.setter
+    def t(self, t):
+        self.__t = t
+
+    @property
+    def dt(self):
+        return self.__dt
+
+    @property
+    def tt(self):
+        return self.__tt
+
+    @property
+    def domains(self):
+        return len(self.__connections)
+
+    @property
+    def bounds(self):
+        """
+        Inner boundaries of the slabs.
+        """
+        return self.__edges[1:-1].copy()
+
+    @property
+    def counts(self):
+        """
+        Number of particles of every slab.
+        """
+        return list(self.__counts)
+
+    @property
+    def statistics(self):
+        """
+        Steps run, particles migrated between slabs, rebalances and ghosts exchanged at the last step.
+        """
+        return dict(self.__statistics)
+
+    ### Communication
+
+    def __call_all(self, command, args):
+        """
+        Run command on every subdomain with its own arguments, concurrently.
+        """
+        for connection, a in zip(self.__connections, args):
+            connection.send((command, a))
+        results = []
+        for connection in self.__connections:
+            ok, result = connection.recv()
+            if not ok:
+                raise RuntimeError("Subdomain failed on " + command) from result
+            results.append(result)
+        return results
+
+    def __route(self, payloads):
+        """
+        Send particles to the slabs containing them, and return the number of particles of every slab.
+        """
+        payload = concatenate(payloads)
+        domain = np.searchsorted(self.__edges, payload['position'][:, self.__axis], side='right') - 1
+        return self.__call_all('add', [(select(payload, domain == k),) for k in range(self.domains)])
+
+    def __balanced_edges(self, x, domains):
+        """
+        Boundaries at the quantiles of x, aligned to the cells and at least one search radius apart.
+        """
+        edges = [-np.inf]
+        gap = self.__cell_size * max(1, math.ceil(self.__width / self.__cell_size))
+        for q in (np.quantile(x, np.arange(1, domains) / domains) if len(x) else np.zeros(domains - 1)):
+            edge = round(q / self.__cell_size) * self.__cell_size
+            if len(edges) > 1:
+                edge = max(edge, edges[-1] + gap)
+            edges.append(edge)
+        edges.append(np.inf)
+        return np.array(edges, dtype=np.float64)
+
+    ### Functions
+
+    def step(self):
+        d = self.domains
+        empty = empty_payload()
+
+        # Ghosts : upper layer of the slab below and lower layer of the slab above
+        layers = self.__call_all('layers', [(self.__width,)] * d)
+        ghosts = [concatenate((layers[k - 1][1] if k > 0 else empty, layers[k + 1][0] if k < d - 1 else empty))
+                  for k in range(d)]
+        self.__statistics['ghosts'] = sum(len(g['tag']) for g in ghosts)
+
+        densities = self.__call_all('density', [(g,) for g in ghosts])
+        none = np.zeros(0)
+        ghost_density = [np.concatenate((densities[k - 1][1] if k > 0 else none,
+                                         densities[k + 1][0] if k < d - 1 else none)) for k in range(d)]
+
+        leaving = self.__call_all('forces', [(g,) for g in ghost_density])
+        self.__counts = self.__route(leaving)
+        self.__statistics['migrations'] += sum(len(p['tag']) for p in leaving)
+        self.__statistics['steps'] += 1
+
+        if self.__n and max(self.__counts) > self.__imbalance * self.__n / d:
+            self.rebalance()
+
+    def rebalance(self):
+        """
+        Move the boundaries to the quantiles of the particles and migrate the particles accordingly.
+        """
+        x = np.concatenate(self.__call_all('coordinates', [()] * self.domains))
+        edges = self.__balanced_edges(x, self.domains)
+        if np.array_equal(edges, self.__edges):
+            # The cells are too coarse to balance the slabs any better
+            return
+        self.__edges = edges
+        leaving = self.__call_all('set_bounds', [(self.__edges[k], self.__edges[k + 1]) for k in range(self.domains)])
+        self.__counts = self.__route(leaving)
+        self.__statistics['migrations'] += sum(len(p['tag']) for p in leaving)
+        self.__statistics['rebalances'] += 1
+
+    def gather(self):
+        """
+        Current state of every particle, in a new ParticleArrays store in the order of the initial store.
+        """
+        payload = concatenate(self.__call_all('payload', [()] * self.domains))
+        order = np.argsort(payload['tag'])
+        store = m_arr.ParticleArrays(max(len(order), 1))
+        for fluid in self.__fluids:
+            store.fluid_index(fluid)
+        for k in order:
+            i = store.append(payload['position'][k], self.__fluids[payload['fluid_id'][k]], payload['radius'][k],
+                             speed=payload['velocity'][k], acceleration=payload['acceleration'][k])
+            store.density[i] = payload['density'][k]
+            store.pressure[i] = payload['pressure'][k]
+        return store
+
+    def shutdown(self):
+        for connection in self.__connections:
+            connection.send(None)
+            connection.close()
+        for process in self.__processes:
+            process.join()
+        self.__connections = []
+        self.__processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
@@ -21,60 +21,225 @@ __status__ = "Production"
 from collections import defaultdict
 from math import *
 
+import numpy as np
+
 import app.solver.helper.prime as m_pr
+import app.solver.model.cell_key as m_key
 import app.solver.model.vector as m_vec
 
+from app.solver.conf import *
+
 #import app.solver.model.particle as m_part
 
+# Particles per bucket of the XOR hashing above which the table grows, and under which it shrinks. Both rehash to
+# about two buckets per particle.
+MAX_LOAD = 1.
+MIN_LOAD = 0.125
+# Smallest number of particles the table is sized for
+MIN_PARTICLES = 8
+
 
 class Hash():
-    def __init__(self, l, n, p1=111, p2=19349663, p3=83492791):
+    def __init__(self, l=None, n=0, p1=111, p2=19349663, p3=83492791, keys=None):
         """
-        l : cell size
-        n : number of particle
+        l : cell size, None to take the kernel support KERNEL_MULTIPLICATIVE * radius of the largest particle
+        n : expected number of particles, the table grows and shrinks with the particles from there
+        keys : None to hash the cells with the primes p1, p2, p3 modulo n_h, or 'packed' / 'morton' to key every
+               cell exactly (see m_key), so that a bucket only ever holds the particles of one cell
         """
+        if keys is not None and keys not in m_key.KEYS:
+            raise ValueError("unknown cell keys " + repr(keys) + ", expected one of " + str(list(m_key.KEYS)))
         self.__l = l  # size of cell
-        self.__n = n  # number of particles
-        self.__n_h = next(m_pr.primes_above(2 * n))
+        self.__auto_l = l is None
+        self.__n = int(n)  # number of particles
+        self.__n_h = self.__buckets_for(self.__n)
+        self.__rehashes = 0
 
         self.__p1 = p1
         self.__p2 = p2
         self.__p3 = p3
 
-        self.__hash_table = defaultdict(list)
+        self.__keys = keys
+        if keys is None:
+            self.__hash_table = defaultdict(list)
+        else:
+            self.__hash_table = m_key.CellTable(self.__n)
+
+        # Bucket of every particle and its index in the bucket, by id
+        self.__objects = {}
+        self.__bucket = {}
+        self.__index = {}
+
+        self.__rebins = 0
+        self.__migrations = 0
+        self.__total_migrations = 0
 
     @property
     def hash_table(self):
         return self.__hash_table
 
+    @property
+    def l(self):
+        return self.__l
+
+    @property
+    def n_h(self):
+        """
+        Number of buckets of the XOR hashing.
+        """
+        return self.__n_h
+
+    @property
+    def load_factor(self):
+        """
+        Particles per bucket of the XOR hashing, or occupied slots of the open addressing table with exact keys.
+        """
+        if self.__keys is not None:
+            return self.__hash_table.statistics['load_factor']
+        return len(self.__objects) / self.__n_h
+
+    @staticmethod
+    def __buckets_for(n):
+        return next(m_pr.primes_above(2 * max(n, MIN_PARTICLES)))
+
+    @property
+    def keys(self):
+        return self.__keys
+
+    @property
+    def bucket_statistics(self):
+        """
+        Load of the buckets : particles per bucket, and buckets shared by particles of several cells, which the
+        searches have to distance-filter. With exact keys, the probe lengths of the open addressing table are
+        reported too.
+        """
+        loads = [len(bucket) for bucket in self.__hash_table.values()]
+        shared = 0
+        for bucket in self.__hash_table.values():
+            cells = {tuple(self.compute_r_chap(o)) for o in bucket}
+            shared += len(cells) > 1
+        statistics = {'buckets': len(loads),
+                      'particles': sum(loads),
+                      'mean_load': float(np.mean(loads)) if loads else 0.,
+                      'max_load': max(loads, default=0),
+                      'shared_buckets': shared}
+        if self.__keys is not None:
+            statistics.update(self.__hash_table.statistics)
+        return statistics
+
+    @property
+    def statistics(self):
+        """
+        Number of rebinning passes, particles which changed of bucket at the last pass and in total.
+        """
+        return {'rebins': self.__rebins,
+                'migrations': self.__migrations,
+                'total_migrations': self.__total_migrations,
+                'rehashes': self.__rehashes,
+                'load_factor': self.load_factor,
+                'n_h': self.__n_h,
+                'l': self.__l}
+
+    def __append(self, _object, h):
+        bucket = self.__hash_table[h]
+        self.__bucket[id(_object)] = h
+        self.__index[id(_object)] = len(bucket)
+        bucket.append(_object)
+
+    def __pop(self, _object):
+        """
+        Remove a particle from its bucket, by moving the last particle of the bucket into its slot
+        """
+        h = self.__bucket.pop(id(_object))
+        k = self.__index.pop(id(_object))
+        bucket = self.__hash_table[h]
+        last = bucket.pop()
+        if last is not _object:
+            bucket[k] = last
+            self.__index[id(last)] = k
+        if not bucket:
+            del self.__hash_table[h]
+
+    def __rehash(self):
+        """
+        Put every particle again in the buckets, for a new number of buckets or a new cell size
+        """
+        self.__hash_table = defaultdict(list) if self.__keys is None else m_key.CellTable(len(self.__objects))
+        self.__bucket = {}
+        self.__index = {}
+        for _object in self.__objects.values():
+            self.__append(_object, self.compute_hash(self.compute_r_chap(_object)))
+        self.__rehashes += 1
+
+    def __resize(self):
+        """
+        Size the XOR hashing for the current number of particles, once its load left [MIN_LOAD, MAX_LOAD]
+        """
+        if self.__keys is not None:
+            # The open addressing table sizes itself
+            return
+        n = len(self.__objects)
+        smallest = self.__buckets_for(0)
+        if n / self.__n_h > MAX_LOAD or (n / self.__n_h < MIN_LOAD and self.__n_h > smallest):
+            self.__n_h = self.__buckets_for(n)
+            self.__rehash()
+
     def insert(self, _object):
         """
         Insert a new particle in the volume
         """
+        self.__objects[id(_object)] = _object
+        if self.__auto_l and (self.__l is None or KERNEL_MULTIPLICATIVE * _object.radius > self.__l):
+            # Cells of the largest kernel support
+            self.__l = KERNEL_MULTIPLICATIVE * _object.radius
+            self.__rehash()
+            return
         r_chap = self.compute_r_chap(_object)
         h = self.compute_hash(r_chap)
-        self.__hash_table[h].append(_object)
+        self.__append(_object, h)
+        self.__resize()
 
     def remove(self, _object):
         """
-        Delete the existent hash_table and create a new one
+        Remove a particle from the bucket it was put in
         """
-        r_chap = self.compute_r_chap(_object)
-        h = self.compute_hash(r_chap)
-        self.__hash_table[h].remove(_object)
+        if id(_object) not in self.__objects:
+            raise ValueError("particle not in the hash")
+        del self.__objects[id(_object)]
+        self.__pop(_object)
+        self.__resize()
 
     def update(self, _object):
         """
         Update the particles in the volume
         """
-        r_chap_old = self.compute_r_chap(_object)
         r_chap_new = self.compute_r_chap(_object, future=True)
-
-        h_old = self.compute_hash(r_chap_old)
         h_new = self.compute_hash(r_chap_new)
+        if h_new != self.__bucket[id(_object)]:
+            self.__pop(_object)
+            self.__append(_object, h_new)
 
-        self.__hash_table[h_old].remove(_object)
-        self.__hash_table[h_new].append(_object)
+    def rebin(self):
+        """
+        Move the particles whose bucket changed since they were put in, from their current location. The cells of
+        all the particles are computed at once and only the particles changing of bucket touch the buckets.
+
+            :return: number of particles which changed of bucket
+            :rtype: int
+        """
+        objects = list(self.__objects.values())
+        position = np.array([o.current_location.value for o in objects], dtype=np.float64).reshape(-1, 3)
+        h_new = self.compute_hash_batch(np.floor(position / self.__l))
+        h_old = np.fromiter((self.__bucket[id(o)] for o in objects), dtype=np.int64, count=len(objects))
+        changed = np.flatnonzero(h_new != h_old)
+        for k in changed:
+            self.__pop(objects[k])
+            self.__append(objects[k], int(h_new[k]))
+
+        self.__rebins += 1
+        self.__migrations = len(changed)
+        self.__total_migrations += len(changed)
+        return self.__migrations
 
     def compute_r_chap(self, _object, future=False):
         """
@@ -99,6 +264,9 @@ class Hash():
         """
         applique le produit csaur(... ?!) afin de rattacher à la case le nombre hash
         """
+        if self.__keys is not None:
+            return int(m_key.KEYS[self.__keys]([[int(r) for r in r_chap]])[0])
+
         n_h = self.__n_h
         p1 = self.__p1
         p2 = self.__p2
@@ -112,6 +280,16 @@ class Hash():
 
         return __hash
 
+    def compute_hash_batch(self, r_chap):
+        """
+        compute_hash of (N, 3) cell coordinates
+        """
+        r_chap = np.asarray(r_chap, dtype=np.int64).reshape(-1, 3)
+        if self.__keys is not None:
+            return m_key.KEYS[self.__keys](r_chap)
+        __hash = (r_chap[:, 0] * self.__p1) ^ (r_chap[:, 1] * self.__p2) ^ (r_chap[:, 2] * self.__p3)
+        return __hash % self.__n_h
+
     def query(self, x, y, z):
         """
         recherche les particule qui se trouve dans la case numéro 'hash'
@@ -128,19 +306,23 @@ class Hash():
 
         r_chap_obj = self.compute_r_chap(_object)
         assert isinstance(r_chap_obj, m_vec.Vector)
-        bounding_box_demi_size = m_vec.Vector(floor(kernel_h / l), floor(kernel_h / l), floor(kernel_h / l))
+        bounding_box_demi_size = m_vec.Vector(ceil(kernel_h / l), ceil(kernel_h / l), ceil(kernel_h / l))
         r_chap_low = r_chap_obj - bounding_box_demi_size
         r_chap_high = r_chap_obj + bounding_box_demi_size
 
         possible = []
-
-        for x in range(int(r_chap_low[0]), int(r_chap_high[0])):
-            for y in range(int(r_chap_low[1]), int(r_chap_high[1])):
-                for z in range(int(r_chap_low[2]), int(r_chap_high[2])):
-                    query = self.query(x, y, z)
-                    if query is not None:
-                        for q in query:
-                            possible.append(q)
+        # Cells sharing a bucket : the bucket is only read once, so no particle is returned twice
+        visited = set()
+
+        for x in range(int(r_chap_low[0]), int(r_chap_high[0]) + 1):
+            for y in range(int(r_chap_low[1]), int(r_chap_high[1]) + 1):
+                for z in range(int(r_chap_low[2]), int(r_chap_high[2]) + 1):
+                    __hash = self.compute_hash(m_vec.Vector([x, y, z]))
+                    if __hash in visited:
+                        continue
+                    visited.add(__hash)
+                    if __hash in self.__hash_table:
+                        possible.extend(self.__hash_table[__hash])
 
         if approx:
             return possible
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Time integrators of the particle arrays.
+
+An integrator advances the position, velocity and acceleration columns of a ParticleArrays store by dt, in place.
+It calls accelerate() to evaluate the accelerations of the current content of the columns : accelerate computes
+the density and the forces from particles.position and particles.velocity and writes particles.acceleration.
+'''
+
+import numpy as np
+
+
+class Integrator(object):
+    """
+    Base Class for Integrator
+    """
+    def __init__(self):
+        self.__evaluations = 0
+        self.__revision = None
+
+    @property
+    def evaluations(self):
+        """
+        Number of evaluations of the accelerations.
+        """
+        return self.__evaluations
+
+    def _accelerate(self, accelerate):
+        self.__evaluations += 1
+        accelerate()
+
+    def _prime(self, particles, accelerate):
+        """
+        Evaluate the accelerations of the current state if particles.acceleration does not hold them yet, i.e.
+        at the first step or after particles were added, removed or reordered.
+        """
+        if self.__revision != particles.revision:
+            self._accelerate(accelerate)
+            self.__revision = particles.revision
+
+    def reorder(self, particles, revision):
+        """
+        The rows of particles were permuted together, so the acceleration column still holds the accelerations of
+        the state and does not need to be evaluated again.
+
+            :param revision: revision of particles before the permutation
+        """
+        if self.__revision == revision:
+            self.__revision = particles.revision
+
+    def step(self, particles, accelerate, dt):
+        """
+        Advance particles by dt.
+
+            :param particles: m_arr.ParticleArrays
+            :param accelerate: function writing the accelerations of the current state to particles.acceleration
+            :param dt: time step
+        """
+        raise NotImplementedError
+
+
+class SemiImplicitEuler(Integrator):
+    """
+    u += a dt, x += u dt, with a evaluated at the beginning of the step. First order.
+    """
+    def step(self, particles, accelerate, dt):
+        self._accelerate(accelerate)
+        particles.velocity[:] += particles.acceleration * dt
+        particles.position[:] += particles.velocity * dt
+
+
+class Leapfrog(Integrator):
+    """
+    Kick-drift-kick leapfrog : half kick, drift with the half step velocity, half kick with the new acceleration.
+    Second order and symplectic, one evaluation per step.
+    """
+    def step(self, particles, accelerate, dt):
+        self._prime(particles, accelerate)
+        particles.velocity[:] += particles.acceleration * (dt / 2)
+        particles.position[:] += particles.velocity * dt
+        self._accelerate(accelerate)
+        particles.velocity[:] += particles.acceleration * (dt / 2)
+
+
+class VelocityVerlet(Integrator):
+    """
+    x += u dt + a dt ** 2 / 2, then u += (a + a_new) dt / 2. Second order, one evaluation per step.
+    """
+    def step(self, particles, accelerate, dt):
+        self._prime(particles, accelerate)
+        acceleration = particles.acceleration.copy()
+        particles.position[:] += particles.velocity * dt + acceleration * (dt ** 2 / 2)
+        self._accelerate(accelerate)
+        acceleration += particles.acceleration
+        particles.velocity[:] += acceleration * (dt / 2)
+
+
+class PredictorCorrector(Integrator):
+    """
+    Predictor-corrector of J. J. Monaghan, “Smoothed particle hydrodynamics”, Annual Review of Astronomy and
+    Astrophysics 30, pp. 543-574, 1992 : the state is predicted at the half step with the last accelerations, the
+    accelerations are evaluated there, and the half step is corrected with them before extrapolating to the full
+    step. Second order, one evaluation per step.
+    """
+    def step(self, particles, accelerate, dt):
+        self._prime(particles, accelerate)
+        position = particles.position.copy()
+        velocity = particles.velocity.copy()
+        # Predictor
+        particles.position[:] += velocity * (dt / 2)
+        particles.velocity[:] += particles.acceleration * (dt / 2)
+        self._accelerate(accelerate)
+        # Corrector, at the half step
+        half_velocity = velocity + particles.acceleration * (dt / 2)
+        half_position = position + half_velocity * (dt / 2)
+        # Full step
+        np.subtract(2 * half_velocity, velocity, out=particles.velocity)
+        np.subtract(2 * half_position, position, out=particles.position)
+
+
+INTEGRATORS = {
+    "euler": SemiImplicitEuler,
+    "leapfrog": Leapfrog,
+    "verlet": VelocityVerlet,
+    "predictor_corrector": PredictorCorrector,
+}
+
+
+def integrator(name):
+    """
+    Integrator of a name of INTEGRATORS, or the Integrator itself.
+    """
+    if isinstance(name, Integrator):
+        return name
+    if name not in INTEGRATORS:
+        raise ValueError("Unknown integrator : " + str(name))
+    return INTEGRATORS[name]()
@@ -20,13 +20,50 @@ __status__ = "Production"
 
 from math import *
 
+import numpy as np
+
 import app.solver.model.vector as m_vec
 
 
+def distances(r):
+    """
+    Norms of an (M, 3) array of separation vectors, or the (M,) array of distances itself.
+    """
+    r = np.asarray(r, dtype=np.float64)
+    if r.ndim == 2:
+        return np.sqrt(np.einsum('ij,ij->i', r, r))
+    assert r.ndim == 1
+    return r
+
+
+def _positive(x):
+    """
+    max(x, 0) of a float or of an array.
+    """
+    return np.maximum(x, 0.) if isinstance(x, np.ndarray) else max(x, 0.)
+
+
+def _where(condition, x, y):
+    """
+    np.where of arrays, x if condition else y of floats.
+    """
+    if isinstance(condition, np.ndarray):
+        return np.where(condition, x, y)
+    return x if condition else y
+
+
 class Kernel(object):
     """
     Base Class for Kernel
+
+    evaluate, gradient and laplacian work on arrays of pairs ; __call__, gradient and laplacian also accept one
+    m_vec.Vector or m_vec.Vec3 and then return a float, or a vector of the same type for the gradient. Subclasses
+    implement _value, _gradient_factor (gradient = r * factor) and _laplacian on an array of distances. When these
+    formulas are written with _positive and _where, they also accept one float distance : FLOAT_FORMULAS is then set
+    and the single pairs do not go through a one element array.
     """
+    FLOAT_FORMULAS = False
+
     def __init__(self, h):
         self.__h = h  # max radius
 
@@ -34,44 +71,88 @@ class Kernel(object):
     def h(self):
         return self.__h
 
-    def __call__(self, r):
+    def _value(self, d):
         raise NotImplementedError
 
-    def gradient(self, r):
+    def _gradient_factor(self, d):
         raise NotImplementedError
 
-    def laplacian(self, r):
+    def _laplacian(self, d):
         raise NotImplementedError
 
+    def __scalar(self, formula, d):
+        """
+        formula of one float distance.
+        """
+        if self.FLOAT_FORMULAS:
+            return float(formula(d))
+        return float(formula(np.array([d]))[0])
+
+    ### Batch
+
+    def evaluate(self, r):
+        """
+            :param r: (M, 3) separation vectors or (M,) distances
+            :rtype: numpy.ndarray
+        """
+        return self._value(distances(r))
+
+    def gradient(self, r, distance=None):
+        """
+            :param r: (M, 3) separation vectors, or a m_vec.Vector or m_vec.Vec3
+            :param distance: (M,) norms of r, if already known
+            :rtype: numpy.ndarray (M, 3)
+        """
+        if isinstance(r, m_vec.Vec3):
+            return r * self.__scalar(self._gradient_factor, r.norm())
+        if isinstance(r, m_vec.Vector):
+            return m_vec.Vector(np.asarray(r) * self.__scalar(self._gradient_factor, r.norm()))
+        assert isinstance(r, np.ndarray) and r.ndim == 2
+        d = distances(r) if distance is None else distance
+        return r * self._gradient_factor(d)[:, np.newaxis]
+
+    def laplacian(self, r):
+        """
+            :param r: (M, 3) separation vectors or (M,) distances, or a m_vec.Vector or m_vec.Vec3
+            :rtype: numpy.ndarray (M,)
+        """
+        if isinstance(r, (m_vec.Vector, m_vec.Vec3)):
+            return self.__scalar(self._laplacian, r.norm())
+        assert isinstance(r, np.ndarray)
+        return self._laplacian(distances(r))
+
+    ### Scalar
+
+    def __call__(self, r):
+        assert isinstance(r, (m_vec.Vector, m_vec.Vec3))
+        return self.__scalar(self._value, r.norm())
+
 
 class Poly6Kernel(Kernel):
     """
     Realtime particle-based fluid simulation, Uni München
     Page 24
     """
-    def __call__(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        if r.norm() <= h:
-            return 315. * ((h ** 2 - r.norm() ** 2) ** 3) / (64 * pi * (h ** 9))
-        else:
-            return 0.
+    FLOAT_FORMULAS = True
 
-    def gradient(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        if r.norm() <= h:
-            return - r * 945 / (32 * pi * h ** 9) * (h ** 2 - r.norm() ** 2) ** 2
-        else:
-            return m_vec.Vector([0, 0, 0])
+    def __init__(self, h):
+        super().__init__(h)
+        self.__h2 = h ** 2
+        self.__c_value = 315. / (64 * pi * h ** 9)
+        self.__c_gradient = - 945. / (32 * pi * h ** 9)
+        self.__c_laplacian = 945. / (8 * pi * h ** 9)
 
-    def laplacian(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        if r.norm() <= h:
-            return 945 / (8 * pi * h ** 9) * (h ** 2 - r.norm() ** 2) * (r.norm() ** 2 - 0.75 * (h ** 2 - r.norm() ** 2))
-        else:
-            return 0.
+    def _value(self, d):
+        s = _positive(self.__h2 - d ** 2)
+        return self.__c_value * s ** 3
+
+    def _gradient_factor(self, d):
+        s = _positive(self.__h2 - d ** 2)
+        return self.__c_gradient * s ** 2
+
+    def _laplacian(self, d):
+        s = _positive(self.__h2 - d ** 2)
+        return self.__c_laplacian * s * (d ** 2 - 0.75 * s)
 
 
 class SpikyKernel(Kernel):
@@ -83,30 +164,28 @@ class SpikyKernel(Kernel):
 
     M. Müller, D. Charypar, and M. Gross. “Particle-Based Fluid Simulation for Interactive Applications”.
     Proceedings of 2003 ACM SIGGRAPH Symposium on Computer Animation, pp. 154-159, 2003.
+
+    The gradient and the laplacian are singular at r = 0, where they are taken as 0.
     """
-    def __call__(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        if r.norm() <= h:
-            return 15. * ((h - r.norm()) ** 3) / (pi * (h ** 6))
-        else:
-            return 0.
+    FLOAT_FORMULAS = True
 
-    def gradient(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        if r.norm() <= h:
-            return - 45. * r * ((h - r.norm()) ** 2) / (pi * r.norm() * (h ** 6))
-        else:
-            return m_vec.Vector([0, 0, 0])
+    def __init__(self, h):
+        super().__init__(h)
+        self.__c_value = 15. / (pi * h ** 6)
+        self.__c_gradient = - 45. / (pi * h ** 6)
+        self.__c_laplacian = - 90. / (pi * h ** 6)
 
-    def laplacian(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        if r.norm() <= h:
-            return - 90. * ((h - r.norm())) * ((h - 2 * r.norm())) / (pi * r.norm() * (h ** 6))
-        else:
-            return 0.
+    def _value(self, d):
+        s = _positive(self.h - d)
+        return self.__c_value * s ** 3
+
+    def _gradient_factor(self, d):
+        s = _positive(self.h - d)
+        return _where(d > 0, self.__c_gradient * s ** 2 / _where(d > 0, d, 1.), 0.)
+
+    def _laplacian(self, d):
+        s = _positive(self.h - d)
+        return _where(d > 0, self.__c_laplacian * s * (self.h - 2 * d) / _where(d > 0, d, 1.), 0.)
 
 
 class ViscosityKernel(Kernel):
@@ -115,60 +194,202 @@ class ViscosityKernel(Kernel):
 
     M. Müller, D. Charypar, and M. Gross. “Particle-Based Fluid Simulation for Interactive Applications”.
     Proceedings of 2003 ACM SIGGRAPH Symposium on Computer Animation, pp. 154-159, 2003.
+
+    The value and the gradient are singular at r = 0, where they are taken as 0.
     """
+    FLOAT_FORMULAS = True
 
-    def __call__(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        if r.norm() <= h:
-            return 15 / (2 * pi * h ** 3) * (- r.norm() ** 3 / (2 * h ** 3) + r.norm() ** 2 / (h ** 2) + h / (2 * r.norm()) - 1)
-        else:
-            return 0.
+    def __init__(self, h):
+        super().__init__(h)
+        self.__c_value = 15. / (2 * pi * h ** 3)
+        self.__c_laplacian = 45. / (pi * h ** 6)
 
-    def gradient(self, r):
-        assert isinstance(r, m_vec.Vector)
+    def _value(self, d):
         h = self.h
-        if r.norm() <= h:
-            return 15 / (2 * pi * h ** 3) * r * (- 3 * r.norm() / (2 * h ** 3) + 2 / (h ** 2) - h / (2 * r.norm() ** 3))
-        else:
-            return m_vec.Vector([0, 0, 0])
+        inside = (d <= h) & (d > 0)
+        d = _where(inside, d, h)
+        return _where(inside, self.__c_value * (- d ** 3 / (2 * h ** 3) + d ** 2 / (h ** 2) + h / (2 * d) - 1), 0.)
 
-    def laplacian(self, r):
-        assert isinstance(r, m_vec.Vector)
+    def _gradient_factor(self, d):
         h = self.h
-        if r.norm() <= h:
-            return 45 / (pi * h ** 6) * (h - r.norm())
-        else:
-            return 0.
+        inside = (d <= h) & (d > 0)
+        d = _where(inside, d, h)
+        return _where(inside, self.__c_value * (- 3 * d / (2 * h ** 3) + 2 / (h ** 2) - h / (2 * d ** 3)), 0.)
+
+    def _laplacian(self, d):
+        return self.__c_laplacian * _positive(self.h - d)
 
 
 class M6QuinticKernel(Kernel):
     """
+    Quintic spline, with a support of h.
 
+    J. P. Morris, P. J. Fox and Y. Zhu. “Modeling Low Reynolds Number Incompressible Flows Using SPH”.
+    Journal of Computational Physics 136, pp. 214-226, 1997.
     """
+    # (a_k, c_k) of f(s) = sum c_k * max(a_k - s, 0) ** 5, with s = 3 r / h
+    TERMS = ((3., 1.), (2., -6.), (1., 15.))
 
-    def __call__(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        q = r.norm() / h
-        if 0 <= q <= 2./3:
-            val = -(5. * (2 - q) ** 4) - 30 * (((4. / 3) - q) ** 4)
+    def __init__(self, h):
+        super().__init__(h)
+        self.__sigma = 27. / (120. * pi * h ** 3)
+        self.__ds = 3. / h
+
+    def __f(self, s, order):
+        total = np.zeros_like(s)
+        for a, c in self.TERMS:
+            t = np.maximum(a - s, 0.)
+            if order == 0:
+                total += c * t ** 5
+            elif order == 1:
+                total += - 5 * c * t ** 4
+            else:
+                total += 20 * c * t ** 3
+        return total
+
+    def _value(self, d):
+        return self.__sigma * self.__f(self.__ds * d, 0)
+
+    def _gradient_factor(self, d):
+        # dW/dr / r, whose limit at r = 0 is d2W/dr2
+        s = self.__ds * d
+        first = self.__sigma * self.__ds * self.__f(s, 1)
+        second = self.__sigma * self.__ds ** 2 * self.__f(s, 2)
+        return np.where(d > 0, first / np.where(d > 0, d, 1.), second)
+
+    def _laplacian(self, d):
+        s = self.__ds * d
+        second = self.__sigma * self.__ds ** 2 * self.__f(s, 2)
+        return second + 2 * self._gradient_factor(d)
+
+
+class TabulatedKernel(Kernel):
+    """
+    Kernel sampled once on a regular grid and interpolated.
 
-    def gradient(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        if r.norm() <= h:
-            return 15 / (2 * pi * h ** 3) * r * (- 3 * r.norm() / (2 * h ** 3) + 2 / (h ** 2) - h / (2 * r.norm() ** 3))
+    The value, the gradient factor (gradient = r * factor) and the laplacian of any Kernel are tabulated over
+    q = r / h, or over q = r ** 2 / h ** 2 to avoid the square roots, at construction. The largest interpolation
+    error, measured half way between the samples, is given by max_error.
+    """
+    def __init__(self, kernel, resolution=1024, interpolation="linear", variable="r2"):
+        """
+
+            :param kernel: sampled kernel
+            :param resolution: number of intervals of the table
+            :param interpolation: "linear" or "cubic" (Catmull-Rom)
+            :param variable: "r" to sample over r / h, "r2" over r ** 2 / h ** 2
+            :type kernel: Kernel
+            :type resolution: int
+            :type interpolation: str
+            :type variable: str
+        """
+        assert isinstance(kernel, Kernel)
+        assert interpolation in ("linear", "cubic")
+        assert variable in ("r", "r2")
+        super().__init__(kernel.h)
+        self.__kernel = kernel
+        self.__resolution = resolution
+        self.__interpolation = interpolation
+        self.__squared = variable == "r2"
+
+        # One ghost sample on each side, extrapolated, for the cubic interpolation
+        d = self.__distance(np.linspace(0., 1., resolution + 1))
+        self.__tables = {}
+        for name, function in (("value", kernel._value),
+                               ("gradient", kernel._gradient_factor),
+                               ("laplacian", kernel._laplacian)):
+            samples = function(d)
+            low = 3 * samples[0] - 3 * samples[1] + samples[2]
+            high = 3 * samples[-1] - 3 * samples[-2] + samples[-3]
+            self.__tables[name] = np.concatenate(([low], samples, [high]))
+        self.__max_error = self.__measure_error()
+
+    @property
+    def kernel(self):
+        return self.__kernel
+
+    @property
+    def resolution(self):
+        return self.__resolution
+
+    @property
+    def interpolation(self):
+        return self.__interpolation
+
+    @property
+    def max_error(self):
+        """
+        Largest absolute error on the value, the gradient factor and the laplacian.
+        """
+        return self.__max_error
+
+    def __distance(self, q):
+        return self.h * (np.sqrt(q) if self.__squared else q)
+
+    def __coordinate(self, d2):
+        h2 = self.h ** 2
+        return d2 / h2 if self.__squared else np.sqrt(d2 / h2)
+
+    def __measure_error(self):
+        q = (np.arange(self.__resolution) + 0.5) / self.__resolution
+        d = self.__distance(q)
+        d2 = d ** 2
+        kernel = self.__kernel
+        return {"value": float(np.max(np.abs(self.__lookup("value", d2) - kernel._value(d)))),
+                "gradient": float(np.max(np.abs(self.__lookup("gradient", d2) - kernel._gradient_factor(d)))),
+                "laplacian": float(np.max(np.abs(self.__lookup("laplacian", d2) - kernel._laplacian(d))))}
+
+    def __lookup(self, name, d2):
+        table = self.__tables[name]
+        n = self.__resolution
+        x = self.__coordinate(np.asarray(d2, dtype=np.float64)) * n
+        inside = x <= n
+        x = np.minimum(x, n)
+        k = np.minimum(x.astype(np.intp), n - 1)
+        t = x - k
+        # Sample k of the kernel is table[k + 1]
+        if self.__interpolation == "linear":
+            values = table[k + 1] * (1 - t) + table[k + 2] * t
         else:
-            return m_vec.Vector([0, 0, 0])
+            p0 = table[k]
+            p1 = table[k + 1]
+            p2 = table[k + 2]
+            p3 = table[k + 3]
+            values = p1 + 0.5 * t * (p2 - p0 + t * (2 * p0 - 5 * p1 + 4 * p2 - p3 + t * (3 * (p1 - p2) + p3 - p0)))
+        return np.where(inside, values, 0.)
+
+    def _value(self, d):
+        return self.__lookup("value", d ** 2)
+
+    def _gradient_factor(self, d):
+        return self.__lookup("gradient", d ** 2)
+
+    def _laplacian(self, d):
+        return self.__lookup("laplacian", d ** 2)
+
+    @staticmethod
+    def __squared_distances(r):
+        r = np.asarray(r, dtype=np.float64)
+        if r.ndim == 2:
+            return np.einsum('ij,ij->i', r, r)
+        assert r.ndim == 1
+        return r ** 2
+
+    def evaluate(self, r):
+        return self.__lookup("value", self.__squared_distances(r))
+
+    def gradient(self, r, distance=None):
+        if isinstance(r, (m_vec.Vector, m_vec.Vec3)):
+            return super().gradient(r)
+        assert isinstance(r, np.ndarray) and r.ndim == 2
+        d2 = self.__squared_distances(r) if distance is None else distance ** 2
+        return r * self.__lookup("gradient", d2)[:, np.newaxis]
 
     def laplacian(self, r):
-        assert isinstance(r, m_vec.Vector)
-        h = self.h
-        if r.norm() <= h:
-            return 45 / (pi * h ** 6) * (h - r.norm())
-        else:
-            return 0.
+        if isinstance(r, (m_vec.Vector, m_vec.Vec3)):
+            return super().laplacian(r)
+        assert isinstance(r, np.ndarray)
+        return self.__lookup("laplacian", self.__squared_distances(r))
 
 
 if __name__ == "__main__":
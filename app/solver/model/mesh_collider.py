@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Collision with a closed triangle mesh, through a bounding volume hierarchy over its triangles.
+
+The queries of all the particles traverse the hierarchy together : every pass of the traversal handles the
+(particle, node) pairs of one depth as arrays.
+'''
+
+import numpy as np
+
+import app.geometry.mesh as g_mesh
+import app.solver.model.batch as m_batch
+import app.solver.model.collision as m_col
+
+# Triangles under which a node is not split
+LEAF_SIZE = 8
+# Direction of the rays of the inside / outside test, away from the axes and diagonals of usual meshes
+RAY = np.array([1., 1e-3 * np.sqrt(2), 1e-3 * np.sqrt(3)])
+RAY /= np.sqrt(RAY.dot(RAY))
+
+
+def _dot(a, b):
+    return np.einsum('ij,ij->i', a, b)
+
+
+def closest_point_on_triangles(p, a, b, c):
+    """
+    Closest points of the triangles (a, b, c) to the locations p, all (M, 3), by the regions of the triangle of
+    C. Ericson, “Real-Time Collision Detection”, 2005, § 5.1.5.
+    """
+    ab = b - a
+    ac = c - a
+    ap = p - a
+    d1 = _dot(ab, ap)
+    d2 = _dot(ac, ap)
+    bp = p - b
+    d3 = _dot(ab, bp)
+    d4 = _dot(ac, bp)
+    cp = p - c
+    d5 = _dot(ab, cp)
+    d6 = _dot(ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    # Barycentric weights of b and c in every region, the first matching region of the list winning
+    with np.errstate(divide='ignore', invalid='ignore'):
+        on_ab = d1 / (d1 - d3)
+        on_ac = d2 / (d2 - d6)
+        on_bc = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        denominator = va + vb + vc
+        regions = [(d1 <= 0) & (d2 <= 0),
+                   (d3 >= 0) & (d4 <= d3),
+                   (vc <= 0) & (d1 >= 0) & (d3 <= 0),
+                   (d6 >= 0) & (d5 <= d6),
+                   (vb <= 0) & (d2 >= 0) & (d6 <= 0),
+                   (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)]
+        v = np.select(regions, [0., 1., on_ab, 0., 0., 1. - on_bc], vb / denominator)
+        w = np.select(regions, [0., 0., 0., 1., on_ac, on_bc], vc / denominator)
+    return a + v[:, np.newaxis] * ab + w[:, np.newaxis] * ac
+
+
+def ray_hits_triangles(o, direction, a, b, c):
+    """
+    Whether the rays o + t direction, t > 0, cross the triangles (a, b, c), all (M, 3), by the test of T. Möller and
+    B. Trumbore, “Fast, minimum storage ray/triangle intersection”, 1997.
+    """
+    e1 = b - a
+    e2 = c - a
+    p = np.cross(direction, e2)
+    det = _dot(e1, p)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv = 1. / det
+        t = o - a
+        u = _dot(t, p) * inv
+        q = np.cross(t, e1)
+        v = (q @ direction) * inv
+        distance = _dot(e2, q) * inv
+    return (np.abs(det) > 1e-14) & (u >= 0) & (v >= 0) & (u + v <= 1) & (distance > 0)
+
+
+class BoundingVolumeHierarchy(object):
+    """
+    Binary tree of axis aligned boxes over triangles, split at the median of the centroids along the longest axis.
+
+    Node k bounds [low[k], high[k]] ; its children are left[k] and right[k], or -1 for a leaf holding the
+    triangles triangles[start[k]:start[k] + count[k]].
+    """
+    def __init__(self, a, b, c, leaf_size=LEAF_SIZE):
+        """
+
+            :param a, b, c: (T, 3) corners of the triangles
+        """
+        tri_low = np.minimum(np.minimum(a, b), c)
+        tri_high = np.maximum(np.maximum(a, b), c)
+        centroid = (a + b + c) / 3
+        order = np.arange(len(a))
+        low, high, left, right, start, count = [], [], [], [], [], []
+
+        def node(s, e):
+            k = len(low)
+            index = order[s:e]
+            low.append(tri_low[index].min(axis=0))
+            high.append(tri_high[index].max(axis=0))
+            left.append(-1)
+            right.append(-1)
+            start.append(s)
+            count.append(e - s)
+            return k
+
+        stack = [(node(0, len(a)), 0, len(a))] if len(a) else []
+        while stack:
+            k, s, e = stack.pop()
+            if e - s <= leaf_size:
+                continue
+            index = order[s:e]
+            extent = centroid[index].max(axis=0) - centroid[index].min(axis=0)
+            axis = int(np.argmax(extent))
+            mid = (e - s) // 2
+            order[s:e] = index[np.argpartition(centroid[index, axis], mid)]
+            left[k] = node(s, s + mid)
+            right[k] = node(s + mid, e)
+            count[k] = 0
+            stack.append((left[k], s, s + mid))
+            stack.append((right[k], s + mid, e))
+
+        self.low = np.array(low).reshape(-1, 3)
+        self.high = np.array(high).reshape(-1, 3)
+        self.left = np.array(left, dtype=np.intp)
+        self.right = np.array(right, dtype=np.intp)
+        self.start = np.array(start, dtype=np.intp)
+        self.count = np.array(count, dtype=np.intp)
+        self.triangles = order
+
+    def __len__(self):
+        return len(self.low)
+
+    def leaf_triangles(self, query, node):
+        """
+        (query, triangle) pairs of the triangles of the leaves node of every query.
+        """
+        owner, index = m_batch.expand_ranges(self.start[node], self.count[node])
+        return query[owner], self.triangles[index]
+
+    def box_distance2(self, x, node):
+        """
+        Squared distance of the locations x to the boxes of the nodes.
+        """
+        outside = np.maximum(self.low[node] - x, 0) + np.maximum(x - self.high[node], 0)
+        return _dot(outside, outside)
+
+    def ray_crosses_boxes(self, o, direction, node):
+        """
+        Whether the rays o + t direction, t > 0, cross the boxes of the nodes, by the slab test.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv = 1. / direction
+            t1 = (self.low[node] - o) * inv
+            t2 = (self.high[node] - o) * inv
+        t_near = np.nanmax(np.minimum(t1, t2), axis=1)
+        t_far = np.nanmin(np.maximum(t1, t2), axis=1)
+        return (t_far >= np.maximum(t_near, 0))
+
+
+class MeshCollider(m_col.ImplicitPrimitive):
+    """
+    Closed triangle mesh.
+
+    The implicit function is the distance to the mesh, negative inside of it : the closest point is found in the
+    hierarchy, and the side by the parity of the crossings of a ray. The detection only casts the rays, and the
+    closest points are looked for the colliding locations alone. Every step of a containing mesh still casts a ray
+    per particle ; for a static tank, SignedDistanceGrid.from_function(mesh.implicit_function_batch, ...) samples
+    it once.
+    """
+    def __init__(self, vertices, triangles, cr_co=1, is_containing=True, leaf_size=LEAF_SIZE):
+        """
+
+            :param vertices: (V, 3) vertices
+            :param triangles: (T, 3) vertex indices of the triangles
+            :param is_containing: the particles are inside of the mesh, e.g. a tank, rather than outside of it
+        """
+        super().__init__(cr_co, is_containing)
+        self.__vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        self.__triangles = np.asarray(triangles, dtype=np.intp).reshape(-1, 3)
+        self.__a, self.__b, self.__c = (self.__vertices[self.__triangles[:, k]] for k in range(3))
+        normal = np.cross(self.__b - self.__a, self.__c - self.__a)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.__normals = normal / np.sqrt(_dot(normal, normal))[:, np.newaxis]
+        self.__bvh = BoundingVolumeHierarchy(self.__a, self.__b, self.__c, leaf_size)
+
+    @classmethod
+    def from_obj(cls, filename, **kwargs):
+        """
+        Mesh of the faces of a Wavefront .obj file.
+        """
+        vertices, triangles = g_mesh.load_obj(filename)
+        return cls(vertices, triangles, **kwargs)
+
+    @property
+    def vertices(self):
+        return self.__vertices
+
+    @property
+    def triangles(self):
+        return self.__triangles
+
+    @property
+    def bvh(self):
+        return self.__bvh
+
+    def bounding_box(self):
+        return self.__vertices.min(axis=0), self.__vertices.max(axis=0)
+
+    ### Batched queries
+
+    def __update(self, best, closest, nearest, query, triangle, x):
+        """
+        Keep the closest of the (query, triangle) pairs to every query when it beats best.
+        """
+        if len(query) == 0:
+            return
+        order = np.argsort(query, kind='stable')
+        query, triangle = query[order], triangle[order]
+        point = closest_point_on_triangles(x[query], self.__a[triangle], self.__b[triangle], self.__c[triangle])
+        offset = x[query] - point
+        distance2 = _dot(offset, offset)
+
+        # Closest pair of every run of the same query
+        first = np.flatnonzero(np.r_[True, query[1:] != query[:-1]])
+        minimum = np.minimum.reduceat(distance2, first)
+        is_minimum = distance2 == np.repeat(minimum, np.diff(np.r_[first, len(query)]))
+        pick = np.flatnonzero(is_minimum)
+        pick = pick[np.r_[True, query[pick][1:] != query[pick][:-1]]]
+        pick = pick[distance2[pick] < best[query[pick]]]
+        best[query[pick]] = distance2[pick]
+        closest[query[pick]] = point[pick]
+        nearest[query[pick]] = triangle[pick]
+
+    def closest_points(self, positions):
+        """
+        Closest points of the mesh to (N, 3) locations.
+
+            :return: (N, 3) closest points, (N,) distances and (N,) triangles of the closest points
+        """
+        x = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        n = len(x)
+        bvh = self.__bvh
+        best = np.full(n, np.inf)
+        closest = np.zeros((n, 3))
+        nearest = np.full(n, -1, dtype=np.intp)
+        if n == 0 or len(bvh) == 0:
+            return closest, np.sqrt(best), nearest
+
+        # Bound the distances with the leaf reached by descending to the nearest child
+        query = np.arange(n)
+        node = np.zeros(n, dtype=np.intp)
+        inner = bvh.left[node] >= 0
+        while inner.any():
+            q, k = query[inner], node[inner]
+            near_left = bvh.box_distance2(x[q], bvh.left[k]) <= bvh.box_distance2(x[q], bvh.right[k])
+            node[inner] = np.where(near_left, bvh.left[k], bvh.right[k])
+            inner = bvh.left[node] >= 0
+        self.__update(best, closest, nearest, *bvh.leaf_triangles(query, node), x)
+
+        # Every node closer than the best distance, one depth at a time
+        query = np.arange(n)
+        node = np.zeros(n, dtype=np.intp)
+        while len(query):
+            keep = bvh.box_distance2(x[query], node) < best[query]
+            query, node = query[keep], node[keep]
+            leaf = bvh.left[node] < 0
+            if leaf.any():
+                self.__update(best, closest, nearest, *bvh.leaf_triangles(query[leaf], node[leaf]), x)
+            query, node = query[~leaf], node[~leaf]
+            query = np.concatenate((query, query))
+            node = np.concatenate((bvh.left[node], bvh.right[node]))
+        return closest, np.sqrt(best), nearest
+
+    def inside(self, positions):
+        """
+        Whether (N, 3) locations are inside of the mesh, by the parity of the triangles crossed by a ray.
+        """
+        x = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        bvh = self.__bvh
+        crossings = np.zeros(len(x), dtype=np.intp)
+        query = np.arange(len(x)) if len(bvh) else np.zeros(0, dtype=np.intp)
+        node = np.zeros(len(query), dtype=np.intp)
+        while len(query):
+            keep = bvh.ray_crosses_boxes(x[query], RAY, node)
+            query, node = query[keep], node[keep]
+            leaf = bvh.left[node] < 0
+            if leaf.any():
+                q, t = bvh.leaf_triangles(query[leaf], node[leaf])
+                hit = ray_hits_triangles(x[q], RAY, self.__a[t], self.__b[t], self.__c[t])
+                crossings += np.bincount(q[hit], minlength=len(x))
+            query, node = query[~leaf], node[~leaf]
+            query = np.concatenate((query, query))
+            node = np.concatenate((bvh.left[node], bvh.right[node]))
+        return crossings % 2 == 1
+
+    def implicit_function_batch(self, positions):
+        _, distance, _ = self.closest_points(positions)
+        return np.where(self.inside(positions), -distance, distance)
+
+    def implicit_function(self, x):
+        return self.implicit_function_batch(x)[0]
+
+    def detect_batch(self, positions):
+        # The sign of the implicit function without the distance : collide_batch then only looks for the closest
+        # points of the colliding locations
+        return self.inside(positions) != self.is_containing
+
+    def contact_batch(self, positions):
+        x = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        cp, d, triangle = self.closest_points(x)
+        # From the contact point to the location, as the normals of Sphere, or the normal of the face on the mesh
+        n_cp = self.__normals[triangle].copy() if len(x) else np.zeros((0, 3))
+        away = d > 0
+        n_cp[away] = (x[away] - cp[away]) / d[away, np.newaxis]
+        return cp, d, n_cp
+
+    def contact(self, x):
+        cp, d, n_cp = self.contact_batch(x)
+        return cp[0], d[0], n_cp[0]
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+import numpy as np
+
+import app.solver.model.cell_grid as m_grid
+import app.solver.model.tree_search as m_tree
+import app.solver.model.vector as m_vec
+
+
+class NeighbourList(object):
+    """
+    Neighbours of every particle, in compressed sparse row form.
+
+    The neighbours of particle k are indices[offsets[k]:offsets[k + 1]], and r / distance hold the separation
+    x_k - x_j and its norm for the same pairs. The list is built once per step and shared by the density, the
+    forces and the surface tension.
+    """
+    def __init__(self, offsets, indices, r, distance, particles=None):
+        """
+
+            :param offsets: (N + 1,) start of the neighbours of every particle
+            :param indices: (M,) neighbour indices
+            :param r: (M, 3) separation vectors
+            :param distance: (M,) separation norms
+            :param particles: particle objects the indices refer to, if any
+        """
+        assert len(indices) == offsets[-1] == len(r) == len(distance)
+        self.__offsets = offsets
+        self.__indices = indices
+        self.__r = r
+        self.__distance = distance
+        self.__particles = particles
+        self.__owner = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+    def __len__(self):
+        return len(self.__offsets) - 1
+
+    @property
+    def offsets(self):
+        return self.__offsets
+
+    @property
+    def indices(self):
+        return self.__indices
+
+    @property
+    def owner(self):
+        """
+        Particle owning every pair, i.e. the row of every entry of indices.
+        """
+        return self.__owner
+
+    @property
+    def r(self):
+        return self.__r
+
+    @property
+    def distance(self):
+        return self.__distance
+
+    @property
+    def particles(self):
+        return self.__particles
+
+    @property
+    def pair_count(self):
+        return len(self.__indices)
+
+    def neighbours(self, k):
+        return self.__indices[self.__offsets[k]:self.__offsets[k + 1]]
+
+    def within(self, position, search_radius):
+        """
+        Sub-list of the pairs closer than search_radius[i], with the separations recomputed from position.
+
+            :param position: (N, 3) current locations, in the order of the rows of the list
+            :param search_radius: (N,) search radius of every particle
+        """
+        owner = self.__owner
+        r = position[owner] - position[self.__indices]
+        distance = np.sqrt(np.einsum('ij,ij->i', r, r))
+        keep = distance < search_radius[owner]
+        return NeighbourList.from_pairs(owner[keep], self.__indices[keep], r[keep], distance[keep], len(self),
+                                        self.__particles)
+
+    def reordered(self, order, count=None):
+        """
+        Sub-list of the rows order[:count], with every particle renumbered to its position in order. The other
+        rows are empty.
+
+            :param order: permutation of the particles
+            :param count: number of rows kept, all by default
+        """
+        n = len(order)
+        count = n if count is None else count
+        inverse = np.empty(n, dtype=np.intp)
+        inverse[order] = np.arange(n)
+        i = inverse[self.__owner]
+        keep = i < count
+        i, j = i[keep], inverse[self.__indices[keep]]
+        sort = np.lexsort((j, i))
+        particles = None if self.__particles is None else [self.__particles[k] for k in order]
+        return NeighbourList.from_pairs(i[sort], j[sort], self.__r[keep][sort], self.__distance[keep][sort], n,
+                                        particles)
+
+    def neighbourhood(self, k):
+        """
+        Neighbours of particle k with their separation vectors, for the per-particle State computations.
+        """
+        s = slice(self.__offsets[k], self.__offsets[k + 1])
+        particles = None
+        if self.__particles is not None:
+            particles = [self.__particles[j] for j in self.__indices[s]]
+        return Neighbourhood(self.__indices[s], self.__r[s], self.__distance[s], particles)
+
+    @classmethod
+    def from_pairs(cls, i, j, r, distance, n, particles=None):
+        """
+        Build the list from pairs sorted by i.
+        """
+        offsets = np.zeros(n + 1, dtype=np.intp)
+        np.cumsum(np.bincount(i, minlength=n), out=offsets[1:])
+        return cls(offsets, j, r, distance, particles)
+
+    @classmethod
+    def from_positions(cls, position, search_radius, backend="grid"):
+        """
+        Build the list of a ParticleArrays store.
+
+            :param backend: "grid" for a sorted cell list of the largest search radius, "tree" for a KD-tree,
+                            "auto" to choose from the occupancy of the grid (see m_tree.choose)
+        """
+        if backend == "auto":
+            backend = m_tree.choose(position, search_radius)
+        if backend == "tree":
+            grid = m_tree.TreeNeighbourSearch()
+        elif backend == "grid":
+            grid = m_grid.CellGrid(float(np.max(search_radius)) if len(position) else 1.)
+        else:
+            raise ValueError("unknown neighbour search backend " + repr(backend))
+        grid.build(position)
+        return cls.from_grid(grid, search_radius)
+
+    @classmethod
+    def from_grid(cls, grid, search_radius):
+        """
+        Build the list from a CellGrid, or a TreeNeighbourSearch, built on the positions of the particles.
+        """
+        i, j, r, distance = grid.neighbour_pairs(search_radius)
+        return cls.from_pairs(i, j, r, distance, len(search_radius))
+
+    @classmethod
+    def from_particles(cls, particles, search_radius):
+        """
+        Build the list of ActiveParticle objects with one search of their acceleration structure per particle.
+
+            :param particles: particles, in the order of the rows of the list
+            :param search_radius: function giving the search radius of a particle
+        """
+        particles = list(particles)
+        row = {id(p): k for k, p in enumerate(particles)}
+        position = np.array([p.current_location.value for p in particles], dtype=np.float64).reshape(-1, 3)
+
+        offsets = np.zeros(len(particles) + 1, dtype=np.intp)
+        indices = []
+        for k, p in enumerate(particles):
+            neigh = [row[id(n)] for n in p.neighbour(search_radius(p)) if id(n) in row]
+            neigh.sort()
+            indices.extend(neigh)
+            offsets[k + 1] = len(indices)
+        indices = np.array(indices, dtype=np.intp)
+
+        owner = np.repeat(np.arange(len(particles)), np.diff(offsets))
+        r = position[owner] - position[indices]
+        distance = np.sqrt(np.einsum('ij,ij->i', r, r))
+        return cls(offsets, indices, r, distance, particles)
+
+
+class VerletList(object):
+    """
+    Neighbour list with a skin, kept across steps.
+
+    Candidates are searched with a radius of search_radius + skin, and the list is only rebuilt once a particle
+    has moved by more than skin / 2 since the last build : until then no pair can have entered the search radius
+    without being a candidate. Every step the candidates are filtered with the current locations, so the list is
+    the same as a fresh search.
+    """
+    def __init__(self, skin=None, ratio=0.1):
+        """
+
+            :param skin: width of the skin, or None to take ratio times the largest search radius at the first build
+            :param ratio: skin relative to the search radius when skin is None
+            :type skin: float
+            :type ratio: float
+        """
+        self.__skin = skin
+        self.__ratio = ratio
+        self.__candidates = None
+        self.__reference = None
+        self.__key = None
+        self.__builds = 0
+        self.__steps = 0
+        self.__max_displacement = 0.
+
+    @property
+    def skin(self):
+        return self.__skin
+
+    @property
+    def builds(self):
+        return self.__builds
+
+    @property
+    def steps(self):
+        return self.__steps
+
+    @property
+    def statistics(self):
+        return {'skin': self.__skin,
+                'builds': self.__builds,
+                'steps': self.__steps,
+                'reused': self.__steps - self.__builds,
+                'max_displacement': self.__max_displacement}
+
+    def invalidate(self):
+        """
+        Force a rebuild at the next step, e.g. after particles were added, removed or reordered.
+        """
+        self.__candidates = None
+
+    def reorder(self, order, previous_key=None, key=None):
+        """
+        Follow a permutation of the particles, the new particle k being the old particle order[k], without
+        rebuilding the candidates.
+
+            :param previous_key: key of the rows before the permutation, the candidates are dropped if it is not
+                                 the one of their build
+            :param key: key of the rows after the permutation
+        """
+        if self.__candidates is None or previous_key != self.__key or len(self.__candidates) != len(order):
+            self.invalidate()
+            return
+        self.__candidates = self.__candidates.reordered(order)
+        self.__reference = self.__reference[order]
+        self.__key = key
+
+    def neighbour_list(self, position, search_radius, build=None, key=None, backend="grid"):
+        """
+        Neighbour list of the current step.
+
+            :param position: (N, 3) current locations
+            :param search_radius: (N,) search radius of every particle
+            :param build: function building the candidate NeighbourList for a (N,) search radius, a cell list of
+                          the positions by default
+            :param key: identifies the particles of the rows, a change triggers a rebuild
+            :param backend: neighbour search of the default build, see NeighbourList.from_positions
+        """
+        position = np.asarray(position, dtype=np.float64).reshape(-1, 3)
+        search_radius = np.asarray(search_radius, dtype=np.float64)
+        if self.__skin is None and len(search_radius):
+            self.__skin = self.__ratio * float(np.max(search_radius))
+        skin = self.__skin or 0.
+        self.__steps += 1
+
+        rebuild = self.__candidates is None or len(self.__candidates) != len(position) or key != self.__key
+        if not rebuild:
+            displacement = position - self.__reference
+            self.__max_displacement = float(np.sqrt(np.max(np.einsum('ij,ij->i', displacement, displacement),
+                                                            initial=0.)))
+            rebuild = self.__max_displacement > skin / 2
+        if rebuild:
+            if build is None:
+                self.__candidates = NeighbourList.from_positions(position, search_radius + skin, backend)
+            else:
+                self.__candidates = build(search_radius + skin)
+            self.__reference = position.copy()
+            self.__key = key
+            self.__max_displacement = 0.
+            self.__builds += 1
+        return self.__candidates.within(position, search_radius)
+
+
+class Neighbourhood(object):
+    """
+    Neighbours of one particle, read from a NeighbourList. Iterating over it yields the neighbour particles.
+    """
+    def __init__(self, indices, r, distance, particles=None):
+        self.__indices = indices
+        self.__r = r
+        self.__distance = distance
+        self.__particles = particles
+
+    def __len__(self):
+        return len(self.__indices)
+
+    def __iter__(self):
+        return iter(self.__particles if self.__particles is not None else self.__indices)
+
+    @property
+    def indices(self):
+        return self.__indices
+
+    @property
+    def r(self):
+        return self.__r
+
+    @property
+    def distance(self):
+        return self.__distance
+
+    @property
+    def particles(self):
+        return self.__particles
+
+    def pairs(self, vector=m_vec.Vector):
+        """
+        Yield every neighbour with its separation vector.
+
+            :param vector: type of the separation vectors, m_vec.Vector or m_vec.Vec3
+        """
+        if vector is m_vec.Vec3:
+            for n, r in zip(self, m_vec.from_array(self.__r)):
+                yield n, r
+        else:
+            for n, r in zip(self, self.__r):
+                yield n, vector(r)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Symmetric phases of the vectorized step, visiting every unordered pair of neighbours once.
+
+The kernels of a pair (i, j) are evaluated once, with the support of the mean radius of i and j, and the
+contribution of the pair is added to both particles : the kernel is even and its gradient odd. The pressure and
+viscosity coefficients of i on j and of j on i are averaged, so the pair forces are exactly opposite and the
+momentum is conserved. With particles of the same radius, mass and density it is the force of the row phases.
+'''
+
+import numpy as np
+
+import app.solver.model.batch as m_batch
+import app.solver.model.kernel as m_kern
+import app.solver.model.particle as m_part
+
+from app.solver.conf import *
+
+
+def unordered_pairs(state):
+    """
+    Every unordered pair of the neighbour list once, kept in state for the next phases of the step.
+
+    A pair is taken from the row of its smallest index when both rows hold it, and from the only row holding it
+    when the search radius of the other particle is shorter than their distance.
+
+        :return: i, j, r_ij = x_i - x_j and |r_ij|
+    """
+    if 'pairs' not in state:
+        i, j, distance = state['owner'], state['indices'], state['distance']
+        keep = (i < j) | ((i != j) & (distance >= state['search_radius'][j]))
+        state['pairs'] = (i[keep], j[keep], state['r'][keep], distance[keep])
+    return state['pairs']
+
+
+def _supports(state, i, j):
+    radius = state['radius']
+    return KERNEL_MULTIPLICATIVE * (radius[i] + radius[j]) / 2
+
+
+def _self(kernel_class, method, state):
+    """
+    Kernel of every particle with itself.
+    """
+    radius = state['radius']
+    return m_batch.kernel_by_support(kernel_class, method, KERNEL_MULTIPLICATIVE * radius, np.zeros(len(radius)))
+
+
+def density(state):
+    m = state['mass']
+    n = len(m)
+    i, j, r, distance = unordered_pairs(state)
+    w = m_batch.kernel_by_support(m_kern.SpikyKernel, 'evaluate', _supports(state, i, j), distance)
+    return m * _self(m_kern.SpikyKernel, 'evaluate', state) + m_batch.scatter_pairs(i, j, m[j] * w, m[i] * w, n)
+
+
+def _forces(state):
+    """
+    Pressure and viscosity forces, and surface tension force, from the same kernel evaluations.
+    """
+    m = state['mass']
+    n = len(m)
+    rho = state['density']
+    p = state['pressure']
+    u = state['velocity']
+    mu = state['mu']
+    l = state['l']
+    i, j, r, distance = unordered_pairs(state)
+    h = _supports(state, i, j)
+    grad_w_d = m_batch.kernel_by_support(m_kern.Poly6Kernel, 'gradient', h, r, distance)
+    lap_w_d = m_batch.kernel_by_support(m_kern.Poly6Kernel, 'laplacian', h, distance)
+    lap_w_v = m_batch.kernel_by_support(m_kern.ViscosityKernel, 'laplacian', h, distance)
+
+    # Pair forces, opposite on i and j
+    f_pres = - (p[i] + p[j]) / 4 * (m[j] / rho[j] + m[i] / rho[i])
+    f_visc = (mu[i] * m[j] / rho[i] + mu[j] * m[i] / rho[j]) / 2 * lap_w_v
+    force = f_pres[:, np.newaxis] * grad_w_d + (u[j] - u[i]) * f_visc[:, np.newaxis]
+    force_pair = m_batch.scatter_pairs(i, j, force, -force, n)
+
+    # Colour field, the gradient of a particle with itself is zero
+    volume = m / rho
+    std_grad = m_batch.scatter_pairs(i, j, volume[j, np.newaxis] * grad_w_d, - volume[i, np.newaxis] * grad_w_d, n)
+    cf_lap = volume * _self(m_kern.Poly6Kernel, 'laplacian', state) + \
+        m_batch.scatter_pairs(i, j, volume[j] * lap_w_d, volume[i] * lap_w_d, n)
+    std_grad_norm = np.sqrt(np.einsum('ij,ij->i', std_grad, std_grad))
+    surface = std_grad_norm >= l  # Only compute surface tension when close to the surface
+    force_st = np.zeros((n, 3))
+    force_st[surface] = (- state['sigma'] * cf_lap)[surface, np.newaxis] * std_grad[surface] / \
+        std_grad_norm[surface, np.newaxis]
+    return force_pair, force_st
+
+
+def pair_forces(state):
+    """
+    Pressure and viscosity forces, whose sum over the particles is zero.
+    """
+    return _forces(state)[0]
+
+
+def forces(state):
+    """
+    Resultant force of every particle : pressure, viscosity, surface tension and gravity.
+    """
+    force_pair, force_st = _forces(state)
+    force_grav = state['density'][:, np.newaxis] * np.asarray(m_part.GRAVITY)
+    return force_pair + force_st + force_grav
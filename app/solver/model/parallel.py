@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Parallel execution of the phases of the vectorized step.
+
+The particles are split into chunks of consecutive rows. Every phase is a function (state, start, stop) computing
+the rows [start, stop) from a dict of arrays, the chunks are run on a pool of workers and their results are
+concatenated in row order. The pairs of a row are read from the same slice of the neighbour list and reduced in the
+same order whatever the chunk, so the results do not depend on the number of workers.
+
+Process workers do not receive the arrays : they are copied into shared memory blocks once per phase and the
+workers attach to them, so only a small descriptor of the blocks is sent with every chunk. The other values of the
+state, the collision objects among them, are pickled into a block of their own, which is only rewritten when they
+change, and every worker unpickles them once per change.
+'''
+
+import concurrent.futures
+import math
+import pickle
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import app.solver.helper.grouper as h_group
+import app.solver.model.batch as m_batch
+import app.solver.model.kernel as m_kern
+import app.solver.model.particle as m_part
+
+from app.solver.conf import *
+
+EXECUTORS = {
+    "thread": concurrent.futures.ThreadPoolExecutor,
+    "process": concurrent.futures.ProcessPoolExecutor,
+}
+
+
+def chunks(n, size):
+    """
+    Split the rows [0, n) into (start, stop) ranges of size rows, the last one being shorter.
+    """
+    ranges = []
+    for group in h_group.grouper(range(n), size):
+        rows = [k for k in group if k is not None]
+        ranges.append((rows[0], rows[-1] + 1))
+    return ranges
+
+
+### Phases
+
+def _pairs(state, start, stop):
+    """
+    Pair slice of the rows [start, stop), with the owners relative to start.
+    """
+    s = slice(state['offsets'][start], state['offsets'][stop])
+    i = state['owner'][s]
+    return s, i, i - start, state['indices'][s]
+
+
+def density_rows(state, start, stop):
+    """
+    Density of the rows [start, stop).
+    """
+    s, i, local, j = _pairs(state, start, stop)
+    h = KERNEL_MULTIPLICATIVE * state['radius'][i]
+    w = m_batch.kernel_by_support(m_kern.SpikyKernel, 'evaluate', h, state['distance'][s])
+    return m_batch.scatter_add(local, state['mass'][j] * w, stop - start)
+
+
+def force_rows(state, start, stop):
+    """
+    Resultant force of the rows [start, stop) : pressure, viscosity, surface tension and gravity.
+    """
+    n = stop - start
+    m = state['mass']
+    rho = state['density']
+    p = state['pressure']
+    u = state['velocity']
+    mu = state['mu']
+    s, i, local, j = _pairs(state, start, stop)
+    r, distance = state['r'][s], state['distance'][s]
+    h = KERNEL_MULTIPLICATIVE * state['radius'][i]
+    grad_w_d = m_batch.kernel_by_support(m_kern.Poly6Kernel, 'gradient', h, r, distance)
+
+    # Surface tension, from the colour field of every pair (i == j included)
+    volume = m[j] / rho[j]
+    std_grad = m_batch.scatter_add(local, volume[:, np.newaxis] * grad_w_d, n)
+    lap_w_d = m_batch.kernel_by_support(m_kern.Poly6Kernel, 'laplacian', h, distance)
+    cf_lap = m_batch.scatter_add(local, volume * lap_w_d, n)
+    std_grad_norm = np.sqrt(np.einsum('ij,ij->i', std_grad, std_grad))
+    sigma = state['sigma'][start:stop]
+    surface = std_grad_norm >= state['l'][start:stop]  # Only compute surface tension when close to the surface
+    force_st = np.zeros((n, 3))
+    force_st[surface] = (- sigma * cf_lap)[surface, np.newaxis] * std_grad[surface] / \
+        std_grad_norm[surface, np.newaxis]
+
+    distinct = i != j
+    i, local, j = i[distinct], local[distinct], j[distinct]
+    distance, h, grad_w_d = distance[distinct], h[distinct], grad_w_d[distinct]
+
+    f_pres = -m[j] * rho[i] * ((p[i] + p[j]) / (2 * rho[i] * rho[j]))
+    force_pres = f_pres[:, np.newaxis] * grad_w_d
+    lap_w_v = m_batch.kernel_by_support(m_kern.ViscosityKernel, 'laplacian', h, distance)
+    f_visc = mu[i] * m[j] / rho[i] * lap_w_v
+    force_visc = (u[j] - u[i]) * f_visc[:, np.newaxis]
+    force_grav = rho[start:stop, np.newaxis] * np.asarray(m_part.GRAVITY)
+
+    return m_batch.scatter_add(local, force_pres + force_visc, n) + force_st + force_grav
+
+
+def collision_rows(state, start, stop):
+    """
+    Future locations and speeds of the rows [start, stop) after the reaction on every collision object.
+    """
+    position = np.array(state['future_location'][start:stop])
+    velocity = np.array(state['future_speed'][start:stop])
+    cr = state['cr'][start:stop]
+    for coll_obj in state['collisions_objects']:
+        coll_obj.react_batch(position, velocity, state['dt'], cr)
+    return np.concatenate((position, velocity), axis=1)
+
+
+### Shared memory
+
+# Key of the block holding the pickled values of a state, which cannot clash with the keys of the state
+VALUES = None
+
+
+def _unlink(blocks):
+    for block in blocks.values():
+        block.close()
+        block.unlink()
+    blocks.clear()
+
+
+class SharedArrays(object):
+    """
+    Shared memory blocks holding the arrays of a phase state, one per key, and its other values, pickled.
+
+    The blocks are kept across phases and steps and only reallocated, with twice the size, when an array outgrows
+    its block. They are unlinked by release, or when the SharedArrays is garbage collected or the interpreter
+    exits, whichever comes first.
+    """
+    def __init__(self):
+        self.__blocks = {}
+        self.__values = None
+        self.__version = 0
+        weakref.finalize(self, _unlink, self.__blocks)
+
+    @property
+    def nbytes(self):
+        """
+        Size of the allocated blocks.
+        """
+        return sum(block.size for block in self.__blocks.values())
+
+    def publish(self, state):
+        """
+        Copy the arrays of state into their blocks.
+
+            :param state: dict of arrays and of small picklable values
+            :return: descriptor of the state, to give to attach in the workers, and the number of bytes copied
+            :rtype: (dict, int)
+        """
+        arrays = {}
+        values = {}
+        copied = 0
+        for key, value in state.items():
+            if not isinstance(value, np.ndarray):
+                values[key] = value
+                continue
+            block = self.__block(key, value.nbytes)
+            np.ndarray(value.shape, value.dtype, buffer=block.buf)[...] = value
+            arrays[key] = (block.name, value.shape, value.dtype.str)
+            copied += value.nbytes
+
+        data = pickle.dumps(values, pickle.HIGHEST_PROTOCOL)
+        if data != self.__values:
+            block = self.__block(VALUES, len(data))
+            block.buf[:len(data)] = data
+            self.__values = data
+            self.__version += 1
+            copied += len(data)
+        values = (self.__blocks[VALUES].name, len(data), self.__version)
+        return {'arrays': arrays, 'values': values}, copied
+
+    def __block(self, key, nbytes):
+        """
+        Block of key, reallocated if it is smaller than nbytes.
+        """
+        block = self.__blocks.get(key)
+        if block is None or block.size < nbytes:
+            if block is not None:
+                block.close()
+                block.unlink()
+            size = max(nbytes, 2 * block.size if block is not None else 1, 1)
+            block = shared_memory.SharedMemory(create=True, size=size)
+            self.__blocks[key] = block
+        return block
+
+    def release(self):
+        _unlink(self.__blocks)
+        self.__values = None
+
+
+# Blocks attached by a worker process, by key, and the last values unpickled, with their block name and version
+_attached = {}
+_values = (None, None, {})
+
+
+def _attach_block(key, name):
+    block = _attached.get(key)
+    if block is None or block.name != name:
+        if block is not None:
+            block.close()
+        block = shared_memory.SharedMemory(name=name)
+        _attached[key] = block
+    return block
+
+
+def attach(descriptor):
+    """
+    Rebuild a phase state in a worker, with arrays viewing the shared memory blocks.
+    """
+    global _values
+    name, size, version = descriptor['values']
+    if _values[:2] != (name, version):
+        block = _attach_block(VALUES, name)
+        _values = (name, version, pickle.loads(bytes(block.buf[:size])))
+    state = dict(_values[2])
+    for key, (name, shape, dtype) in descriptor['arrays'].items():
+        block = _attach_block(key, name)
+        state[key] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+    return state
+
+
+def _run_shared(function, descriptor, start, stop):
+    return function(attach(descriptor), start, stop)
+
+
+### Execution
+
+class PhaseExecutor(object):
+    """
+    Run the phases of a step chunk by chunk, in the calling thread or on a thread or process pool.
+
+    Thread workers suit the numpy phases, which release the GIL on large arrays ; process workers attach to the
+    state of the phase in shared memory. The cost of the communication with the workers since the last
+    reset_statistics is given by statistics.
+    """
+    def __init__(self, workers=NUM_WORKER, kind="thread", group_by=GROUP_BY_LOW):
+        """
+
+            :param workers: number of workers, 0 or 1 to run every phase in the calling thread
+            :param kind: "thread" or "process"
+            :param group_by: smallest number of particles of a chunk
+            :type workers: int
+            :type kind: str
+            :type group_by: int
+        """
+        if kind not in EXECUTORS:
+            raise ValueError("Unknown executor : " + str(kind))
+        self.__workers = workers
+        self.__kind = kind
+        self.__group_by = group_by
+        self.__pool = None
+        self.__shared = None
+        self.reset_statistics()
+
+    @property
+    def workers(self):
+        return self.__workers
+
+    @property
+    def kind(self):
+        return self.__kind
+
+    @property
+    def group_by(self):
+        return self.__group_by
+
+    @property
+    def statistics(self):
+        """
+        Communication with the workers : chunks run, bytes copied to shared memory, bytes pickled to and from the
+        workers, and seconds spent copying and waiting for the workers.
+        """
+        return dict(self.__statistics)
+
+    def reset_statistics(self):
+        self.__statistics = {'phases': 0,
+                             'tasks': 0,
+                             'shared_bytes': 0,
+                             'sent_bytes': 0,
+                             'received_bytes': 0,
+                             'publish_time': 0.,
+                             'wait_time': 0.}
+
+    def chunks(self, n):
+        size = max(self.__group_by, int(math.ceil(n / max(self.__workers, 1))), 1)
+        return chunks(n, size)
+
+    def map(self, function, state, n):
+        """
+        Run function on every chunk of the rows [0, n) and concatenate the results in row order.
+        """
+        ranges = self.chunks(n)
+        if self.__workers <= 1 or len(ranges) <= 1:
+            return function(state, 0, n)
+        if self.__pool is None:
+            self.__pool = EXECUTORS[self.__kind](max_workers=self.__workers)
+        statistics = self.__statistics
+        statistics['phases'] += 1
+        statistics['tasks'] += len(ranges)
+
+        if self.__kind == "thread":
+            futures = [self.__pool.submit(function, state, start, stop) for start, stop in ranges]
+        else:
+            tic = time.perf_counter()
+            if self.__shared is None:
+                self.__shared = SharedArrays()
+            descriptor, copied = self.__shared.publish(state)
+            statistics['shared_bytes'] += copied
+            statistics['publish_time'] += time.perf_counter() - tic
+            task_bytes = len(pickle.dumps((function, descriptor, 0, n), pickle.HIGHEST_PROTOCOL))
+            statistics['sent_bytes'] += task_bytes * len(ranges)
+            futures = [self.__pool.submit(_run_shared, function, descriptor, start, stop) for start, stop in ranges]
+
+        tic = time.perf_counter()
+        results = [f.result() for f in futures]
+        statistics['wait_time'] += time.perf_counter() - tic
+        if self.__kind == "process":
+            statistics['received_bytes'] += sum(r.nbytes for r in results)
+        return np.concatenate(results)
+
+    def shutdown(self):
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+        if self.__shared is not None:
+            self.__shared.release()
+            self.__shared = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
@@ -24,6 +24,9 @@ from math import *
 import app.solver.model.vector as m_vec
 import app.solver.model.kernel as m_kern
 import app.solver.model.hash_table as m_hash
+import app.solver.model.cell_grid as m_grid
+import app.solver.model.tree_search as m_tree
+import app.solver.model.neighbour_list as m_nl
 
 RAD_MUL = 2
 ATMOSPHERIC_PRESSURE = 1
@@ -47,7 +50,7 @@ class ActiveParticle(object):
             :param speed: speed
             :param acceleration: acceleration
             :param rad_mul: multiplier factor
-            :type hash_particle: m_hash.Hash (hash_particle)
+            :type hash_particle: m_hash.Hash, m_grid.CellGrid or m_tree.TreeNeighbourSearch (hash_particle)
             :type location: point.Point (vector)
             :type radius: float
             :type rad_mul: float
@@ -55,7 +58,7 @@ class ActiveParticle(object):
             :type speed: vector (m_vec)
             :type: acceleration: vector
         """
-        assert isinstance(hash_particle, m_hash.Hash)
+        assert isinstance(hash_particle, (m_hash.Hash, m_grid.CellGrid, m_tree.TreeNeighbourSearch))
         self.__hash_particle = hash_particle
 
         # Constant properties
@@ -295,6 +298,21 @@ class ActiveParticle(object):
 ############################################### Definition of the states ###############################################
 
 
+def pairs(particle, neighbour, vector=m_vec.Vector):
+    """
+    Yield (n, r) for every neighbour n of particle, with r = x_particle - x_n.
+
+    The separation vectors are read from the neighbour list when neighbour is a Neighbourhood, and computed when
+    it is a plain list of particles.
+
+        :param vector: type of the separation vectors, m_vec.Vector or m_vec.Vec3
+    """
+    if isinstance(neighbour, m_nl.Neighbourhood):
+        return neighbour.pairs(vector)
+    x = particle.current_location.value
+    return ((n, vector((x - n.current_location.value).tolist())) for n in neighbour)
+
+
 class State(object):
     """
     This class defines a state (force, temp).
@@ -339,8 +357,7 @@ class Density(State):
 
     def __call__(self, particle, neighbour):
         density = 0
-        for n in neighbour:
-            r = particle.current_location.value - n.current_location.value
+        for n, r in pairs(particle, neighbour, m_vec.Vec3):
             density += self.factor(n) * self.__kernel.__call__(r)
         self.value = density
 
@@ -363,15 +380,13 @@ class ColourField(State):
 
     def __call__(self, particle, neighbour):
         colour = 0
-        for n in neighbour:
-            r = particle.current_location.value - n.current_location.value
+        for n, r in pairs(particle, neighbour, m_vec.Vec3):
             colour += self.factor(n) * self.__kernel.__call__(r)
         return colour
 
     def laplacian(self, particle, neighbour):
         colour = 0
-        for n in neighbour:
-            r = particle.current_location.value - n.current_location.value
+        for n, r in pairs(particle, neighbour, m_vec.Vec3):
             colour += self.factor(n) * self.__kernel.laplacian(r)
         return colour
 
@@ -388,17 +403,15 @@ class DirectionSurfaceTension(State):
 
     def __call__(self, particle, neighbour):
         n = m_vec.Vector([0, 0, 0])
-        for neigh in neighbour:
-            r = particle.current_location.value - neigh.current_location.value
+        for neigh, r in pairs(particle, neighbour):
             n += self.factor(neigh) * self.__kernel.__call__(r)
         return n
 
     def gradient(self, particle, neighbour):
-        n = m_vec.Vector([0, 0, 0])
-        for neigh in neighbour:
-            r = particle.current_location.value - neigh.current_location.value
+        n = m_vec.Vec3()
+        for neigh, r in pairs(particle, neighbour, m_vec.Vec3):
             n += self.factor(neigh) * self.__kernel.gradient(r)
-        return n
+        return m_vec.Vector(tuple(n))
 
 
 class Pressure(State):
@@ -433,18 +446,18 @@ class Force(State):
 
     def __call__(self, particle, neighbour):
         assert isinstance(particle, ActiveParticle)
-        assert isinstance(neighbour, list)
-        resultant = m_vec.Vector([0, 0, 0])
+        assert isinstance(neighbour, (list, m_nl.Neighbourhood))
+        # Accumulated on Vec3, so that no array is allocated per pair
+        resultant = m_vec.Vec3()
         w = self.kernel.gradient
-        for n in neighbour:
+        for n, r in pairs(particle, neighbour, m_vec.Vec3):
             assert isinstance(n, ActiveParticle)
             if not n is particle:
-                r = particle.current_location.value - n.current_location.value
                 f = self.factor(particle, n)
                 ker = w(r)
                 resultant += f * ker
-        self.value = resultant
-        return resultant
+        self.value = m_vec.Vector(tuple(resultant))
+        return self.value
 
 
 class ForcePressure(Force):
@@ -477,34 +490,33 @@ class ForceViscosity(Force):
             :type particle: particle
             :type n: particle
             :return: viscosity force
-            :rtype: float
+            :rtype: m_vec.Vec3
         """
         assert isinstance(particle, ActiveParticle)
         assert isinstance(n, ActiveParticle)
 
-        u_i = particle.current_speed.value
-        u_j = n.current_speed.value
+        u_i = particle.current_speed.value.tolist()
+        u_j = n.current_speed.value.tolist()
         m_j = n.mass
         rho_i = particle.density.value
         mu = particle.fluid.mu
-        return (u_j - u_i) * mu * m_j / rho_i
+        return (m_vec.Vec3(u_j) - u_i) * (mu * m_j / rho_i)
 
     def __call__(self, particle, neighbour):
         assert isinstance(particle, ActiveParticle)
-        assert isinstance(neighbour, list)
-        resultant = m_vec.Vector([0, 0, 0])
+        assert isinstance(neighbour, (list, m_nl.Neighbourhood))
+        resultant = m_vec.Vec3()
         w = self.kernel.laplacian
-        for n in neighbour:
+        for n, r in pairs(particle, neighbour, m_vec.Vec3):
             assert isinstance(n, ActiveParticle)
             if not n is particle:
-                r = particle.current_location.value - n.current_location.value
                 f = self.factor(particle, n)
-                assert isinstance(f, m_vec.Vector)
+                assert isinstance(f, m_vec.Vec3)
                 wr = w(r)
                 assert isinstance(wr, float) or isinstance(wr, int)
                 resultant += f * wr
-        self.value = resultant
-        return resultant
+        self.value = m_vec.Vector(tuple(resultant))
+        return self.value
 
 
 class ForceSurfaceTension(Force):
@@ -512,15 +524,11 @@ class ForceSurfaceTension(Force):
         assert isinstance(part, ActiveParticle)
         resultant = m_vec.Vector([0, 0, 0])
         cf = ColourField("CF", self.kernel, 0)
-        #cf_val = cf.__call__(part, neighbour)
         std = DirectionSurfaceTension("STD", self.kernel, 0)
-        #std_vec = std.__call__(part, neighbour)
-        #std_grad = std.gradient(part, neighbour)
-        std_grad_norm = std.gradient(part, neighbour).norm()
+        std_grad = std.gradient(part, neighbour)
+        std_grad_norm = std_grad.norm()
         if std_grad_norm >= part.fluid.l:  # Only compute surface tension when close to the surface
-            for n in neighbour:
-                resultant = - part.fluid.sigma * cf.laplacian(part, n) * std.gradient(part, n) / \
-                    std.gradient(part, n).m_vec.Vector.norm(n)
+            resultant = - part.fluid.sigma * cf.laplacian(part, neighbour) * std_grad / std_grad_norm
         self.value = resultant
         return resultant
 
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+from math import *
+
+import numpy as np
+
+import app.solver.model.particle as m_part
+
+DEFAULT_CAPACITY = 64
+
+
+class ParticleArrays(object):
+    """
+    Structure-of-arrays particle store.
+
+    Every particle is a row index shared by contiguous float64 arrays, instead of an ActiveParticle object holding
+    eight State wrappers. The arrays are over-allocated and grown by doubling ; the properties only expose the
+    first len(self) rows, as views, so in place updates are written back to the store.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """
+
+            :param capacity: number of rows allocated up front
+            :type capacity: int
+        """
+        assert isinstance(capacity, int) and capacity > 0
+        self.__n = 0
+        self.__revision = 0
+        self.__fluids = []
+
+        self.__columns = {
+            'position': np.zeros((capacity, 3)),
+            'velocity': np.zeros((capacity, 3)),
+            'acceleration': np.zeros((capacity, 3)),
+            'force': np.zeros((capacity, 3)),
+            'density': np.zeros(capacity),
+            'pressure': np.zeros(capacity),
+            'mass': np.zeros(capacity),
+            'radius': np.zeros(capacity),
+            'fluid_id': np.zeros(capacity, dtype=np.intp),
+        }
+
+    def __len__(self):
+        return self.__n
+
+    def __repr__(self):
+        return " ParticleArrays : (" + str(self.__n) + " particles)"
+
+    ### Storage
+
+    @property
+    def capacity(self):
+        return self.__columns['position'].shape[0]
+
+    @property
+    def revision(self):
+        """
+        Counter incremented whenever rows are added, removed or permuted, i.e. whenever indices may change.
+        """
+        return self.__revision
+
+    @property
+    def columns(self):
+        """
+        Names of the per-particle arrays.
+        """
+        return list(self.__columns)
+
+    def reserve(self, capacity):
+        """
+        Grow every array so that it can hold at least capacity rows.
+        """
+        if capacity <= self.capacity:
+            return
+        new_capacity = max(capacity, 2 * self.capacity)
+        for name, old in self.__columns.items():
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.__n] = old[:self.__n]
+            self.__columns[name] = new
+
+    ### Columns
+
+    @property
+    def position(self):
+        return self.__columns['position'][:self.__n]
+
+    @property
+    def velocity(self):
+        return self.__columns['velocity'][:self.__n]
+
+    @property
+    def acceleration(self):
+        return self.__columns['acceleration'][:self.__n]
+
+    @property
+    def force(self):
+        return self.__columns['force'][:self.__n]
+
+    @property
+    def density(self):
+        return self.__columns['density'][:self.__n]
+
+    @property
+    def pressure(self):
+        return self.__columns['pressure'][:self.__n]
+
+    @property
+    def mass(self):
+        return self.__columns['mass'][:self.__n]
+
+    @property
+    def radius(self):
+        return self.__columns['radius'][:self.__n]
+
+    @property
+    def fluid_id(self):
+        return self.__columns['fluid_id'][:self.__n]
+
+    ### Fluids
+
+    @property
+    def fluids(self):
+        return self.__fluids
+
+    def fluid_index(self, fluid):
+        """
+        Return the id of fluid, registering it on first use. Fluids are compared by identity.
+        """
+        for i, f in enumerate(self.__fluids):
+            if f is fluid:
+                return i
+        self.__fluids.append(fluid)
+        return len(self.__fluids) - 1
+
+    def fluid(self, i):
+        return self.__fluids[self.fluid_id[i]]
+
+    def fluid_property(self, name):
+        """
+        Broadcast a fluid attribute (rho0, k, mu, sigma, l, cr) to one value per particle.
+
+            :param name: name of the Fluid property
+            :type name: str
+            :rtype: numpy.ndarray
+        """
+        if not self.__fluids:
+            return np.zeros(self.__n)
+        values = np.array([getattr(f, name) for f in self.__fluids], dtype=np.float64)
+        return values[self.fluid_id]
+
+    ### Functions
+
+    def append(self, location, fluid, radius, speed=None, acceleration=None):
+        """
+        Add a particle and return its index.
+
+            :param location: location of the particle
+            :param fluid: fluid of the particle
+            :param radius: parameter h
+            :param speed: speed
+            :param acceleration: acceleration
+            :type location: vector (m_vec)
+            :type fluid: fluid
+            :type radius: float
+            :rtype: int
+        """
+        i = self.__n
+        self.reserve(i + 1)
+        self.__n += 1
+        self.__revision += 1
+
+        c = self.__columns
+        c['position'][i] = location
+        c['velocity'][i] = 0 if speed is None else speed
+        c['acceleration'][i] = 0 if acceleration is None else acceleration
+        c['force'][i] = 0
+
+        c['radius'][i] = radius
+        c['mass'][i] = 4. / 3. * pi * radius ** 3 * fluid.rho0
+        c['density'][i] = fluid.rho0
+        c['pressure'][i] = m_part.ATMOSPHERIC_PRESSURE
+        c['fluid_id'][i] = self.fluid_index(fluid)
+        return i
+
+    def remove(self, i):
+        """
+        Remove particle i by moving the last row into its slot, so the index of the last particle changes.
+        """
+        last = self.__n - 1
+        if not 0 <= i <= last:
+            raise IndexError(i)
+        for array in self.__columns.values():
+            array[i] = array[last]
+        self.__n -= 1
+        self.__revision += 1
+
+    def reorder(self, order):
+        """
+        Permute every array so that the new row k is the old row order[k], e.g. to store particles of the same
+        cell contiguously. Indices held outside of the store must be remapped by the caller.
+        """
+        order = np.asarray(order)
+        assert len(order) == self.__n
+        for array in self.__columns.values():
+            array[:self.__n] = array[:self.__n][order]
+        self.__revision += 1
+
+    def neighbour(self, i, h):
+        """
+        Indices of the particles closer than h to particle i (particle i included), by brute force.
+        """
+        distance = np.sqrt(np.sum((self.position - self.position[i]) ** 2, axis=1))
+        return np.flatnonzero(distance < h)
+
+    @classmethod
+    def from_particles(cls, particles):
+        """
+        Build a store from the current state of ActiveParticle objects.
+        """
+        particles = list(particles)
+        store = cls(max(len(particles), 1))
+        for p in particles:
+            assert isinstance(p, m_part.ActiveParticle)
+            i = store.append(p.current_location.value, p.fluid, p.radius,
+                             speed=p.current_speed.value, acceleration=p.current_acceleration.value)
+            store.density[i] = p.density.value
+            store.pressure[i] = p.pressure.value
+        return store
+
+    @classmethod
+    def from_hash(cls, hashing):
+        """
+        Build a store from every particle of an acceleration structure.
+        """
+        return cls.from_particles(p for bucket in hashing.hash_table.values() for p in bucket)
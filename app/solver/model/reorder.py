@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Reordering of the particle arrays along a Morton curve, so that particles close in space are close in memory and
+the neighbours gathered by the density and force loops share cache lines.
+'''
+
+import numpy as np
+
+import app.solver.model.cell_key as m_key
+
+
+def morton_order(position, cell_size):
+    """
+    Permutation sorting positions by the Morton code of their cell, stable within a cell.
+
+        :param position: (N, 3) locations
+        :param cell_size: size of the cells
+        :rtype: numpy.ndarray
+    """
+    position = np.asarray(position, dtype=np.float64).reshape(-1, 3)
+    if len(position) == 0:
+        return np.zeros(0, dtype=np.intp)
+    cell = np.floor(position / cell_size).astype(np.int64)
+    # Cells relative to the lowest one, so that any extent below 2 ** KEY_BITS cells can be keyed
+    cell -= cell.min(axis=0) + m_key.KEY_OFFSET
+    return np.argsort(m_key.morton(cell), kind='stable')
+
+
+def locality(position, cell_size):
+    """
+    Mean distance between particles of consecutive rows, in cells : about one when the rows follow space, about
+    the size of the domain when they are scattered.
+    """
+    position = np.asarray(position, dtype=np.float64).reshape(-1, 3)
+    if len(position) < 2:
+        return 0.
+    step = np.diff(position, axis=0)
+    return float(np.mean(np.sqrt(np.einsum('ij,ij->i', step, step)))) / cell_size
+
+
+class MortonReorder(object):
+    """
+    When to reorder the particle arrays : every `every` steps, or as soon as the locality has grown by more than
+    `degradation` times its value after the last reordering.
+
+    It keeps the original row of every current row, to find particles from indices taken before the reorderings.
+    """
+    def __init__(self, every=20, degradation=None):
+        """
+
+            :param every: number of steps between two reorderings, None to only watch the locality
+            :param degradation: reorder when the locality exceeds degradation times its value after the last
+                                reordering, None to only reorder every `every` steps
+            :type every: int
+            :type degradation: float
+        """
+        if every is None and degradation is None:
+            raise ValueError("MortonReorder needs a period or a degradation factor")
+        self.__every = every
+        self.__degradation = degradation
+        self.__steps = 0
+        self.__reference = None
+        self.__origin = None
+        self.__reorders = 0
+        self.__locality = None
+
+    @property
+    def origin(self):
+        """
+        Row of every current row before the first reordering, reset when the number of particles changes.
+        """
+        return self.__origin
+
+    @property
+    def statistics(self):
+        """
+        Number of reorderings, and locality of the last step before and after its reordering.
+        """
+        return {'reorders': self.__reorders,
+                'locality': self.__locality,
+                'reference': self.__reference}
+
+    def order(self, position, cell_size):
+        """
+        Permutation to apply to the arrays at this step, None when they are kept as they are.
+
+            :param position: (N, 3) locations
+            :param cell_size: size of the cells, the largest search radius
+        """
+        n = len(position)
+        if self.__origin is None or len(self.__origin) != n:
+            self.__origin = np.arange(n)
+            self.__steps = 0
+            self.__reference = None
+        self.__steps += 1
+        self.__locality = locality(position, cell_size)
+        due = self.__reference is None
+        if self.__every is not None:
+            due = due or self.__steps >= self.__every
+        if self.__degradation is not None and self.__reference is not None:
+            due = due or self.__locality > self.__degradation * self.__reference
+        if not due:
+            return None
+
+        order = morton_order(position, cell_size)
+        self.__origin = self.__origin[order]
+        self.__reference = locality(position[order], cell_size)
+        self.__steps = 0
+        self.__reorders += 1
+        return order
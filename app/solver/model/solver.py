@@ -25,8 +25,18 @@ import numpy as np
 import random
 
 import app.solver.model.fluid as m_flu
+import app.solver.model.integrator as m_int
 import app.solver.model.particle as m_part
+import app.solver.model.particle_arrays as m_arr
+import app.solver.model.batch as m_batch
+import app.solver.model.broad_phase as m_bp
+import app.solver.model.neighbour_list as m_nl
+import app.solver.model.pair_engine as m_pair
+import app.solver.model.parallel as m_par
+import app.solver.model.reorder as m_ord
 import app.solver.model.collision as m_col
+import app.solver.model.time_step as m_ts
+import app.solver.model.tree_search as m_tree
 import app.solver.model.kernel as m_kern
 import app.solver.model.vector as m_vec
 
@@ -34,19 +44,92 @@ from app.solver.conf import *
 
 
 class SphSolver():
-    def __init__(self, tt, dt, hashing, collisions_objects=None):
+    def __init__(self, tt, dt, hashing, collisions_objects=None, vectorized=False, verlet_skin=None, workers=None,
+                 executor="thread", symmetric=False, adaptive=None, block_levels=None,
+                 integrator="euler", reorder=None, neighbour_search="grid", broad_phase=False):
         """
 
         :param tt: total times
-        :param dt: interval / step
+        :param dt: interval / step, the largest one in adaptive mode
+        :param hashing: acceleration structure of ActiveParticle objects, or a ParticleArrays store
+        :param vectorized: compute each step with batched numpy operations over neighbour pairs
+        :param verlet_skin: keep the neighbour lists across steps with this skin, True to choose it from the
+                            search radius, None to search the neighbours every step
+        :param workers: run the phases of the vectorized step on this many workers, True for NUM_WORKER
+        :param executor: "thread" or "process" pool of the workers
+        :param symmetric: compute the vectorized step once per unordered pair, with momentum conserving forces
+        :param adaptive: choose dt at every step with this m_ts.AdaptiveTimeStep, True for the default criteria
+        :param block_levels: split every step of the vectorized step into power of two time steps per particle,
+                             down to dt / 2 ** block_levels, from the criteria of adaptive
+        :param integrator: time integrator of a ParticleArrays store, a name of m_int.INTEGRATORS or an Integrator
+        :param reorder: sort a ParticleArrays store along a Morton curve every this many steps, or when this
+                        m_ord.MortonReorder says so, True for the default policy
+        :param neighbour_search: neighbour search of a ParticleArrays store, "grid" for a cell list, "tree" for a
+                                 KD-tree, or "auto" to choose at every search from the occupancy of the grid
+        :param broad_phase: only test the particles in the cells overlapped by the bounding boxes of the
+                            collision objects, see m_bp.BroadPhase
         :type tt: float
         :type dt: float
+        :type hashing: m_hash.Hash or m_arr.ParticleArrays
+        :type vectorized: bool
+        :type verlet_skin: float or bool
+        :type workers: int or bool
+        :type executor: str
+        :type symmetric: bool
+        :type adaptive: m_ts.AdaptiveTimeStep or bool
+        :type block_levels: int
+        :type integrator: str or m_int.Integrator
+        :type reorder: int or m_ord.MortonReorder or bool
+        :type neighbour_search: str
+        :type broad_phase: bool
         """
         self.__tt = tt
         self.__t = 0
         self.__dt = dt
+        self.__dt_max = dt
+        self.__time_step = m_ts.AdaptiveTimeStep() if adaptive is True else (adaptive or None)
+        self.__integrator = m_int.integrator(integrator)
+        if not isinstance(self.__integrator, m_int.SemiImplicitEuler) and \
+                (not isinstance(hashing, m_arr.ParticleArrays) or block_levels is not None):
+            raise TypeError("The integrators run on the steps of a ParticleArrays store, without block time steps")
+        self.__block = None
+        if block_levels is not None:
+            if not vectorized or symmetric:
+                raise TypeError("The block time steps run in the vectorized step, on the row phases")
+            self.__block = m_ts.BlockTimeStep(block_levels)
+            self.__time_step = self.__time_step or m_ts.AdaptiveTimeStep()
         self.__particles = hashing
         self.__collisions_objects = [] if collisions_objects is None else collisions_objects
+        self.__use_broad_phase = broad_phase
+        self.__broad_phase = None
+        if vectorized and not isinstance(hashing, m_arr.ParticleArrays):
+            raise TypeError("The vectorized step runs on a ParticleArrays store")
+        self.__vectorized = vectorized
+        if workers is not None and workers is not False and not vectorized:
+            raise TypeError("The phases run on workers in the vectorized step")
+        if symmetric and not vectorized:
+            raise TypeError("The symmetric forces are computed in the vectorized step")
+        self.__symmetric = symmetric
+        workers = NUM_WORKER if workers is True else (workers or 0)
+        self.__executor = m_par.PhaseExecutor(workers, executor)
+        if reorder is not None and reorder is not False and not isinstance(hashing, m_arr.ParticleArrays):
+            raise TypeError("The Morton reordering runs on a ParticleArrays store")
+        if reorder is True:
+            reorder = m_ord.MortonReorder()
+        elif isinstance(reorder, int) and not isinstance(reorder, bool):
+            reorder = m_ord.MortonReorder(reorder)
+        self.__reorder = reorder or None
+        if neighbour_search not in ("grid", "tree", "auto"):
+            raise ValueError("unknown neighbour search " + repr(neighbour_search))
+        if neighbour_search != "grid" and not isinstance(hashing, m_arr.ParticleArrays):
+            raise TypeError("The neighbour search of ActiveParticle objects is their acceleration structure")
+        self.__neighbour_search = neighbour_search
+        self.__neighbour_backend = None
+        self.__verlet = None
+        # Particle ids of the rows of the Verlet list, object path
+        self.__verlet_ids = None
+        if verlet_skin is not None and verlet_skin is not False:
+            self.__verlet = m_nl.VerletList(None if verlet_skin is True else verlet_skin)
 
     @property
     def t(self):
@@ -76,6 +159,105 @@ class SphSolver():
     def particles(self):
         return self.__particles
 
+    @property
+    def broad_phase(self):
+        """
+        BroadPhase in front of the collision objects, None until the first collision check or when disabled.
+        """
+        return self.__broad_phase
+
+    def __colliders(self, future_speed, radius):
+        """
+        Collision objects reacting on the particles, behind the broad phase when it is enabled.
+
+            :param future_speed: (N, 3) speeds of the step, giving the largest displacement
+            :param radius: (N,) radius of the particles, giving the cell size of the broad phase
+        """
+        if not self.__use_broad_phase or not self.collisions_objects:
+            return self.collisions_objects
+        margin = float(np.sqrt(np.max(np.einsum('ij,ij->i', future_speed, future_speed), initial=0.))) * self.dt
+        if self.__broad_phase is None:
+            cell_size = RADIUS_MULTIPLICATIVE * float(np.max(radius, initial=0.)) or 1.
+            self.__broad_phase = m_bp.BroadPhase(self.collisions_objects, cell_size, margin)
+        else:
+            self.__broad_phase.reserve(margin)
+        return [self.__broad_phase]
+
+    @property
+    def vectorized(self):
+        return self.__vectorized
+
+    @property
+    def time_step(self):
+        """
+        AdaptiveTimeStep choosing dt, None for a fixed dt.
+        """
+        return self.__time_step
+
+    @property
+    def integrator(self):
+        return self.__integrator
+
+    @property
+    def block(self):
+        """
+        BlockTimeStep of the particles, None when every particle moves with dt.
+        """
+        return self.__block
+
+    @property
+    def reorder(self):
+        """
+        MortonReorder of the particle arrays, None when they are never reordered.
+        """
+        return self.__reorder
+
+    @property
+    def symmetric(self):
+        return self.__symmetric
+
+    @property
+    def neighbour_search(self):
+        return self.__neighbour_search
+
+    @property
+    def neighbour_backend(self):
+        """
+        Backend of the last neighbour search of a ParticleArrays store, "grid" or "tree".
+        """
+        return self.__neighbour_backend
+
+    @property
+    def verlet(self):
+        """
+        Verlet list of the neighbour search, its statistics give the skin and the number of rebuilds.
+        """
+        return self.__verlet
+
+    @property
+    def executor(self):
+        """
+        PhaseExecutor running the phases of the vectorized step.
+        """
+        return self.__executor
+
+    @property
+    def ipc_statistics(self):
+        """
+        Cost of the communication with the workers during the last step, see PhaseExecutor.statistics.
+        """
+        return self.__executor.statistics
+
+    def shutdown(self):
+        """
+        Stop the workers of the vectorized step and release their shared memory.
+        """
+        self.__executor.shutdown()
+
+    @property
+    def is_columnar(self):
+        return isinstance(self.__particles, m_arr.ParticleArrays)
+
     def create_active_particle(self, location, fluid, radius, fluid_type="liquid", gravity=True, speed=m_vec.Vector([0, 0, 0])):
         """
 
@@ -85,15 +267,18 @@ class SphSolver():
         :type location: vector (m_vec)
         :type radius: float
         :type fluid: fluid
+        :return: the particle, or its index when the solver runs on a ParticleArrays store
         """
+        if self.is_columnar:
+            return self.particles.append(location, fluid, radius, speed=speed)
 
         act_part = m_part.ActiveParticle(self.particles, location, fluid, radius, speed=speed)
         h = str(hash(act_part))
         vec_null = m_vec.Vector([0, 0, 0])
 
-        k_d = m_kern.Poly6Kernel(radius * 3)
-        k_v = m_kern.ViscosityKernel(radius * 3)
-        k_s = m_kern.SpikyKernel(radius * 3)
+        k_d = m_kern.Poly6Kernel(radius * KERNEL_MULTIPLICATIVE)
+        k_v = m_kern.ViscosityKernel(radius * KERNEL_MULTIPLICATIVE)
+        k_s = m_kern.SpikyKernel(radius * KERNEL_MULTIPLICATIVE)
 
         if fluid_type == "liquid" or fluid_type == "gaz":
             d = m_part.Density("Density of " + h, k_s, fluid.rho0)
@@ -120,10 +305,25 @@ class SphSolver():
 
     def step(self):
         print(self.t)
+        if self.reorder is not None:
+            self.__reorder_arrays()
+        if self.block is not None:
+            self.__step_block()
+            return
+        if self.time_step is not None:
+            self.__adapt_time_step()
+        if self.vectorized:
+            self.__step_vectorized()
+            return
+        if self.is_columnar:
+            self.__step_arrays()
+            return
+        # Search the neighbours once, they are shared by the density and the force computations
+        neighbours = self.__search_neighbours()
         # Compute density and pressure
-        self.__compute_density_and_pressure()
+        self.__compute_density_and_pressure(neighbours)
         # Compute forces and integrate
-        self.__compute_forces_and_integrate()
+        self.__compute_forces_and_integrate(neighbours)
         # Check for collision
         self.__check_for_collision()
         # Generate numpy array
@@ -132,53 +332,122 @@ class SphSolver():
         self.__update()
         #return np_array
 
-    def __compute_density_and_pressure(self):
+    def __adapt_time_step(self):
+        """
+        Set dt to the largest stable time step of the current state, without going past tt.
+        """
+        if self.is_columnar:
+            particles = self.particles
+            radius = particles.radius
+            speed = particles.velocity
+            acceleration = particles.acceleration
+            mu = particles.fluid_property('mu')
+            rho0 = particles.fluid_property('rho0')
+            k = particles.fluid_property('k')
+        else:
+            particles = [particle for list_particles in self.particles.hash_table.values()
+                         for particle in list_particles]
+            radius = np.array([p.radius for p in particles])
+            speed = np.array([p.current_speed.value for p in particles], dtype=np.float64).reshape(-1, 3)
+            acceleration = np.array([p.future_acceleration.value for p in particles],
+                                    dtype=np.float64).reshape(-1, 3)
+            mu = np.array([p.fluid.mu for p in particles])
+            rho0 = np.array([p.fluid.rho0 for p in particles])
+            k = np.array([p.fluid.k for p in particles])
+        dt = self.time_step(KERNEL_MULTIPLICATIVE * radius, speed, acceleration, mu / rho0, np.sqrt(k),
+                            dt_max=self.__dt_max)
+        if self.t < self.tt:
+            dt = min(dt, self.tt - self.t)
+        self.dt = dt
+
+    def __search_neighbours(self):
+        particles = [particle for list_particles in self.particles.hash_table.values() for particle in list_particles]
+        if self.verlet is None:
+            return m_nl.NeighbourList.from_particles(particles, lambda p: RADIUS_MULTIPLICATIVE * p.radius)
+
+        row = {id(p): k for k, p in enumerate(particles)}
+        position = np.array([p.current_location.value for p in particles], dtype=np.float64).reshape(-1, 3)
+        radius = np.array([RADIUS_MULTIPLICATIVE * p.radius for p in particles])
+
+        def build(extended_radius):
+            return m_nl.NeighbourList.from_particles(particles, lambda p: extended_radius[row[id(p)]])
+
+        # The rows follow the buckets of the hash, whose order changes with every migration : the list is kept while
+        # the set of particles is the same, and its rows follow their new order
+        ids = np.fromiter(row, dtype=np.int64, count=len(row))
+        new_sort = np.argsort(ids, kind='stable')
+        key = ids[new_sort].tobytes()
+        previous = self.__verlet_ids
+        if previous is not None and len(previous) == len(ids) and not np.array_equal(previous, ids):
+            order = np.empty(len(ids), dtype=np.intp)
+            order[new_sort] = np.argsort(previous, kind='stable')
+            self.verlet.reorder(order, previous_key=key, key=key)
+        self.__verlet_ids = ids
+        return self.verlet.neighbour_list(position, radius, build, key=key)
+
+    def __search_neighbours_arrays(self):
+        particles = self.particles
+        position = particles.position
+        radius = RADIUS_MULTIPLICATIVE * particles.radius
+        if self.verlet is None:
+            return self.__neighbour_list(position, radius)
+
+        def build(extended_radius):
+            return self.__neighbour_list(position, extended_radius)
+        return self.verlet.neighbour_list(position, radius, build, key=particles.revision)
+
+    def __neighbour_list(self, position, search_radius):
+        backend = self.neighbour_search
+        if backend == "auto":
+            backend = m_tree.choose(position, search_radius)
+        self.__neighbour_backend = backend
+        return m_nl.NeighbourList.from_positions(position, search_radius, backend)
+
+    def __compute_density_and_pressure(self, neighbours):
         def try_compute_density(structure):
-            for list_particles in structure:
-                for particle in list_particles:
-                    try:
-                        assert isinstance(particle, m_part.ActiveParticle)
-                        neigh = particle.neighbour(RADIUS_MULTIPLICATIVE * particle.radius)
-                        particle.density.__call__(particle, neigh)
-                        particle.pressure.__call__(particle)
-                    except Exception as e:
-                        print("Density computation : " + str(e))
-        hashing = self.particles.hash_table.values()
-        try_compute_density(hashing)
-
-    def __compute_forces_and_integrate(self):
+            for k, particle in enumerate(structure):
+                try:
+                    assert isinstance(particle, m_part.ActiveParticle)
+                    neigh = neighbours.neighbourhood(k)
+                    particle.density.__call__(particle, neigh)
+                    particle.pressure.__call__(particle)
+                except Exception as e:
+                    print("Density computation : " + str(e))
+        try_compute_density(neighbours.particles)
+
+    def __compute_forces_and_integrate(self, neighbours):
         def try_compute_forces_and_integrate(structure):
-            for list_particles in structure:
-                for particle in list_particles:
-                    try:
-                        assert isinstance(particle, m_part.ActiveParticle)
-                        neigh = particle.neighbour(RADIUS_MULTIPLICATIVE * particle.radius)
-                        particle.resultant_force = m_vec.Vector([0, 0, 0])
-                        for force in particle.forces:
-                            assert isinstance(force, m_part.Force)
-                            force.__call__(particle, neigh)
-                            particle.resultant_force += force.value
-                        particle.future_acceleration.value = particle.resultant_force * 1. / particle.mass
-                        particle.future_speed.value = particle.current_speed.value + particle.future_acceleration.value * self.dt
-                        particle.future_location.value = particle.current_location.value + particle.future_speed.value * self.dt
-                    except Exception as e:
-                        print("Force computations and integration : " + str(e))
-        hashing = self.particles.hash_table.values()
-        try_compute_forces_and_integrate(hashing)
+            for k, particle in enumerate(structure):
+                try:
+                    assert isinstance(particle, m_part.ActiveParticle)
+                    neigh = neighbours.neighbourhood(k)
+                    particle.resultant_force = m_vec.Vector([0, 0, 0])
+                    for force in particle.forces:
+                        assert isinstance(force, m_part.Force)
+                        force.__call__(particle, neigh)
+                        particle.resultant_force += force.value
+                    particle.future_acceleration.value = particle.resultant_force * 1. / particle.mass
+                    particle.future_speed.value = particle.current_speed.value + particle.future_acceleration.value * self.dt
+                    particle.future_location.value = particle.current_location.value + particle.future_speed.value * self.dt
+                except Exception as e:
+                    print("Force computations and integration : " + str(e))
+        try_compute_forces_and_integrate(neighbours.particles)
 
     def __check_for_collision(self):
-        def try_check_for_collision(structure):
-            for list_particles in structure:
-                for particle in list_particles:
-                    try:
-                        assert isinstance(particle, m_part.ActiveParticle)
-                        for coll_obj in self.collisions_objects:
-                            assert isinstance(coll_obj, m_col.CollisionObject)
-                            coll_obj.react(particle.future_location, self.dt)
-                    except Exception as e:
-                        print(e)
-        hashing = self.particles.hash_table.values()
-        try_check_for_collision(hashing)
+        if not self.collisions_objects:
+            return
+        particles = [particle for list_particles in self.particles.hash_table.values() for particle in list_particles]
+        future_location = np.array([p.future_location.value for p in particles], dtype=np.float64).reshape(-1, 3)
+        future_speed = np.array([p.future_speed.value for p in particles], dtype=np.float64).reshape(-1, 3)
+        cr = np.array([p.fluid.cr for p in particles], dtype=np.float64)
+        # Every collision object reacts on all the particles at once
+        collided = np.zeros(len(particles), dtype=bool)
+        for coll_obj in self.__colliders(future_speed, np.array([p.radius for p in particles])):
+            assert isinstance(coll_obj, m_col.CollisionObject)
+            collided |= coll_obj.react_batch(future_location, future_speed, self.dt, cr)
+        for k in np.flatnonzero(collided):
+            particles[k].future_location.value = m_vec.Vector(future_location[k])
+            particles[k].future_speed.value = m_vec.Vector(future_speed[k])
 
     def __generate_numpy_array(self):
         def try_generate_numpy_array(structure):
@@ -216,11 +485,226 @@ class SphSolver():
                         assert isinstance(particle, m_part.ActiveParticle)
                         particle.resultant_force = m_vec.Vector([0, 0, 0])
                         particle.current_speed.value = particle.future_speed.value
-                        particle.current_location.value = particle.current_location.value
+                        particle.current_location.value = particle.future_location.value
                     except Exception as e:
                         print(e)
         hashing = self.particles.hash_table.values()
         try_update(hashing)
+        # Only the particles which left their cell change of bucket
+        self.particles.rebin()
+
+    ### Columnar storage
+
+    def __reorder_arrays(self):
+        """
+        Sort the rows along a Morton curve of the cells of the largest search radius, when the policy says so. The
+        Verlet list and the accelerations of the integrator follow the rows.
+        """
+        particles = self.particles
+        if len(particles) == 0:
+            return
+        order = self.reorder.order(particles.position, RADIUS_MULTIPLICATIVE * float(np.max(particles.radius)))
+        if order is None:
+            return
+        revision = particles.revision
+        particles.reorder(order)
+        self.integrator.reorder(particles, revision)
+        if self.verlet is not None:
+            self.verlet.reorder(order, revision, particles.revision)
+
+    def __step_arrays(self):
+        particles = self.particles
+        # Compute density, pressure and forces, and integrate
+        self.integrator.step(particles, self.__accelerate_arrays, self.dt)
+        # Check for collision
+        self.__check_for_collision_arrays(particles.position, particles.velocity)
+
+    def __accelerate_arrays(self):
+        # Search the neighbours once, they are shared by the density and the force computations
+        neighbours = self.__search_neighbours_arrays()
+        # Compute density and pressure
+        self.__compute_density_and_pressure_arrays(neighbours)
+        # Compute forces
+        self.__compute_forces_arrays(neighbours)
+
+    def __compute_density_and_pressure_arrays(self, neighbours):
+        particles = self.particles
+        m = particles.mass.tolist()
+        for i in range(len(particles)):
+            w = m_kern.SpikyKernel(KERNEL_MULTIPLICATIVE * particles.radius[i])
+            density = 0
+            for j, r in neighbours.neighbourhood(i).pairs(m_vec.Vec3):
+                density += m[j] * w(r)
+            particles.density[i] = density
+        particles.pressure[:] = (particles.density - particles.fluid_property('rho0')) * particles.fluid_property('k')
+
+    def __compute_forces_arrays(self, neighbours):
+        particles = self.particles
+        # Plain floats and Vec3, so that no array is allocated per pair
+        u = m_vec.from_array(particles.velocity)
+        m = particles.mass.tolist()
+        rho = particles.density.tolist()
+        p = particles.pressure.tolist()
+        mu = particles.fluid_property('mu').tolist()
+        sigma = particles.fluid_property('sigma').tolist()
+        l = particles.fluid_property('l').tolist()
+        gravity = m_vec.Vec3(m_part.GRAVITY)
+        for i in range(len(particles)):
+            h = KERNEL_MULTIPLICATIVE * particles.radius[i]
+            k_d = m_kern.Poly6Kernel(h)
+            w_v = m_kern.ViscosityKernel(h).laplacian
+            force_pres = m_vec.Vec3()
+            force_visc = m_vec.Vec3()
+            std_grad = m_vec.Vec3()
+            cf_lap = 0
+            for j, r in neighbours.neighbourhood(i).pairs(m_vec.Vec3):
+                std_grad += m[j] / rho[j] * k_d.gradient(r)
+                cf_lap += m[j] / rho[j] * k_d.laplacian(r)
+                if j != i:
+                    force_pres += -m[j] * rho[i] * ((p[i] + p[j]) / (2 * rho[i] * rho[j])) * k_d.gradient(r)
+                    force_visc += (u[j] - u[i]) * (mu[i] * m[j] / rho[i] * w_v(r))
+            force_st = m_vec.Vec3()
+            if std_grad.norm() >= l[i]:  # Only compute surface tension when close to the surface
+                force_st = - sigma[i] * cf_lap * std_grad / std_grad.norm()
+            force_grav = rho[i] * gravity
+            particles.force[i] = tuple(force_pres + force_visc + force_st + force_grav)
+        particles.acceleration[:] = particles.force / particles.mass[:, np.newaxis]
+
+    def __check_for_collision_arrays(self, future_location, future_speed):
+        cr = self.particles.fluid_property('cr')
+        for coll_obj in self.__colliders(future_speed, self.particles.radius):
+            assert isinstance(coll_obj, m_col.CollisionObject)
+            coll_obj.react_batch(future_location, future_speed, self.dt, cr)
+
+    ### Vectorized step
+
+    def __step_vectorized(self):
+        particles = self.particles
+        self.executor.reset_statistics()
+        # Compute density, pressure and forces, and integrate
+        self.integrator.step(particles, self.__accelerate_vectorized, self.dt)
+        # Check for collision
+        if self.collisions_objects:
+            state = {'future_location': particles.position,
+                     'future_speed': particles.velocity,
+                     'cr': particles.fluid_property('cr'),
+                     'dt': self.dt,
+                     'collisions_objects': self.__colliders(particles.velocity, particles.radius)}
+            reaction = self.executor.map(m_par.collision_rows, state, len(particles))
+            particles.position[:] = reaction[:, :3]
+            particles.velocity[:] = reaction[:, 3:]
+
+    def __accelerate_vectorized(self):
+        particles = self.particles
+        n = len(particles)
+        # Search the neighbours once, they are shared by the density and the force computations
+        neighbours = self.__search_neighbours_arrays()
+        state = {'offsets': neighbours.offsets,
+                 'owner': neighbours.owner,
+                 'indices': neighbours.indices,
+                 'r': neighbours.r,
+                 'distance': neighbours.distance,
+                 'radius': particles.radius,
+                 'search_radius': RADIUS_MULTIPLICATIVE * particles.radius,
+                 'mass': particles.mass,
+                 'velocity': particles.velocity,
+                 'mu': particles.fluid_property('mu'),
+                 'sigma': particles.fluid_property('sigma'),
+                 'l': particles.fluid_property('l')}
+        # Compute density and pressure
+        if self.symmetric:
+            # The pairs add to both of their particles, the phase runs in the calling thread
+            particles.density[:] = m_pair.density(state)
+        else:
+            particles.density[:] = self.executor.map(m_par.density_rows, state, n)
+        particles.pressure[:] = (particles.density - particles.fluid_property('rho0')) * particles.fluid_property('k')
+        # Compute forces
+        state['density'] = particles.density
+        state['pressure'] = particles.pressure
+        if self.symmetric:
+            particles.force[:] = m_pair.forces(state)
+        else:
+            particles.force[:] = self.executor.map(m_par.force_rows, state, n)
+        particles.acceleration[:] = particles.force / particles.mass[:, np.newaxis]
+
+    ### Block time steps
+
+    def __step_block(self):
+        particles = self.particles
+        n = len(particles)
+        particle_dt = self.time_step.particle_dt(KERNEL_MULTIPLICATIVE * particles.radius, particles.velocity,
+                                                 particles.acceleration,
+                                                 particles.fluid_property('mu') / particles.fluid_property('rho0'),
+                                                 np.sqrt(particles.fluid_property('k')))
+        levels = self.block.levels(particle_dt, self.dt)
+        top = int(levels.max()) if n else 0
+        sub_dt = self.dt / 2 ** top
+        particle_dt = sub_dt * 2 ** (top - levels)
+        # Time of the state of every particle, from the start of the step
+        since = np.zeros(n)
+        updates = 0
+        for sub_step in range(2 ** top):
+            active = self.block.active(levels, sub_step)
+            self.__sub_step(active, sub_step * sub_dt, since, particle_dt)
+            since[active] += particle_dt[active]
+            updates += int(np.count_nonzero(active))
+        self.block.record(levels, updates)
+
+    def __sub_step(self, active, tau, since, particle_dt):
+        """
+        Update the active particles, which are at time tau, with the other particles drifted to tau.
+        """
+        particles = self.particles
+        lag = (tau - since)[:, np.newaxis]
+        position = particles.position + particles.velocity * lag
+        velocity = particles.velocity + particles.acceleration * lag
+        neighbours = self.__neighbour_list(position, RADIUS_MULTIPLICATIVE * particles.radius)
+
+        # Active particles first, then their neighbours : the row phases compute the first rows only
+        needed = active.copy()
+        needed[neighbours.indices[active[neighbours.owner]]] = True
+        order = np.concatenate((np.flatnonzero(active), np.flatnonzero(needed & ~active), np.flatnonzero(~needed)))
+        n_active = int(np.count_nonzero(active))
+        n_needed = int(np.count_nonzero(needed))
+        neighbours = neighbours.reordered(order, n_needed)
+        state = {'offsets': neighbours.offsets,
+                 'owner': neighbours.owner,
+                 'indices': neighbours.indices,
+                 'r': neighbours.r,
+                 'distance': neighbours.distance,
+                 'radius': particles.radius[order],
+                 'mass': particles.mass[order],
+                 'velocity': velocity[order],
+                 'mu': particles.fluid_property('mu')[order],
+                 'sigma': particles.fluid_property('sigma')[order],
+                 'l': particles.fluid_property('l')[order]}
+
+        # Density and pressure of the active particles and of their neighbours
+        rows = order[:n_needed]
+        particles.density[rows] = self.executor.map(m_par.density_rows, state, n_needed)
+        particles.pressure[rows] = (particles.density[rows] - particles.fluid_property('rho0')[rows]) * \
+            particles.fluid_property('k')[rows]
+        state['density'] = particles.density[order]
+        state['pressure'] = particles.pressure[order]
+
+        # Forces and integration of the active particles
+        rows = order[:n_active]
+        particles.force[rows] = self.executor.map(m_par.force_rows, state, n_active)
+        particles.acceleration[rows] = particles.force[rows] / particles.mass[rows, np.newaxis]
+        dt = particle_dt[rows]
+        future_speed = particles.velocity[rows] + particles.acceleration[rows] * dt[:, np.newaxis]
+        future_location = particles.position[rows] + future_speed * dt[:, np.newaxis]
+        cr = particles.fluid_property('cr')[rows]
+        for coll_obj in self.__colliders(future_speed, particles.radius):
+            assert isinstance(coll_obj, m_col.CollisionObject)
+            # The time step of the reaction is the one of the particle
+            for level_dt in np.unique(dt):
+                same = dt == level_dt
+                location, speed = future_location[same], future_speed[same]
+                coll_obj.react_batch(location, speed, level_dt, cr[same])
+                future_location[same], future_speed[same] = location, speed
+        particles.position[rows] = future_location
+        particles.velocity[rows] = future_speed
 
     def initial_volume(self, particle, primitive="non oriented cube", distribution="CFC", **kwargs):
         assert isinstance(particle, m_part.ActiveParticle)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+Adaptive and block time steps of the solver.
+'''
+
+from math import *
+
+import numpy as np
+
+
+class AdaptiveTimeStep(object):
+    """
+    Largest stable time step of the current state, from three criteria on every particle of support h :
+
+    - CFL : dt < cfl * h / (c + |u|), with c = sqrt(k) the speed of sound of the pressure law p = k (rho - rho0)
+    - force : dt < force * sqrt(h / |a|)
+    - viscous diffusion : dt < viscous * h ** 2 / nu, with nu = mu / rho0
+
+    The smallest one, times safety, is clamped to [dt_min, dt_max].
+    """
+    CRITERIA = ('cfl', 'force', 'viscous')
+
+    def __init__(self, cfl=0.4, force=0.25, viscous=0.125, safety=1., dt_min=1e-6, dt_max=None):
+        """
+
+            :param cfl: Courant number
+            :param force: coefficient of the acceleration criterion
+            :param viscous: coefficient of the viscous diffusion criterion
+            :param safety: factor applied to the smallest criterion
+            :param dt_min: smallest time step
+            :param dt_max: largest time step, the dt of the solver when None
+            :type cfl: float
+            :type force: float
+            :type viscous: float
+            :type safety: float
+            :type dt_min: float
+            :type dt_max: float
+        """
+        self.__coefficients = {'cfl': cfl, 'force': force, 'viscous': viscous}
+        self.__safety = safety
+        self.__dt_min = dt_min
+        self.__dt_max = dt_max
+        self.__steps = 0
+        self.__limited_by = dict.fromkeys(self.CRITERIA + ('dt_min', 'dt_max'), 0)
+        self.__smallest = inf
+        self.__largest = 0.
+
+    @property
+    def safety(self):
+        return self.__safety
+
+    @property
+    def dt_min(self):
+        return self.__dt_min
+
+    @property
+    def dt_max(self):
+        return self.__dt_max
+
+    @property
+    def statistics(self):
+        """
+        Steps computed, smallest and largest dt taken, and number of steps limited by every criterion or clamp.
+        """
+        return {'steps': self.__steps,
+                'smallest': self.__smallest,
+                'largest': self.__largest,
+                'limited_by': dict(self.__limited_by)}
+
+    def __particle_criteria(self, h, speed, acceleration, nu, c):
+        h = np.asarray(h, dtype=np.float64)
+        speed = np.sqrt(np.einsum('ij,ij->i', speed, speed))
+        acceleration = np.sqrt(np.einsum('ij,ij->i', acceleration, acceleration))
+        k = self.__coefficients
+        with np.errstate(divide='ignore'):
+            return {'cfl': k['cfl'] * h / (np.asarray(c) + speed),
+                    'force': k['force'] * np.sqrt(h / acceleration),
+                    'viscous': k['viscous'] * h ** 2 / np.asarray(nu)}
+
+    def criteria(self, h, speed, acceleration, nu, c):
+        """
+        Time step of every criterion, over all the particles.
+
+            :param h: (N,) kernel supports
+            :param speed: (N, 3) speeds
+            :param acceleration: (N, 3) accelerations
+            :param nu: (N,) kinematic viscosities
+            :param c: (N,) speeds of sound
+            :rtype: dict
+        """
+        if len(h) == 0:
+            return dict.fromkeys(self.CRITERIA, inf)
+        criteria = self.__particle_criteria(h, speed, acceleration, nu, c)
+        return {name: float(np.min(dt)) for name, dt in criteria.items()}
+
+    def particle_dt(self, h, speed, acceleration, nu, c):
+        """
+        Stable time step of every particle, the smallest of its criteria times safety, at least dt_min.
+
+            :rtype: numpy.ndarray (N,)
+        """
+        criteria = self.__particle_criteria(h, speed, acceleration, nu, c)
+        dt = self.__safety * np.minimum(np.minimum(criteria['cfl'], criteria['force']), criteria['viscous'])
+        if self.__dt_min is not None:
+            dt = np.maximum(dt, self.__dt_min)
+        return dt
+
+    def __call__(self, h, speed, acceleration, nu, c, dt_max=None):
+        """
+        Time step of the next step, see criteria for the parameters.
+
+            :param dt_max: largest time step when the dt_max of the instance is None
+        """
+        criteria = self.criteria(h, speed, acceleration, nu, c)
+        limit = min(self.CRITERIA, key=lambda name: criteria[name])
+        dt = self.__safety * criteria[limit]
+        dt_max = self.__dt_max if self.__dt_max is not None else dt_max
+        if dt_max is not None and dt >= dt_max:
+            dt, limit = dt_max, 'dt_max'
+        if self.__dt_min is not None and dt <= self.__dt_min:
+            dt, limit = self.__dt_min, 'dt_min'
+
+        self.__steps += 1
+        self.__limited_by[limit] += 1
+        self.__smallest = min(self.__smallest, dt)
+        self.__largest = max(self.__largest, dt)
+        return dt
+
+
+class BlockTimeStep(object):
+    """
+    Power of two time step levels of the particles.
+
+    A particle of level L moves with dt / 2 ** L : a step of the solver is split into 2 ** L_max sub-steps, and a
+    particle is only updated at the sub-steps starting one of its own steps. The statistics compare the particle
+    updates to the updates of a global step of dt / 2 ** L_max.
+    """
+    def __init__(self, max_level=4):
+        """
+
+            :param max_level: deepest level, the smallest time step is dt / 2 ** max_level
+            :type max_level: int
+        """
+        assert max_level >= 0
+        self.__max_level = max_level
+        self.__statistics = {'blocks': 0, 'sub_steps': 0, 'updates': 0, 'global_updates': 0, 'saved': 0,
+                             'levels': []}
+
+    @property
+    def max_level(self):
+        return self.__max_level
+
+    @property
+    def statistics(self):
+        """
+        Steps, sub-steps, particle updates, updates of the equivalent global stepping, updates saved, and number of
+        particles of every level at the last step.
+        """
+        statistics = dict(self.__statistics)
+        statistics['levels'] = list(statistics['levels'])
+        return statistics
+
+    def levels(self, particle_dt, dt):
+        """
+        Smallest level of every particle whose time step dt / 2 ** level is below its stable time step.
+
+            :rtype: numpy.ndarray (N,) of int
+        """
+        with np.errstate(divide='ignore'):
+            levels = np.ceil(np.log2(dt / np.asarray(particle_dt, dtype=np.float64)))
+        return np.clip(np.nan_to_num(levels, nan=0.), 0, self.__max_level).astype(np.intp)
+
+    @staticmethod
+    def active(levels, sub_step):
+        """
+        Particles starting a step at sub-step sub_step of a block of 2 ** max(levels) sub-steps.
+        """
+        top = int(levels.max()) if len(levels) else 0
+        return sub_step % (2 ** (top - levels)) == 0
+
+    def record(self, levels, updates):
+        top = int(levels.max()) if len(levels) else 0
+        global_updates = len(levels) * 2 ** top
+        s = self.__statistics
+        s['blocks'] += 1
+        s['sub_steps'] += 2 ** top
+        s['updates'] += updates
+        s['global_updates'] += global_updates
+        s['saved'] += global_updates - updates
+        s['levels'] = np.bincount(levels, minlength=self.__max_level + 1).tolist()
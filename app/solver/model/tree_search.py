@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+'''
+KD-tree neighbour search, for the runs where a grid of cells of the largest search radius fits the particles
+badly : search radii varying widely, or particles spread over a domain much larger than their volume.
+'''
+
+from itertools import chain
+
+import numpy as np
+
+import app.solver.model.batch as m_batch
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    # Without scipy, the particles are sorted along one axis and swept
+    cKDTree = None
+
+# Above this ratio of the largest to the smallest search radius, the cells of the largest one hold too many
+# candidates for the smallest particles
+RADIUS_RATIO = 2.
+# Above this number of cells of the bounding box per particle, the grid is mostly empty cells
+SPARSE_CELLS = 8.
+
+
+def occupancy(position, search_radius):
+    """
+    How well a grid of cells of the largest search radius fits the particles.
+
+        :param position: (N, 3) locations
+        :param search_radius: (N,) search radius of every particle
+        :return: number of particles, of occupied cells, of cells of the bounding box per particle, mean number of
+                 particles per occupied cell, and ratio of the largest to the smallest search radius
+        :rtype: dict
+    """
+    position = np.asarray(position, dtype=np.float64).reshape(-1, 3)
+    search_radius = np.asarray(search_radius, dtype=np.float64)
+    n = len(position)
+    if n == 0:
+        return {'particles': 0, 'cells': 0, 'box_cells_per_particle': 0., 'particles_per_cell': 0.,
+                'radius_ratio': 1.}
+    l = float(np.max(search_radius))
+    cell = np.floor(position / l).astype(np.int64)
+    cells = len(np.unique(cell, axis=0))
+    box = float(np.prod((cell.max(axis=0) - cell.min(axis=0) + 1).astype(np.float64)))
+    smallest = float(np.min(search_radius))
+    return {'particles': n,
+            'cells': cells,
+            'box_cells_per_particle': box / n,
+            'particles_per_cell': n / cells,
+            'radius_ratio': l / smallest if smallest > 0 else float('inf')}
+
+
+def choose(position, search_radius):
+    """
+    'tree' when the occupancy of a grid is poor, see RADIUS_RATIO and SPARSE_CELLS, 'grid' otherwise.
+    """
+    statistics = occupancy(position, search_radius)
+    if statistics['radius_ratio'] > RADIUS_RATIO or statistics['box_cells_per_particle'] > SPARSE_CELLS:
+        return 'tree'
+    return 'grid'
+
+
+class TreeNeighbourSearch(object):
+    """
+    KD-tree over the current locations of the particles.
+
+    The tree is rebuilt lazily, once per step, after insertions, removals and updates, and answers the queries of
+    all the particles in one call. It offers the insert / remove / update / search surface of Hash, so it can be
+    the acceleration structure of ActiveParticle objects, and the neighbour_pairs of CellGrid, so it can be built
+    directly from an array of positions.
+    """
+    def __init__(self, leafsize=16, workers=1):
+        """
+
+            :param leafsize: number of points under which a node of the tree is not split
+            :param workers: threads answering the batched queries, -1 for all the cores
+            :type leafsize: int
+            :type workers: int
+        """
+        self.__leafsize = leafsize
+        self.__workers = workers
+        self.__objects = []
+        self.__row = {}
+        self.__dirty = True
+
+        self.__position = np.zeros((0, 3))
+        self.__tree = None
+        self.__order = np.zeros(0, dtype=np.intp)
+        self.__builds = 0
+
+    @property
+    def builds(self):
+        return self.__builds
+
+    @property
+    def hash_table(self):
+        """
+        Every particle in a single bucket, for the callers walking the buckets of a Hash.
+        """
+        return {0: list(self.__objects)} if self.__objects else {}
+
+    ### Construction
+
+    def build(self, position):
+        """
+        Build the tree of positions.
+
+            :param position: (N, 3) locations
+        """
+        position = np.asarray(position, dtype=np.float64).reshape(-1, 3)
+        self.__position = position
+        if cKDTree is not None:
+            self.__tree = cKDTree(position, leafsize=self.__leafsize) if len(position) else None
+        else:
+            self.__order = np.argsort(position[:, 0], kind='stable')
+        self.__dirty = False
+        self.__builds += 1
+
+    def __build_if_dirty(self):
+        if self.__dirty:
+            self.build([o.current_location.value for o in self.__objects])
+
+    def rebuild(self):
+        self.__dirty = True
+        self.__build_if_dirty()
+
+    def __ball(self, points, radius, p):
+        """
+        Pairs (k, j) of the particles j within radius[k] of points[k] for the p-norm, sorted by k then j.
+        """
+        position = self.__position
+        if len(position) == 0 or len(points) == 0:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty
+        if cKDTree is not None:
+            lists = self.__tree.query_ball_point(points, radius, p=p, workers=self.__workers, return_sorted=True)
+            counts = np.fromiter(map(len, lists), dtype=np.intp, count=len(lists))
+            owner = np.repeat(np.arange(len(lists)), counts)
+            index = np.fromiter(chain.from_iterable(lists), dtype=np.intp, count=int(counts.sum()))
+            return owner, index
+        # Sweep along x : the candidates of a point are a contiguous slice of the sorted particles
+        x = position[self.__order, 0]
+        start = np.searchsorted(x, points[:, 0] - radius, side='left')
+        stop = np.searchsorted(x, points[:, 0] + radius, side='right')
+        owner, index = m_batch.expand_ranges(start, stop - start)
+        index = self.__order[index]
+        r = np.abs(points[owner] - position[index])
+        norm = r.max(axis=1) if p == np.inf else np.sqrt(np.einsum('ij,ij->i', r, r))
+        keep = norm <= radius[owner]
+        owner, index = owner[keep], index[keep]
+        order = np.lexsort((index, owner))
+        return owner[order], index[order]
+
+    ### Hash surface
+
+    def insert(self, _object):
+        """
+        Insert a new particle in the volume
+        """
+        self.__row[id(_object)] = len(self.__objects)
+        self.__objects.append(_object)
+        self.__dirty = True
+
+    def remove(self, _object):
+        """
+        Remove a particle, by moving the last particle into its slot
+        """
+        k = self.__row.pop(id(_object), None)
+        if k is None:
+            raise ValueError("particle not in the tree")
+        last = self.__objects.pop()
+        if last is not _object:
+            self.__objects[k] = last
+            self.__row[id(last)] = k
+        self.__dirty = True
+
+    def update(self, _object):
+        """
+        Update the particles in the volume
+        """
+        self.__dirty = True
+
+    def rebin(self):
+        """
+        Account for the particles having moved to their current location, the tree is built again lazily
+        """
+        self.__dirty = True
+
+    def search(self, _object, kernel_h, approx=True):
+        """
+        Particles within kernel_h of _object : in the cube of half side kernel_h if approx, as the cells of a Hash,
+        closer than kernel_h otherwise
+        """
+        self.__build_if_dirty()
+        k = self.__row[id(_object)]
+        candidates = self.candidates(self.__position[k], kernel_h, approx)
+        if not approx:
+            r = self.__position[candidates] - self.__position[k]
+            candidates = candidates[np.einsum('ij,ij->i', r, r) < kernel_h ** 2]
+        return [self.__objects[j] for j in candidates]
+
+    def candidates(self, location, kernel_h, approx=True):
+        """
+        Indices of the particles in the cube of half side kernel_h around location, or in its ball unless approx.
+        """
+        self.__build_if_dirty()
+        location = np.asarray(location, dtype=np.float64).reshape(1, 3)
+        _, index = self.__ball(location, np.array([kernel_h], dtype=np.float64), np.inf if approx else 2)
+        return index
+
+    ### Batched queries
+
+    def neighbour_pairs(self, search_radius):
+        """
+        Every ordered pair (i, j), i == j included, such that |x_i - x_j| < search_radius[i], for the positions of
+        the last build.
+
+            :return: i, j, r_ij = x_i - x_j and |r_ij|, sorted by i then j
+        """
+        self.__build_if_dirty()
+        position = self.__position
+        search_radius = np.asarray(search_radius, dtype=np.float64)
+        i, j = self.__ball(position, search_radius, 2)
+        r = position[i] - position[j]
+        distance = np.sqrt(np.einsum('ij,ij->i', r, r))
+        keep = distance < search_radius[i]
+        return i[keep], j[keep], r[keep], distance[keep]
@@ -139,11 +139,191 @@ class Vector(numpy.ndarray):
         self[2] = z
 
 
+class Vec3(object):
+    """
+    3D vector of three floats, without numpy.
+
+    It offers the public interface of Vector (x / y / z, indexing, + - * /, norm, dot, cross, spherical and
+    cylindrical coordinates) with plain float arithmetic, so no array is allocated per operation. As for Vector, the
+    product of two vectors is the dot product. Use to_array and from_array to convert many vectors at once.
+    """
+    __slots__ = ('x', 'y', 'z')
+    # NumPy scalars and arrays defer their operators to Vec3 instead of reading it as a sequence
+    __array_ufunc__ = None
+
+    def __init__(self, *args):
+        if len(args) == 1 and isinstance(args[0], Vec3):
+            self.x, self.y, self.z = args[0].x, args[0].y, args[0].z
+        else:
+            self.x, self.y, self.z = _args_to_tuple('__init__', args)
+
+    @classmethod
+    def _make(cls, x, y, z):
+        """
+        Vec3 of three floats, without the argument checks of __init__, for the results of the operators.
+        """
+        v = object.__new__(cls)
+        v.x = x
+        v.y = y
+        v.z = z
+        return v
+
+    def __repr__(self):
+        decimal = 5
+        return "v[" + str(round(self.x, decimal)) + ", " + \
+               str(round(self.y, decimal)) + ", " + str(round(self.z, decimal)) + "]"
+
+    ### Sequence
+
+    def __len__(self):
+        return 3
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __getitem__(self, i):
+        return (self.x, self.y, self.z)[i]
+
+    def __setitem__(self, i, val):
+        setattr(self, 'xyz'[i], float(val))
+
+    def copy(self):
+        return Vec3._make(self.x, self.y, self.z)
+
+    ### Arithmetic
+
+    def __add__(self, other):
+        return Vec3._make(self.x + other[0], self.y + other[1], self.z + other[2])
+
+    __radd__ = __add__
+
+    def __iadd__(self, other):
+        self.x += other[0]
+        self.y += other[1]
+        self.z += other[2]
+        return self
+
+    def __sub__(self, other):
+        return Vec3._make(self.x - other[0], self.y - other[1], self.z - other[2])
+
+    def __rsub__(self, other):
+        return Vec3._make(other[0] - self.x, other[1] - self.y, other[2] - self.z)
+
+    def __isub__(self, other):
+        self.x -= other[0]
+        self.y -= other[1]
+        self.z -= other[2]
+        return self
+
+    def __neg__(self):
+        return Vec3._make(-self.x, -self.y, -self.z)
+
+    def __mul__(self, other):
+        if isinstance(other, (Vec3, numpy.ndarray)):
+            return self.x * other[0] + self.y * other[1] + self.z * other[2]
+        return Vec3._make(self.x * other, self.y * other, self.z * other)
+
+    def __rmul__(self, other):
+        if isinstance(other, numpy.ndarray):
+            return self.x * other[0] + self.y * other[1] + self.z * other[2]
+        return Vec3._make(other * self.x, other * self.y, other * self.z)
+
+    def __imul__(self, other):
+        self.x *= other
+        self.y *= other
+        self.z *= other
+        return self
+
+    def __truediv__(self, other):
+        return Vec3._make(self.x / other, self.y / other, self.z / other)
+
+    def __abs__(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    def __pow__(self, x):
+        return (self * self) if x == 2 else pow(abs(self), x)
+
+    def __eq__(self, other):
+        return abs(self - other) < _TINY
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    ### Geometry
+
+    def norm(self):
+        return abs(self)
+
+    def a_max(self):
+        return max(self.x, self.y, self.z)
+
+    def dot(self, other):
+        return self.x * other[0] + self.y * other[1] + self.z * other[2]
+
+    def cross(self, other):
+        return Vec3._make(self.y * other[2] - self.z * other[1],
+                          self.z * other[0] - self.x * other[2],
+                          self.x * other[1] - self.y * other[0])
+
+    def get_spherical(self):
+        r = abs(self)
+        if r < _TINY:
+            theta = phi = 0.0
+        else:
+            theta = math.acos(self.z / r)
+            phi = math.atan2(self.y, self.x)
+
+        return r, theta, phi
+
+    def set_spherical(self, *args):
+        r, theta, phi = _args_to_tuple('set_spherical', args)
+        self.x = r * math.sin(theta) * math.cos(phi)
+        self.y = r * math.sin(theta) * math.sin(phi)
+        self.z = r * math.cos(theta)
+
+    def get_cylindrical(self):
+        rho = math.sqrt(self.x * self.x + self.y * self.y)
+        phi = math.atan2(self.y, self.x)
+        return rho, phi, self.z
+
+    def set_cylindrical(self, *args):
+        rho, phi, z = _args_to_tuple('set_cylindrical', args)
+        self.x = rho * math.cos(phi)
+        self.y = rho * math.sin(phi)
+        self.z = z
+
+
+def to_array(vectors):
+    """
+    Stack vectors (Vec3, Vector or sequences of 3 floats) into one (N, 3) float64 array.
+    """
+    vectors = list(vectors)
+    array = numpy.empty((len(vectors), 3))
+    for k, v in enumerate(vectors):
+        array[k] = tuple(v)
+    return array
+
+
+def from_array(array):
+    """
+    Split an (N, 3) array into a list of Vec3.
+    """
+    return [Vec3._make(x, y, z) for x, y, z in numpy.asarray(array, dtype=numpy.float64).reshape(-1, 3).tolist()]
+
+
 def cross(a, b):
+    if isinstance(a, Vec3):
+        return a.cross(b)
     return Vector(numpy.cross(a, b))
 
 
 def dot(a, b):
+    if isinstance(a, Vec3):
+        return a.dot(b)
     return numpy.dot(a, b)
 
 
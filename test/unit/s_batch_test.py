@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import pytest
+import numpy as np
+import app.solver.model.solver as m_solver
+
+import scene
+
+positions = scene.cloud(150, 0)
+
+
+def run(vectorized, **kwargs):
+    return scene.run(positions, vectorized=vectorized, **kwargs)
+
+
+class TestVectorizedStep:
+    def test_vectorized_requires_particle_arrays(self):
+        import app.solver.model.hash_table as m_hash
+        with pytest.raises(TypeError):
+            m_solver.SphSolver(1, 0.1, m_hash.Hash(1, 10), vectorized=True)
+
+    def test_same_results_as_scalar_path(self):
+        scalar = run(False).particles
+        vectorized = run(True).particles
+        assert np.allclose(scalar.density, vectorized.density, rtol=1e-9)
+        assert np.allclose(scalar.velocity, vectorized.velocity, rtol=1e-9, atol=1e-9)
+        assert np.allclose(scalar.position, vectorized.position, rtol=1e-9, atol=1e-9)
+
+    def test_verlet_list_gives_same_results(self):
+        store = run(True).particles
+        solve = run(True, verlet_skin=True)
+        assert solve.verlet.statistics['steps'] == 3
+        assert np.allclose(store.position, solve.particles.position, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import numpy as np
+import pytest
+
+import app.solver.model.broad_phase as m_bp
+import app.solver.model.collision as m_col
+import app.solver.model.particle_arrays as m_arr
+import app.solver.model.solver as m_solver
+import app.solver.model.fluid as m_fluid
+import app.solver.model.vector as m_vec
+
+fl = m_fluid.Fluid(993.29, 0, 3.5, .0728, 0.5, 3, 0.02)
+
+
+def scene(n=60, seed=1):
+    """
+    A containing box and n small obstacles inside of it.
+    """
+    rng = np.random.RandomState(seed)
+    objects = [m_col.Box(m_vec.Vector([5, 5, 5]), m_vec.Vector([0, 0, 0]), m_vec.Vector([5, 5, 5]))]
+    for k in range(n):
+        c = m_vec.Vector(rng.rand(3) * 10)
+        if k % 2:
+            objects.append(m_col.Sphere(c, rng.uniform(0.1, 0.4), is_containing=False))
+        else:
+            objects.append(m_col.Box(c, m_vec.Vector(rng.rand(3) * 90), m_vec.Vector(rng.uniform(0.1, 0.4, 3)),
+                                     is_containing=False))
+    return objects
+
+
+def cloud(n=4000, seed=2):
+    return np.random.RandomState(seed).rand(n, 3) * 10.4 - 0.2
+
+
+class TestBoundingBoxes:
+    def test_containing_primitives_are_not_bounded(self):
+        assert scene()[0].aabb() is None
+        assert m_col.Sphere(m_vec.Vector([0, 0, 0]), 1.).aabb() is None
+
+    def test_containing_primitives_do_not_compute_their_box(self):
+        class Unbounded(m_col.Sphere):
+            def bounding_box(self):
+                raise AssertionError("bounding_box of a containing primitive")
+
+        assert Unbounded(m_vec.Vector([0, 0, 0]), 1.).aabb() is None
+        low, high = m_col.Sphere(m_vec.Vector([0, 0, 0]), 1., is_containing=False).aabb(0.5)
+        assert np.allclose(low, -1.5) and np.allclose(high, 1.5)
+
+    @pytest.mark.parametrize("k", range(1, 11))
+    def test_colliding_locations_are_in_the_box(self, k):
+        coll_obj = scene()[k]
+        low, high = coll_obj.aabb(0.05)
+        x = np.random.RandomState(k).rand(20000, 3) * (high - low + 2) + low - 1
+        inside = coll_obj.detect_batch(x)
+        assert inside.any()
+        assert np.all((x[inside] >= low) & (x[inside] <= high))
+
+
+class TestBroadPhase:
+    def test_same_reaction_as_every_object(self):
+        objects = scene()
+        x = cloud()
+        u = np.random.RandomState(3).randn(len(x), 3)
+        expected_x, expected_u = x.copy(), u.copy()
+        for coll_obj in objects:
+            coll_obj.react_batch(expected_x, expected_u, 0.01, 0.5)
+
+        broad_phase = m_bp.BroadPhase(objects, 0.5)
+        collided = broad_phase.react_batch(x, u, 0.01, 0.5)
+        assert collided.any()
+        assert np.array_equal(x, expected_x)
+        assert np.array_equal(u, expected_u)
+        assert broad_phase.statistics['culled'] > 0.9
+
+    def test_candidates_hold_the_colliding_particles(self):
+        objects = scene()
+        x = cloud()
+        candidates = m_bp.BroadPhase(objects, 0.5).candidates(x)
+        assert candidates[0] is None
+        for coll_obj, index in zip(objects[1:], candidates[1:]):
+            assert set(np.flatnonzero(coll_obj.detect_batch(x))) <= set(index)
+
+    def test_reserve(self):
+        broad_phase = m_bp.BroadPhase(scene(4), 0.5, margin=0.1)
+        broad_phase.reserve(0.05)
+        assert broad_phase.statistics['builds'] == 1
+        broad_phase.reserve(0.2)
+        assert broad_phase.margin == 0.4
+        assert broad_phase.statistics['builds'] == 2
+
+    def test_large_obstacles_enlarge_the_cells(self):
+        big = m_col.Sphere(m_vec.Vector([0, 0, 0]), 100., is_containing=False)
+        assert m_bp.BroadPhase([big], 0.5).cell_size == pytest.approx(200. / m_bp.MAX_CELLS)
+
+
+class TestSolverBroadPhase:
+    @pytest.mark.parametrize("vectorized", [False, True])
+    def test_same_step(self, vectorized):
+        positions = np.random.RandomState(8).rand(150, 3) * 3
+        objects = [m_col.Box(m_vec.Vector([1.5, 1.5, 1.5]), m_vec.Vector([0, 0, 0]), m_vec.Vector([1.4, 1.4, 1.4])),
+                   m_col.Sphere(m_vec.Vector([1.5, 1.5, 0.5]), 0.6, is_containing=False),
+                   m_col.Sphere(m_vec.Vector([0.5, 2.5, 2.5]), 0.3, is_containing=False)]
+        stores = []
+        for broad_phase in (False, True):
+            store = m_arr.ParticleArrays()
+            solve = m_solver.SphSolver(1, 0.005, store, objects, vectorized=vectorized, broad_phase=broad_phase)
+            for x in positions:
+                solve.create_active_particle(m_vec.Vector(x), fl, 0.05)
+            for k in range(2):
+                solve.step()
+            stores.append(store)
+        assert solve.broad_phase.statistics['culled'] > 0
+        assert np.array_equal(stores[0].position, stores[1].position)
+        assert np.array_equal(stores[0].velocity, stores[1].velocity)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import pytest
+import numpy as np
+import app.solver.model.cell_grid as m_grid
+import app.solver.model.particle as m_part
+import app.solver.model.particle_arrays as m_arr
+import app.solver.model.fluid as m_fluid
+import app.solver.model.vector as m_vec
+
+fl = m_fluid.Fluid(1, 1, 1, 1, 1, 1, 1)
+rng = np.random.RandomState(0)
+positions = rng.rand(150, 3) * 2 - 1
+
+
+class TestCellGrid:
+    def test_cells_are_contiguous_slices(self):
+        grid = m_grid.CellGrid(0.25)
+        grid.build(positions)
+        order = grid.order
+        cell = np.floor(positions[order] / 0.25)
+        for c in np.flatnonzero(grid.cell_end > grid.cell_start):
+            members = cell[grid.cell_start[c]:grid.cell_end[c]]
+            assert np.all(members == members[0])
+
+    def test_pairs_match_brute_force(self):
+        grid = m_grid.CellGrid(0.2)
+        grid.build(positions)
+        radius = np.full(len(positions), 0.3)
+        i, j, r, distance = grid.neighbour_pairs(radius)
+        d = np.linalg.norm(positions[:, np.newaxis] - positions[np.newaxis], axis=2)
+        expected_i, expected_j = np.nonzero(d < 0.3)
+        assert list(i) == list(expected_i)
+        assert list(j) == list(expected_j)
+        assert np.allclose(r, positions[i] - positions[j])
+        assert np.allclose(distance, d[i, j])
+
+    def test_far_particle_keeps_the_grid_sparse(self):
+        far = np.r_[positions, [[1e4, 1e4, 1e4]]]
+        grid = m_grid.CellGrid(0.05)
+        grid.build(far)
+        assert len(grid.cell_keys) <= len(far)
+        i, j, _, _ = grid.neighbour_pairs(np.full(len(far), 0.05))
+        d = np.linalg.norm(far[:, np.newaxis] - far[np.newaxis], axis=2)
+        expected_i, expected_j = np.nonzero(d < 0.05)
+        assert list(i) == list(expected_i) and list(j) == list(expected_j)
+        assert list(grid.cell_slice(*np.floor(far[-1] / 0.05).astype(int))) == [len(far) - 1]
+
+    def test_empty(self):
+        grid = m_grid.CellGrid(1.)
+        grid.build(np.zeros((0, 3)))
+        i, j, r, distance = grid.neighbour_pairs(np.zeros(0))
+        assert len(i) == 0
+
+    def test_reorder_particle_arrays(self):
+        store = m_arr.ParticleArrays()
+        for x in positions:
+            store.append(x, fl, 0.1)
+        grid = m_grid.CellGrid(0.5)
+        grid.build(store.position)
+        expected = store.position[grid.order]
+        store.reorder(grid.order)
+        assert np.array_equal(store.position, expected)
+
+
+class TestCellGridHashSurface:
+    def test_search_matches_brute_force(self):
+        grid = m_grid.CellGrid(0.3)
+        particles = [m_part.ActiveParticle(grid, m_vec.Vector(x), fl, 0.1) for x in positions[:60]]
+        p = particles[7]
+        found = grid.search(p, 0.5, approx=False)
+        expected = [q for q in particles if np.linalg.norm(q.current_location.value - p.current_location.value) < 0.5]
+        assert sorted(map(id, found)) == sorted(map(id, expected))
+
+    def test_remove_and_hash_table(self):
+        grid = m_grid.CellGrid(0.5)
+        particles = [m_part.ActiveParticle(grid, m_vec.Vector(x), fl, 0.1) for x in positions[:10]]
+        grid.remove(particles[3])
+        stored = [q for bucket in grid.hash_table.values() for q in bucket]
+        assert len(stored) == 9
+        assert particles[3] not in stored
+        with pytest.raises(ValueError):
+            grid.remove(particles[3])
+
+    def test_query(self):
+        grid = m_grid.CellGrid(1.)
+        p = m_part.ActiveParticle(grid, m_vec.Vector([0.5, 0.5, 0.5]), fl, 0.1)
+        assert grid.query(0, 0, 0) == [p]
+        assert grid.query(5, 5, 5) is None
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import numpy as np
+import pytest
+
+import app.solver.model.cell_key as m_key
+
+
+class TestKeys:
+    cells = np.array([[0, 0, 0], [-1, 0, 0], [0, -1, 0], [0, 0, -1], [5, -7, 11], [-1048576, 1048575, 3]])
+
+    @pytest.mark.parametrize("key", [m_key.pack, m_key.morton])
+    def test_distinct_cells_have_distinct_keys(self, key):
+        keys = key(self.cells)
+        assert keys.dtype == np.int64
+        assert np.all(keys >= 0)
+        assert len(set(keys.tolist())) == len(self.cells)
+
+    def test_morton_interleaves_the_bits(self):
+        base = m_key.morton([[0, 0, 0]])[0]
+        assert m_key.morton([[1, 0, 0]])[0] - base == 1
+        assert m_key.morton([[0, 1, 0]])[0] - base == 2
+        assert m_key.morton([[0, 0, 1]])[0] - base == 4
+
+    @pytest.mark.parametrize("key", [m_key.pack, m_key.morton])
+    def test_out_of_range_raises(self, key):
+        with pytest.raises(ValueError):
+            key([[1 << 20, 0, 0]])
+
+
+class TestCellTable:
+    def test_behaves_like_a_defaultdict(self):
+        table = m_key.CellTable()
+        reference = {}
+        rng = np.random.RandomState(0)
+        for key in rng.randint(0, 1 << 40, size=200).tolist():
+            table[key].append(key)
+            reference.setdefault(key, []).append(key)
+        for key in list(reference)[::3]:
+            del table[key]
+            del reference[key]
+        assert len(table) == len(reference)
+        assert sorted(table.items()) == sorted(reference.items())
+        assert all(key in table for key in reference)
+        assert table.statistics['load_factor'] <= m_key.MAX_LOAD
+
+    def test_delete_missing_key_raises(self):
+        table = m_key.CellTable()
+        with pytest.raises(KeyError):
+            del table[3]
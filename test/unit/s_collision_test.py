@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import numpy as np
+import pytest
+
+import app.solver.model.collision as m_col
+import app.solver.model.vector as m_vec
+
+
+def obstacles():
+    return [m_col.Sphere(m_vec.Vector([0.5, 0.5, 0.5]), 1.),
+            m_col.Sphere(m_vec.Vector([0.5, 0.5, 0.5]), 0.6, is_containing=False),
+            m_col.Box(m_vec.Vector([0.5, 0.5, 0.5]), m_vec.Vector([0, 0, 0]), m_vec.Vector([0.8, 0.6, 0.7])),
+            m_col.Box(m_vec.Vector([0.5, 0.5, 0.5]), m_vec.Vector([0, 0, 90]), m_vec.Vector([0.8, 0.6, 0.7])),
+            m_col.Box(m_vec.Vector([0.5, 0.5, 0.5]), m_vec.Vector([30, 0, 45]), m_vec.Vector([0.8, 0.6, 0.7]))]
+
+
+def cloud(n=500, seed=2):
+    return np.random.RandomState(seed).rand(n, 3) * 3 - 1
+
+
+class TestBatch:
+    @pytest.mark.parametrize("k", range(5))
+    def test_detect_batch(self, k):
+        coll_obj = obstacles()[k]
+        x = cloud()
+        mask = coll_obj.detect_batch(x)
+        assert 0 < mask.sum() < len(x)
+        assert list(mask) == [bool(coll_obj.detect(m_vec.Vector(p))) for p in x]
+
+    @pytest.mark.parametrize("k", range(5))
+    def test_collide_batch_matches_contact(self, k):
+        coll_obj = obstacles()[k]
+        x = cloud()
+        mask, cp, d, n_cp = coll_obj.collide_batch(x)
+        for p, cp_k, d_k, n_k in zip(x[mask], cp, d, n_cp):
+            expected = coll_obj.contact(m_vec.Vector(p))
+            assert np.allclose(cp_k, expected[0])
+            assert np.isclose(d_k, expected[1])
+            assert np.allclose(n_k, expected[2])
+
+    @pytest.mark.parametrize("k", range(5))
+    def test_react_batch_matches_the_scalar_reaction(self, k):
+        coll_obj = obstacles()[k]
+        x = cloud()
+        u = np.random.RandomState(5).randn(len(x), 3)
+        position, velocity = x.copy(), u.copy()
+        mask = coll_obj.react_batch(position, velocity, 0.01, 0.5)
+        for i in range(len(x)):
+            if not mask[i]:
+                assert np.array_equal(position[i], x[i]) and np.array_equal(velocity[i], u[i])
+                continue
+            cp, d, n_cp = coll_obj.contact(m_vec.Vector(x[i]))
+            assert np.allclose(position[i], cp)
+            assert np.allclose(velocity[i], coll_obj.reaction_speed(u[i], 0.5, d, n_cp, 0.01))
+
+    def test_rotated_box_normal_points_to_the_box(self):
+        box = obstacles()[4]
+        x = cloud()
+        mask, cp, d, n_cp = box.collide_batch(x)
+        assert np.allclose(cp, x[mask] + d[:, np.newaxis] * n_cp)
+        assert np.all(box.detect_batch(cp - 1e-9 * n_cp))
+        assert not np.any(box.detect_batch(cp + 1e-3 * n_cp))
+
+    def test_particle_at_the_centre_of_an_obstacle(self):
+        sphere = obstacles()[1]
+        position = np.array([[0.5, 0.5, 0.5], [0.5, 0.5, 0.7]])
+        velocity = np.array([[1., 0., 0.], [0., 0., 1.]])
+        mask = sphere.react_batch(position, velocity, 0.01, 0.5)
+        assert mask.all()
+        assert np.all(np.isfinite(position)) and np.all(np.isfinite(velocity))
+        # Pushed out along +z, the same side as the particle above the centre
+        assert np.allclose(position, [[0.5, 0.5, 1.1], [0.5, 0.5, 1.1]])
+        cp, d, n_cp = sphere.contact_batch(np.array([[0.5, 0.5, 0.5]]))
+        assert np.allclose(d, 0.6) and np.allclose(n_cp, [[0, 0, -1]])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import numpy as np
+import pytest
+
+import app.solver.model.distance_grid as m_sdf
+import app.solver.model.collision as m_col
+import app.solver.model.vector as m_vec
+
+
+def sphere(is_containing=False):
+    return m_col.Sphere(m_vec.Vector([0.5, 0.5, 0.5]), 0.6, is_containing=is_containing)
+
+
+def grid(primitive, spacing=0.02, dtype=np.float64):
+    return m_sdf.SignedDistanceGrid.from_primitive(primitive, [-0.5, -0.5, -0.5], [1.5, 1.5, 1.5], spacing, dtype)
+
+
+def cloud(n=2000, seed=6):
+    return np.random.RandomState(seed).rand(n, 3) * 1.8 - 0.4
+
+
+class TestSampling:
+    def test_sphere_distance_and_normal(self):
+        sdf = grid(sphere())
+        x = cloud()
+        phi, gradient = sdf.sample(x)
+        offset = x - 0.5
+        distance = np.sqrt(np.einsum('ij,ij->i', offset, offset))
+        assert np.allclose(phi, distance - 0.6, atol=1e-3)
+        away = distance > 0.1
+        direction = offset[away] / distance[away, np.newaxis]
+        normal = gradient[away] / np.linalg.norm(gradient[away], axis=1)[:, np.newaxis]
+        assert np.all(np.einsum('ij,ij->i', direction, normal) > 0.999)
+
+    def test_nodes_are_exact(self):
+        sdf = grid(sphere(), 0.1)
+        node = sdf.origin + np.array([[3, 4, 5]]) * sdf.spacing
+        assert sdf.sample(node)[0][0] == pytest.approx(sdf.field[3, 4, 5, 0])
+
+    def test_outside_of_the_grid(self):
+        sdf = grid(sphere())
+        assert sdf.implicit_function(m_vec.Vector([2.5, 0.5, 0.5])) == pytest.approx(1.4, abs=1e-3)
+
+
+class TestCollision:
+    @pytest.mark.parametrize("is_containing", [False, True])
+    def test_same_detection_and_reaction_as_the_primitive(self, is_containing):
+        primitive = sphere(is_containing)
+        sdf = grid(primitive)
+        x = cloud()
+        # Away from the surface, where a node spacing can not change the side
+        offset = np.linalg.norm(x - 0.5, axis=1)
+        x = x[np.abs(offset - 0.6) > 0.01]
+        assert np.array_equal(sdf.detect_batch(x), primitive.detect_batch(x))
+
+        mask, cp, d, n_cp = sdf.collide_batch(x)
+        expected = primitive.contact_batch(x[mask])
+        assert np.allclose(cp, expected[0], atol=2e-3)
+        assert np.allclose(d, expected[1], atol=2e-3)
+        assert np.allclose(np.abs(np.einsum('ij,ij->i', n_cp, expected[2])), 1, atol=1e-3)
+
+    def test_box(self):
+        box = m_col.Box(m_vec.Vector([0.5, 0.5, 0.5]), m_vec.Vector([0, 0, 30]), m_vec.Vector([0.4, 0.3, 0.2]),
+                        is_containing=False)
+        sdf = grid(box)
+        low, high = sdf.aabb()
+        expected = box.bounding_box()
+        assert np.all(low <= expected[0]) and np.all(high >= expected[1])
+        x = cloud()
+        f = box.implicit_function_batch(x)
+        x = x[np.abs(f) > 0.02]
+        assert np.array_equal(sdf.detect_batch(x), box.detect_batch(x))
+
+
+class TestStorage:
+    @pytest.mark.parametrize("mmap", [True, False])
+    def test_save_and_load(self, tmp_path, mmap):
+        sdf = grid(sphere(), 0.05, np.float32)
+        path = str(tmp_path / "sphere")
+        sdf.save(path)
+        loaded = m_sdf.SignedDistanceGrid.load(path, mmap=mmap)
+        assert isinstance(loaded.field, np.memmap) == mmap
+        assert not loaded.is_containing
+        x = cloud(200)
+        assert np.array_equal(loaded.sample(x)[0], sdf.sample(x)[0])
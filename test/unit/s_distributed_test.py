@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+import pytest
+import numpy as np
+import app.solver.model.distributed as m_dist
+
+import scene
+
+positions = scene.cloud(200, 3)
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return scene.run([], 4, particles=scene.store(positions), vectorized=True).particles
+
+
+def payload_of(points):
+    n = len(points)
+    return {'position': np.array(points, dtype=np.float64),
+            'velocity': np.zeros((n, 3)),
+            'acceleration': np.zeros((n, 3)),
+            'density': np.full(n, scene.WATER.rho0),
+            'pressure': np.zeros(n),
+            'radius': np.full(n, 0.1),
+            'mass': np.ones(n),
+            'fluid_id': np.zeros(n, dtype=np.intp),
+            'tag': np.arange(n)}
+
+
+class TestSubdomain:
+    def test_layers_and_migration(self):
+        domain = m_dist.Subdomain([scene.WATER], [], 0.01, 0., 1.)
+        assert domain.add(payload_of([[.1, .5, .5], [.5, .5, .5], [.9, .5, .5]])) == 3
+        lower, upper = domain.layers(0.2)
+        assert lower['tag'].tolist() == [0]
+        assert upper['tag'].tolist() == [2]
+        leaving = domain.set_bounds(0.3, 1.)
+        assert leaving['tag'].tolist() == [0]
+        assert sorted(domain.payload()['tag'].tolist()) == [1, 2]
+
+    def test_concatenate_keeps_order(self):
+        payload = m_dist.concatenate([payload_of([[0, 0, 0]]), m_dist.empty_payload(), payload_of([[1, 1, 1]])])
+        assert payload['position'][:, 0].tolist() == [0., 1.]
+
+
+class TestDistributedSphSolver:
+    @pytest.mark.parametrize("domains", [1, 2, 3])
+    def test_same_results_as_one_process(self, reference, domains):
+        with m_dist.DistributedSphSolver(1, 0.01, scene.store(positions), [scene.tank()], domains=domains) as solve:
+            assert sum(solve.counts) == len(positions)
+            for k in range(4):
+                solve.step()
+            store = solve.gather()
+        assert np.allclose(store.density, reference.density, rtol=1e-9)
+        assert np.allclose(store.velocity, reference.velocity, rtol=1e-9, atol=1e-9)
+        assert np.allclose(store.position, reference.position, rtol=1e-9, atol=1e-9)
+
+    def test_ghosts_are_exchanged(self):
+        with m_dist.DistributedSphSolver(1, 0.01, scene.store(positions), domains=2) as solve:
+            solve.step()
+            assert solve.statistics['ghosts'] > 0
+
+    @pytest.mark.parametrize("bounds", [[1., 1.1], [1.5, 0.5]])
+    def test_bounds_closer_than_the_search_radius(self, bounds):
+        with pytest.raises(AssertionError):
+            m_dist.DistributedSphSolver(1, 0.01, scene.store(positions), domains=3, bounds=bounds)
+
+    def test_rebalance(self):
+        # Every particle starts in the first slab
+        with m_dist.DistributedSphSolver(1, 0.01, scene.store(positions), domains=2, bounds=[10.]) as solve:
+            assert solve.counts == [len(positions), 0]
+            solve.step()
+            assert solve.statistics['rebalances'] == 1
+            assert solve.statistics['migrations'] > 0
+            assert max(solve.counts) < 0.75 * len(positions)
+            assert solve.bounds[0] == pytest.approx(round(solve.bounds[0] / 0.5) * 0.5)
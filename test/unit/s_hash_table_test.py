@@ -23,6 +23,7 @@ import app.solver.model.hash_table as s_h
 import app.solver.model.particle as s_p
 import app.solver.model.fluid as s_f
 import app.solver.model.vector as m_vec
+import app.solver.model.cell_key as m_key
 
 h1 = s_h.Hash(76, 212)
 f1 = s_f.Fluid(1, 1, 1, 1, 1, 1, 1)
@@ -37,3 +38,107 @@ class TestHash:
         with pytest.raises(AssertionError):
             h1.compute_r_chap("a")
 
+
+
+class TestSearch:
+    def test_search_reaches_the_cells_on_both_sides(self):
+        h = s_h.Hash(1., 8)
+        particles = [s_p.ActiveParticle(h, m_vec.Vector([x, 0.5, 0.5]), f1, 1) for x in (0.5, 1.5, 2.5)]
+        assert set(h.search(particles[1], 1.2, approx=False)) == set(particles)
+
+    def test_colliding_buckets_are_read_once(self):
+        # 125 cells in the search range over a few buckets
+        h = s_h.Hash(1., 2)
+        particles = [s_p.ActiveParticle(h, m_vec.Vector([x + 0.5, 0.5, 0.5]), f1, 1) for x in range(3)]
+        found = h.search(particles[1], 2.5)
+        assert len(found) == len(set(map(id, found))) == 3
+
+
+class TestRebin:
+    def make(self, locations, l=1.):
+        h = s_h.Hash(l, len(locations))
+        particles = [s_p.ActiveParticle(h, m_vec.Vector(x), f1, 1) for x in locations]
+        return h, particles
+
+    def buckets(self, h):
+        return {id(p): k for k, bucket in h.hash_table.items() for p in bucket}
+
+    def test_compute_hash_batch_matches_compute_hash(self):
+        h = s_h.Hash(0.5, 100)
+        cells = [[0, 0, 0], [-3, 2, 7], [12, -40, -1]]
+        expected = [h.compute_hash(m_vec.Vector(c)) for c in cells]
+        assert list(h.compute_hash_batch(cells)) == expected
+
+    def test_rebin_only_moves_particles_leaving_their_cell(self):
+        h, particles = self.make([[0.1, 0.1, 0.1], [0.2, 0.2, 0.2], [2.5, 0.5, 0.5]])
+        particles[0].current_location.value = m_vec.Vector([0.9, 0.9, 0.9])
+        particles[2].current_location.value = m_vec.Vector([5.5, 0.5, 0.5])
+        assert h.rebin() == 1
+        statistics = h.statistics
+        assert (statistics['rebins'], statistics['migrations'], statistics['total_migrations']) == (1, 1, 1)
+        bucket = self.buckets(h)
+        for p in particles:
+            assert bucket[id(p)] == h.compute_hash(h.compute_r_chap(p))
+
+    def test_remove_keeps_the_other_particles(self):
+        h, particles = self.make([[0.1, 0.1, 0.1], [0.2, 0.2, 0.2], [0.3, 0.3, 0.3]])
+        h.remove(particles[0])
+        particles[2].current_location.value = m_vec.Vector([3.5, 0.5, 0.5])
+        h.rebin()
+        assert sorted(self.buckets(h).values()) == sorted(h.compute_hash(h.compute_r_chap(p))
+                                                          for p in particles[1:])
+        with pytest.raises(ValueError):
+            h.remove(particles[0])
+
+
+class TestExactKeys:
+    locations = [[0.5, 0.5, 0.5], [0.6, 0.5, 0.5], [1.5, 0.5, 0.5], [40.5, -3.5, 7.5], [-0.5, 0.5, 0.5]]
+
+    @pytest.mark.parametrize("keys", ["packed", "morton"])
+    def test_one_cell_per_bucket(self, keys):
+        h = s_h.Hash(1., 1, keys=keys)
+        particles = [s_p.ActiveParticle(h, m_vec.Vector(x), f1, 1) for x in self.locations]
+        statistics = h.bucket_statistics
+        assert statistics['buckets'] == 4
+        assert statistics['shared_buckets'] == 0
+        assert statistics['max_load'] == 2
+        assert set(h.query(0, 0, 0)) == set(particles[:2])
+        assert h.query(2, 0, 0) is None
+
+        particles[3].current_location.value = m_vec.Vector([0.7, 0.7, 0.7])
+        assert h.rebin() == 1
+        assert set(h.query(0, 0, 0)) == set(particles[:2] + [particles[3]])
+
+    def test_unknown_keys_raise(self):
+        with pytest.raises(ValueError):
+            s_h.Hash(1., 1, keys="xor")
+
+
+class TestAutoTuning:
+    def test_cell_size_from_the_kernel_support(self):
+        h = s_h.Hash()
+        s_p.ActiveParticle(h, m_vec.Vector([0, 0, 0]), f1, 0.5)
+        assert h.l == s_h.KERNEL_MULTIPLICATIVE * 0.5
+        big = s_p.ActiveParticle(h, m_vec.Vector([2, 0, 0]), f1, 1.)
+        assert h.l == s_h.KERNEL_MULTIPLICATIVE
+        assert h.statistics['rehashes'] == 2
+        assert big in h.query(0, 0, 0)
+
+    @pytest.mark.parametrize("keys", [None, "packed"])
+    def test_grows_and_shrinks(self, keys):
+        h = s_h.Hash(1., keys=keys)
+        particles = [s_p.ActiveParticle(h, m_vec.Vector([k % 10, k // 10 % 10, k // 100]), f1, 1)
+                     for k in range(500)]
+        if keys is None:
+            assert h.n_h > 500
+            assert h.statistics['rehashes'] > 0
+        assert h.load_factor <= max(s_h.MAX_LOAD, m_key.MAX_LOAD)
+        for p in particles[5:]:
+            h.remove(p)
+        if keys is None:
+            assert h.n_h < 50
+        else:
+            assert h.hash_table.statistics['shrinks'] > 0
+        assert sorted(id(p) for bucket in h.hash_table.values() for p in bucket) == sorted(id(p) for p in particles[:5])
+        for p in particles[:5]:
+            assert p in h.query(*[int(c) for c in h.compute_r_chap(p)])
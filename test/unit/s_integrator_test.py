@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+import math
+
+import pytest
+import numpy as np
+import app.solver.model.integrator as m_int
+import app.solver.model.particle_arrays as m_arr
+import app.solver.model.hash_table as m_hash
+import app.solver.model.solver as m_solver
+import app.solver.model.vector as m_vec
+
+import scene
+
+SECOND_ORDER = ["leapfrog", "verlet", "predictor_corrector"]
+
+
+def oscillator():
+    """
+    Unit harmonic oscillators, x(t) = cos(t)
+    """
+    particles = m_arr.ParticleArrays()
+    particles.append(m_vec.Vector([1., 0., 0.]), scene.WATER, 0.1)
+    particles.append(m_vec.Vector([0., 2., 0.]), scene.WATER, 0.1)
+
+    def accelerate():
+        particles.acceleration[:] = - particles.position
+    return particles, accelerate
+
+
+def error(name, dt, t=1.):
+    particles, accelerate = oscillator()
+    integrator = m_int.integrator(name)
+    for k in range(int(round(t / dt))):
+        integrator.step(particles, accelerate, dt)
+    return abs(particles.position[0, 0] - math.cos(t))
+
+
+def energy(particles):
+    return 0.5 * np.sum(particles.velocity ** 2) + 0.5 * np.sum(particles.position ** 2)
+
+
+class TestIntegrators:
+    def test_first_order_euler(self):
+        ratio = error("euler", 0.01) / error("euler", 0.005)
+        assert 1.5 < ratio < 2.5
+
+    @pytest.mark.parametrize("name", SECOND_ORDER)
+    def test_second_order(self, name):
+        ratio = error(name, 0.01) / error(name, 0.005)
+        assert 3.5 < ratio < 4.5
+        assert error(name, 0.01) < error("euler", 0.01) / 10
+
+    @pytest.mark.parametrize("name", ["leapfrog", "verlet"])
+    def test_energy_is_bounded(self, name):
+        particles, accelerate = oscillator()
+        integrator = m_int.integrator(name)
+        initial = energy(particles)
+        for k in range(5000):
+            integrator.step(particles, accelerate, 0.05)
+        assert abs(energy(particles) - initial) < 1e-2 * initial
+
+    @pytest.mark.parametrize("name", SECOND_ORDER)
+    def test_one_evaluation_per_step(self, name):
+        particles, accelerate = oscillator()
+        integrator = m_int.integrator(name)
+        for k in range(10):
+            integrator.step(particles, accelerate, 0.01)
+        assert integrator.evaluations == 11
+        # New particles invalidate the stored accelerations
+        particles.append(m_vec.Vector([0., 0., 1.]), scene.WATER, 0.1)
+        integrator.step(particles, accelerate, 0.01)
+        assert integrator.evaluations == 13
+
+    def test_in_place(self):
+        particles, accelerate = oscillator()
+        position = particles.position
+        m_int.integrator("predictor_corrector").step(particles, accelerate, 0.01)
+        assert np.shares_memory(position, particles.position)
+        assert position[0, 0] != 1.
+
+    def test_names(self):
+        integrator = m_int.Leapfrog()
+        assert m_int.integrator(integrator) is integrator
+        with pytest.raises(ValueError):
+            m_int.integrator("runge_kutta")
+
+
+class TestSolverIntegrator:
+    def test_requires_particle_arrays(self):
+        with pytest.raises(TypeError):
+            m_solver.SphSolver(1, 0.1, m_hash.Hash(1, 10), integrator="leapfrog")
+
+    @pytest.mark.parametrize("name", SECOND_ORDER)
+    def test_scalar_and_vectorized_steps_agree(self, name):
+        positions = scene.cloud(60, 8)
+        stores = [scene.run(positions, 2, dt=0.005, collisions_objects=[scene.tank(1.5)], vectorized=vectorized,
+                            integrator=integrator).particles
+                  for vectorized, integrator in ((False, name), (True, name), (True, "euler"))]
+        assert np.allclose(stores[0].position, stores[1].position, rtol=1e-9, atol=1e-9)
+        assert np.allclose(stores[0].velocity, stores[1].velocity, rtol=1e-9, atol=1e-9)
+        assert not np.array_equal(stores[1].position, stores[2].position)
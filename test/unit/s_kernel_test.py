@@ -18,7 +18,9 @@ __maintainer__ = "Tycho Tatitscheff"
 __email__ = "tycho.tatitscheff@ensam.eu"
 __status__ = "Production"
 
+import math
 import pytest
+import numpy as np
 import app.solver.model.kernel as s_k
 import app.solver.model.vector as s_v
 
@@ -268,4 +270,104 @@ class TestPoly6Kernel:
         assert isinstance(k4.laplacian(s_v.Vector([1, 2, 3])), float)
 
     def test_laplacian_shall_return_float_2(self):
-        assert isinstance(k4.laplacian(s_v.Vector([10, 20, 30])), float)
\ No newline at end of file
+        assert isinstance(k4.laplacian(s_v.Vector([10, 20, 30])), float)
+
+# test batch evaluation
+r_batch = np.array([[1., 2., 3.], [4., 0., 3.], [10., 20., 30.], [0.5, 0.5, 0.5]])
+
+
+class TestBatchKernels:
+    @pytest.mark.parametrize("kernel", [s_k.Poly6Kernel(10), s_k.SpikyKernel(10), s_k.ViscosityKernel(10)])
+    def test_batch_matches_scalar(self, kernel):
+        values = kernel.evaluate(r_batch)
+        gradients = kernel.gradient(r_batch)
+        laplacians = kernel.laplacian(r_batch)
+        assert values.shape == (4,)
+        assert gradients.shape == (4, 3)
+        for k, r in enumerate(r_batch):
+            assert values[k] == pytest.approx(kernel(s_v.Vector(r)))
+            assert np.allclose(gradients[k], kernel.gradient(s_v.Vector(r)))
+            assert laplacians[k] == pytest.approx(kernel.laplacian(s_v.Vector(r)))
+
+    @pytest.mark.parametrize("kernel", [s_k.Poly6Kernel(10), s_k.SpikyKernel(10), s_k.ViscosityKernel(10)])
+    def test_out_of_support_is_zero(self, kernel):
+        assert kernel.evaluate(r_batch)[2] == 0
+        assert np.all(kernel.gradient(r_batch)[2] == 0)
+        assert kernel.laplacian(r_batch)[2] == 0
+
+    @pytest.mark.parametrize("kernel", [s_k.Poly6Kernel(2.), s_k.SpikyKernel(2.), s_k.ViscosityKernel(2.),
+                                        s_k.M6QuinticKernel(2.)])
+    def test_single_pairs_match_batch(self, kernel):
+        d = np.array([0., 1e-3, 0.5, 1., 1.999, 2., 2.5])
+        r = np.stack((d, np.zeros_like(d), np.zeros_like(d)), axis=1)
+        values = kernel.evaluate(r)
+        gradients = kernel.gradient(r)
+        laplacians = kernel.laplacian(r)
+        for k, rk in enumerate(r.tolist()):
+            v = s_v.Vec3(rk)
+            assert type(kernel(v)) is float and type(kernel.laplacian(v)) is float
+            assert kernel(v) == pytest.approx(values[k])
+            assert np.allclose(tuple(kernel.gradient(v)), gradients[k])
+            assert kernel.laplacian(v) == pytest.approx(laplacians[k])
+
+    def test_distances_accepted(self):
+        d = np.linalg.norm(r_batch, axis=1)
+        assert np.allclose(k4.evaluate(d), k4.evaluate(r_batch))
+        assert np.allclose(k4.laplacian(d), k4.laplacian(r_batch))
+
+    def test_poly6_value(self):
+        assert k4.evaluate(np.array([0.]))[0] == pytest.approx(315. / (64 * math.pi * 10 ** 3))
+
+
+# test quintic kernel
+k5 = s_k.M6QuinticKernel(2.)
+
+
+class TestM6QuinticKernel:
+    def test_normalised(self):
+        r = np.linspace(0, 2, 20001)
+        assert np.trapz(4 * math.pi * r ** 2 * k5.evaluate(r), r) == pytest.approx(1., rel=1e-6)
+
+    def test_call_shall_return_float(self):
+        assert isinstance(k5(s_v.Vector([0.1, 0.2, 0.3])), float)
+
+    def test_gradient_matches_finite_difference(self):
+        d = np.array([0.3, 0.9, 1.5])
+        r = np.stack([d, np.zeros(3), np.zeros(3)], axis=1)
+        eps = 1e-6
+        derivative = (k5.evaluate(d + eps) - k5.evaluate(d - eps)) / (2 * eps)
+        assert np.allclose(k5.gradient(r)[:, 0], derivative)
+
+    def test_out_of_support_is_zero(self):
+        assert k5.evaluate(np.array([2.5]))[0] == 0
+
+
+# test tabulated kernel
+class TestTabulatedKernel:
+    @pytest.mark.parametrize("interpolation", ["linear", "cubic"])
+    @pytest.mark.parametrize("variable", ["r", "r2"])
+    def test_close_to_sampled_kernel(self, interpolation, variable):
+        tab = s_k.TabulatedKernel(k5, 1024, interpolation, variable)
+        assert np.allclose(tab.evaluate(r_batch / 10), k5.evaluate(r_batch / 10), atol=1e-4)
+        assert np.allclose(tab.gradient(r_batch / 10), k5.gradient(r_batch / 10), atol=1e-2)
+        assert tab.max_error["value"] < 1e-4
+
+    def test_cubic_more_accurate_than_linear(self):
+        linear = s_k.TabulatedKernel(k4, 256, "linear")
+        cubic = s_k.TabulatedKernel(k4, 256, "cubic")
+        assert cubic.max_error["value"] < linear.max_error["value"]
+
+    def test_error_decreases_with_resolution(self):
+        coarse = s_k.TabulatedKernel(k5, 64)
+        fine = s_k.TabulatedKernel(k5, 1024)
+        assert fine.max_error["value"] < coarse.max_error["value"]
+
+    def test_scalar_interface(self):
+        tab = s_k.TabulatedKernel(k4)
+        assert isinstance(tab(s_v.Vector([1, 2, 3])), float)
+        assert isinstance(tab.gradient(s_v.Vector([1, 2, 3])), s_v.Vector)
+        assert tab(s_v.Vector([10, 20, 30])) == 0
+
+    def test_raise_assertion_error(self):
+        with pytest.raises(AssertionError):
+            s_k.TabulatedKernel("a")
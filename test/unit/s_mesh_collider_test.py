@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import numpy as np
+import pytest
+
+import app.geometry.mesh as g_mesh
+import app.solver.model.collision as m_col
+import app.solver.model.mesh_collider as m_mesh
+import app.solver.model.vector as m_vec
+
+CUBE_OBJ = """# unit cube, quad faces
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+v 1 0 1
+v 1 1 1
+v 0 1 1
+vn 0 0 1
+f 1/1/1 4/4/1 3/3/1 2/2/1
+f 5//1 6//1 7//1 8//1
+f 1 2 6 5
+f 2 3 7 6
+f 3 4 8 7
+f -4 -8 -5 -1
+"""
+
+
+def cube_file(tmp_path):
+    path = tmp_path / "cube.obj"
+    path.write_text(CUBE_OBJ)
+    return str(path)
+
+
+def icosphere(subdivisions=3):
+    t = (1 + np.sqrt(5)) / 2
+    vertices = [[-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0], [0, -1, t], [0, 1, t], [0, -1, -t], [0, 1, -t],
+                [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1]]
+    faces = [[0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11], [1, 5, 9], [5, 11, 4], [11, 10, 2],
+             [10, 7, 6], [7, 1, 8], [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9], [4, 9, 5], [2, 4, 11],
+             [6, 2, 10], [8, 6, 7], [9, 8, 1]]
+    vertices = [np.array(v, dtype=np.float64) / np.linalg.norm(v) for v in vertices]
+    for _ in range(subdivisions):
+        middle = {}
+
+        def split(a, b):
+            key = (min(a, b), max(a, b))
+            if key not in middle:
+                v = vertices[a] + vertices[b]
+                vertices.append(v / np.linalg.norm(v))
+                middle[key] = len(vertices) - 1
+            return middle[key]
+        refined = []
+        for a, b, c in faces:
+            ab, bc, ca = split(a, b), split(b, c), split(c, a)
+            refined += [[a, ab, ca], [b, bc, ab], [c, ca, bc], [ab, bc, ca]]
+        faces = refined
+    return np.array(vertices), np.array(faces)
+
+
+def cloud(n=2000, seed=7, low=-0.5, high=1.5):
+    return low + np.random.RandomState(seed).rand(n, 3) * (high - low)
+
+
+class TestLoadObj:
+    def test_quads_are_triangulated(self, tmp_path):
+        vertices, triangles = g_mesh.load_obj(cube_file(tmp_path))
+        assert vertices.shape == (8, 3)
+        assert triangles.shape == (12, 3)
+        assert triangles.min() == 0 and triangles.max() == 7
+        # Negative indices count back from the last vertex
+        assert [4, 0, 3] in triangles.tolist()
+
+
+class TestClosestPoints:
+    def test_brute_force(self):
+        vertices, faces = icosphere(2)
+        mesh = m_mesh.MeshCollider(vertices, faces, leaf_size=4)
+        x = cloud(500, low=-2, high=2)
+        cp, d, triangle = mesh.closest_points(x)
+
+        a, b, c = (np.repeat(vertices[faces[:, k]][np.newaxis], len(x), axis=0).reshape(-1, 3) for k in range(3))
+        every = m_mesh.closest_point_on_triangles(np.repeat(x, len(faces), axis=0), a, b, c)
+        distance = np.linalg.norm(every - np.repeat(x, len(faces), axis=0), axis=1).reshape(len(x), -1)
+        assert np.allclose(d, distance.min(axis=1))
+        assert np.allclose(np.linalg.norm(x - cp, axis=1), d)
+        assert np.allclose(distance[np.arange(len(x)), triangle], d)
+
+    def test_triangle_regions(self):
+        a, b, c = np.array([[0., 0, 0]]), np.array([[1., 0, 0]]), np.array([[0., 1, 0]])
+        p = np.array([[-1., -1, 1], [2, -1, 0], [0.5, -1, 0], [0.6, 0.6, 0], [0.2, 0.2, 3]])
+        cp = m_mesh.closest_point_on_triangles(p, *(np.repeat(v, len(p), axis=0) for v in (a, b, c)))
+        assert np.allclose(cp, [[0, 0, 0], [1, 0, 0], [0.5, 0, 0], [0.5, 0.5, 0], [0.2, 0.2, 0]])
+
+
+class TestCube:
+    @pytest.mark.parametrize("is_containing", [False, True])
+    def test_same_as_the_box(self, tmp_path, is_containing):
+        mesh = m_mesh.MeshCollider.from_obj(cube_file(tmp_path), is_containing=is_containing)
+        box = m_col.Box(m_vec.Vector([0.5, 0.5, 0.5]), m_vec.Vector([0, 0, 0]), m_vec.Vector([0.5, 0.5, 0.5]),
+                        is_containing=is_containing)
+        x = cloud()
+        assert np.array_equal(mesh.detect_batch(x), box.detect_batch(x))
+
+        mask, cp, d, n_cp = mesh.collide_batch(x)
+        expected = box.contact_batch(x[mask])
+        assert np.allclose(cp, expected[0])
+        assert np.allclose(d, expected[1])
+
+        velocities = np.random.RandomState(8).randn(len(x), 3)
+        positions, expected_velocities = x.copy(), velocities.copy()
+        mesh.react_batch(positions, velocities, 0.01, 0.5)
+        box.react_batch(x.copy(), expected_velocities, 0.01, 0.5)
+        assert np.allclose(positions[mask], cp)
+        assert np.allclose(velocities, expected_velocities)
+
+    @pytest.mark.parametrize("is_containing", [False, True])
+    def test_detection_follows_the_implicit_function(self, tmp_path, monkeypatch, is_containing):
+        mesh = m_mesh.MeshCollider.from_obj(cube_file(tmp_path), is_containing=is_containing)
+        x = cloud()
+        f = mesh.implicit_function_batch(x)
+        assert np.array_equal(mesh.detect_batch(x), (f >= 0) if is_containing else (f < 0))
+
+        queried = []
+        closest_points = mesh.closest_points
+        monkeypatch.setattr(mesh, "closest_points", lambda p: queried.append(len(p)) or closest_points(p))
+        mask = mesh.collide_batch(x)[0]
+        assert queried == [mask.sum()]
+
+    def test_scalar_surface(self, tmp_path):
+        mesh = m_mesh.MeshCollider.from_obj(cube_file(tmp_path))
+        assert mesh.implicit_function(m_vec.Vector([0.5, 0.5, 0.25])) == pytest.approx(-0.25)
+        assert mesh.detect(m_vec.Vector([0.5, 0.5, 1.25]))
+        assert not mesh.detect(m_vec.Vector([0.5, 0.5, 0.75]))
+        cp, d, n_cp = mesh.contact(m_vec.Vector([0.5, 0.5, 1.25]))
+        assert np.allclose(cp, [0.5, 0.5, 1]) and d == pytest.approx(0.25)
+        assert np.allclose(n_cp, [0, 0, 1])
+        # On the surface, the normal of the face
+        cp, d, n_cp = mesh.contact(m_vec.Vector([0.5, 0.5, 1]))
+        assert d == 0 and np.allclose(np.abs(n_cp), [0, 0, 1])
+
+    def test_bounds(self, tmp_path):
+        mesh = m_mesh.MeshCollider.from_obj(cube_file(tmp_path), is_containing=False)
+        low, high = mesh.aabb(0.1)
+        assert np.allclose(low, -0.1) and np.allclose(high, 1.1)
+        assert m_mesh.MeshCollider.from_obj(cube_file(tmp_path)).aabb() is None
+
+
+class TestSphere:
+    def test_close_to_the_sphere(self):
+        vertices, faces = icosphere(3)
+        mesh = m_mesh.MeshCollider(vertices * 0.6 + 0.5, faces, is_containing=False)
+        sphere = m_col.Sphere(m_vec.Vector([0.5, 0.5, 0.5]), 0.6, is_containing=False)
+        x = cloud()
+        # Away from the facets
+        x = x[np.abs(np.linalg.norm(x - 0.5, axis=1) - 0.6) > 0.02]
+        assert np.array_equal(mesh.detect_batch(x), sphere.detect_batch(x))
+        f = mesh.implicit_function_batch(x)
+        assert np.allclose(f, np.linalg.norm(x - 0.5, axis=1) - 0.6, atol=0.01)
+
+        mask, cp, d, n_cp = mesh.collide_batch(x)
+        expected = sphere.contact_batch(x[mask])
+        # The facets are flat : the contact point may slide along them, not the depth
+        assert np.allclose(d, expected[1], atol=0.01)
+        assert np.allclose(cp, expected[0], atol=0.05)
+
+    def test_hierarchy(self):
+        vertices, faces = icosphere(2)
+        bvh = m_mesh.MeshCollider(vertices, faces, leaf_size=8).bvh
+        assert np.array_equal(np.sort(bvh.triangles), np.arange(len(faces)))
+        leaf = bvh.left < 0
+        assert bvh.count[leaf].sum() == len(faces) and bvh.count[leaf].max() <= 8
+        corners = vertices[faces[bvh.triangles]]
+        for k in np.flatnonzero(leaf):
+            inside = corners[bvh.start[k]:bvh.start[k] + bvh.count[k]].reshape(-1, 3)
+            assert np.all(inside >= bvh.low[k] - 1e-12) and np.all(inside <= bvh.high[k] + 1e-12)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import os
+
+import numpy as np
+import pytest
+
+import app.geometry.mesh as g_mesh
+
+MIXED_OBJ = ("# mixed records\r\n"
+             "mtllib scene.mtl\r\n"
+             "o first\r\n"
+             "v 0 0 0\r\n"
+             "v 1 0 0 1.0\r\n"
+             "v\t1 1 0\r\n"
+             "v 0 1 0\r\n"
+             "vt 0 0\r\n"
+             "vt 1 0 0\r\n"
+             "vt 1 1\r\n"
+             "vn 0 0 1\r\n"
+             "\r\n"
+             "usemtl red\r\n"
+             "f 1/1/1 2/2/1 3/3/1 4/3/1\r\n"
+             "s off\r\n"
+             "v 0 0 -1e-1\r\n"
+             "v 2.5 0 -1\r\n"
+             "f -1//1 -2//-1 1//1\r\n"
+             "f 5 6 2 3 4\r\n"
+             "g second\r\n"
+             "vn 1 0 0\r\n"
+             "f -6/-3 -5/-2 -4/-1")
+
+
+def reference(text):
+    """
+    The records of an .obj file, line by line.
+    """
+    v, vt, vn, faces = [], [], [], []
+    for line in text.splitlines():
+        values = line.split()
+        if not values:
+            continue
+        if values[0] in ('v', 'vn'):
+            (v if values[0] == 'v' else vn).append([float(x) for x in values[1:4]])
+        elif values[0] == 'vt':
+            vt.append([float(x) for x in values[1:3]])
+        elif values[0] == 'f':
+            corners = []
+            for corner in values[1:]:
+                index = (corner.split('/') + ['', ''])[:3]
+                index = [int(x) if x else 0 for x in index]
+                index = [x - 1 if x > 0 else (len(r) + x if x < 0 else -1) for x, r in zip(index, (v, vt, vn))]
+                corners.append(index)
+            for k in range(1, len(corners) - 1):
+                faces.append([corners[0], corners[k], corners[k + 1]])
+    faces = np.array(faces, dtype=np.int64).reshape(-1, 3, 3)
+    return v, vt, vn, np.where(faces < 0, g_mesh.MISSING, faces)
+
+
+def write(tmp_path, text, name="mesh.obj"):
+    path = tmp_path / name
+    path.write_bytes(text.encode())
+    return str(path)
+
+
+class TestReadObj:
+    @pytest.mark.parametrize("chunk", [g_mesh.CHUNK, 7, 64])
+    def test_same_as_line_by_line(self, tmp_path, chunk):
+        arrays = g_mesh.read_obj(write(tmp_path, MIXED_OBJ), chunk)
+        v, vt, vn, faces = reference(MIXED_OBJ)
+        assert arrays['vertices'].dtype == np.float32 and arrays['triangles'].dtype == np.uint32
+        assert np.array_equal(arrays['vertices'], np.array(v, dtype=np.float32))
+        assert np.array_equal(arrays['tex_coords'], np.array(vt, dtype=np.float32))
+        assert np.array_equal(arrays['normals'], np.array(vn, dtype=np.float32))
+        assert len(arrays['triangles']) == 2 + 1 + 3 + 1
+        assert np.array_equal(arrays['triangles'], faces[:, :, 0])
+        assert np.array_equal(arrays['tex_triangles'], faces[:, :, 1])
+        assert np.array_equal(arrays['normal_triangles'], faces[:, :, 2])
+
+    def test_random_polygons(self, tmp_path):
+        random = np.random.RandomState(3)
+        lines = ["v %r %r %r" % tuple(x) for x in random.randn(200, 3)]
+        for _ in range(300):
+            corners = random.choice(200, random.randint(3, 8), replace=False) + 1
+            sign = random.rand() < 0.3
+            lines.append("f " + " ".join(str(c - 201 if sign else c) for c in corners))
+        text = "\n".join(lines) + "\n"
+        arrays = g_mesh.read_obj(write(tmp_path, text), 1000)
+        v, _, _, faces = reference(text)
+        assert np.array_equal(arrays['vertices'], np.array(v, dtype=np.float32))
+        assert np.array_equal(arrays['triangles'], faces[:, :, 0])
+
+    def test_empty(self, tmp_path):
+        arrays = g_mesh.read_obj(write(tmp_path, "# nothing\n"))
+        assert arrays['vertices'].shape == (0, 3) and arrays['triangles'].shape == (0, 3)
+
+    def test_comments(self, tmp_path):
+        text = "v 0 0 0 # origin\nv 1 0 0#x\n# v 5 5 5\nv 0 1 0 # y # again\nf 1 2 3 # face\n"
+        arrays = g_mesh.read_obj(write(tmp_path, text), 16)
+        assert np.array_equal(arrays['vertices'], [[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+        assert arrays['triangles'].tolist() == [[0, 1, 2]]
+
+    def test_indented_records(self, tmp_path):
+        text = "  v 0 0 0\n\tv 1 0 0\n \t v 0 1 0\n   \n  vn 0 0 1\n\tf 1//1 2//1 3//1\n"
+        arrays = g_mesh.read_obj(write(tmp_path, text), 16)
+        assert np.array_equal(arrays['vertices'], [[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+        assert np.array_equal(arrays['normals'], [[0, 0, 1]])
+        assert arrays['triangles'].tolist() == [[0, 1, 2]]
+        assert arrays['normal_triangles'].tolist() == [[0, 0, 0]]
+
+    def test_texture_coordinates_and_normals_not_in_the_file(self, tmp_path):
+        text = "v 0 0 0\nv 1 0 0\nv 0 1 0\nvn 0 0 1\nf 1/1/1 2/1/2 3/-4/-1\n"
+        arrays = g_mesh.read_obj(write(tmp_path, text))
+        assert arrays['triangles'].tolist() == [[0, 1, 2]]
+        assert np.all(arrays['tex_triangles'] == g_mesh.MISSING)
+        assert arrays['normal_triangles'].tolist() == [[0, g_mesh.MISSING, 0]]
+
+    @pytest.mark.parametrize("text", ["v 0 0 0\nf 1 2 3\n", "v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 x\n",
+                                      "v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 -4\n", "v 0 0 0\nv 1 0 0\nf 1 2 0\n"])
+    def test_malformed(self, tmp_path, text):
+        with pytest.raises(ValueError):
+            g_mesh.read_obj(write(tmp_path, text))
+
+
+class TestCache:
+    def test_cache_follows_the_modification_time(self, tmp_path, monkeypatch):
+        filename = write(tmp_path, MIXED_OBJ)
+        vertices, triangles = g_mesh.load_obj(filename)
+        assert os.path.exists(g_mesh.cache_path(filename))
+
+        def fail(*args):
+            raise AssertionError("parsed again")
+        monkeypatch.setattr(g_mesh, 'read_obj', fail)
+        cached_vertices, cached_triangles = g_mesh.load_obj(filename)
+        assert np.array_equal(cached_vertices, vertices) and cached_vertices.dtype == np.float32
+        assert np.array_equal(cached_triangles, triangles) and cached_triangles.dtype == np.uint32
+        monkeypatch.undo()
+
+        write(tmp_path, "v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        vertices, triangles = g_mesh.load_obj(filename)
+        assert len(vertices) == 3 and triangles.tolist() == [[0, 1, 2]]
+
+    def test_without_cache(self, tmp_path):
+        filename = write(tmp_path, MIXED_OBJ)
+        g_mesh.load_obj(filename, cache=False)
+        assert not os.path.exists(g_mesh.cache_path(filename))
+
+    def test_corrupted_cache(self, tmp_path):
+        filename = write(tmp_path, MIXED_OBJ)
+        with open(g_mesh.cache_path(filename), 'wb') as f:
+            f.write(b'not an archive')
+        assert len(g_mesh.load_obj(filename)[1]) == 7
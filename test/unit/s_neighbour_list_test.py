@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import numpy as np
+import app.solver.model.neighbour_list as m_nl
+import app.solver.model.hash_table as m_hash
+import app.solver.model.particle as m_part
+import app.solver.model.kernel as m_kern
+import app.solver.model.fluid as m_fluid
+import app.solver.model.vector as m_vec
+
+import scene
+
+fl = m_fluid.Fluid(1, 1, 1, 1, 1, 1, 1)
+rng = np.random.RandomState(1)
+positions = rng.rand(40, 3) * 4
+
+hashing = m_hash.Hash(1, 100)
+particles = [m_part.ActiveParticle(hashing, m_vec.Vector(x), fl, 0.5) for x in positions]
+neighbours = m_nl.NeighbourList.from_particles(particles, lambda p: 2.)
+
+
+class TestNeighbourList:
+    def test_csr_layout(self):
+        nl = m_nl.NeighbourList.from_positions(positions, np.full(len(positions), 1.5))
+        assert len(nl) == len(positions)
+        assert nl.offsets[-1] == nl.pair_count
+        for k in range(len(nl)):
+            d = np.linalg.norm(positions - positions[k], axis=1)
+            assert list(nl.neighbours(k)) == list(np.flatnonzero(d < 1.5))
+        assert np.allclose(nl.r, positions[nl.owner] - positions[nl.indices])
+
+    def test_from_particles_matches_search(self):
+        for k, p in enumerate(particles):
+            expected = p.neighbour(2.)
+            assert sorted(id(n) for n in neighbours.neighbourhood(k)) == sorted(id(n) for n in expected)
+
+    def test_separation_vectors(self):
+        assert np.allclose(neighbours.r, positions[neighbours.owner] - positions[neighbours.indices])
+
+
+class TestNeighbourhood:
+    def test_force_reads_neighbour_list(self):
+        k = 3
+        p = particles[k]
+        force = m_part.ForceViscosity("f", m_kern.ViscosityKernel(1.5), m_vec.Vector([0, 0, 0]))
+        from_list = force(p, p.neighbour(2.)).copy()
+        from_neighbour_list = force(p, neighbours.neighbourhood(k))
+        assert np.allclose(from_list, from_neighbour_list)
+
+    def test_density_reads_neighbour_list(self):
+        k = 5
+        p = particles[k]
+        density = m_part.Density("d", m_kern.Poly6Kernel(1.5), 1)
+        density(p, p.neighbour(2.))
+        from_list = density.value
+        density(p, neighbours.neighbourhood(k))
+        assert np.isclose(from_list, density.value)
+
+
+class TestVerletList:
+    def test_same_pairs_as_fresh_search(self):
+        verlet = m_nl.VerletList(0.2)
+        radius = np.full(len(positions), 1.)
+        moving = positions.copy()
+        for step in range(5):
+            moving += 0.03
+            nl = verlet.neighbour_list(moving, radius)
+            fresh = m_nl.NeighbourList.from_positions(moving, radius)
+            assert list(nl.offsets) == list(fresh.offsets)
+            assert list(nl.indices) == list(fresh.indices)
+            assert np.allclose(nl.r, fresh.r)
+
+    def test_rebuild_on_displacement(self):
+        verlet = m_nl.VerletList(0.2)
+        radius = np.full(len(positions), 1.)
+        verlet.neighbour_list(positions, radius)
+        verlet.neighbour_list(positions + 0.05, radius)
+        assert verlet.builds == 1
+        verlet.neighbour_list(positions + 0.2, radius)
+        assert verlet.builds == 2
+        assert verlet.statistics['steps'] == 3
+        assert verlet.statistics['reused'] == 1
+
+    def test_skin_from_search_radius(self):
+        verlet = m_nl.VerletList()
+        verlet.neighbour_list(positions, np.full(len(positions), 2.))
+        assert verlet.skin == 0.2
+
+    def test_rebuild_on_new_key(self):
+        verlet = m_nl.VerletList(0.2)
+        radius = np.full(len(positions), 1.)
+        verlet.neighbour_list(positions, radius, key=1)
+        verlet.neighbour_list(positions, radius, key=2)
+        assert verlet.builds == 2
+
+
+    def test_object_path_keeps_the_list_across_migrations(self):
+        inside = 0.5 + scene.cloud(40, 0, 1.)
+
+        def run(verlet_skin):
+            h = m_hash.Hash(0.25, 40)
+            solve = scene.solver([], dt=0.001, particles=h, verlet_skin=verlet_skin)
+            created = scene.populate(solve, inside)
+            for step in range(5):
+                solve.step()
+            return solve, h, np.array([p.current_location.value for p in created])
+
+        _, _, expected = run(None)
+        solve, h, position = run(0.4)
+        # Particles changed bucket, hence row, without the list being rebuilt
+        assert h.statistics['total_migrations'] > 0
+        assert solve.verlet.builds == 1
+        assert np.array_equal(position, expected)
+
+
+class TestReordered:
+    def test_rows_renumbered_by_order(self):
+        position = np.random.RandomState(6).rand(30, 3)
+        neighbours = m_nl.NeighbourList.from_positions(position, np.full(30, 0.4))
+        order = np.random.RandomState(7).permutation(30)
+        reordered = neighbours.reordered(order, 10)
+        expected = m_nl.NeighbourList.from_positions(position[order], np.full(30, 0.4))
+        for k in range(10):
+            assert reordered.neighbours(k).tolist() == expected.neighbours(k).tolist()
+        assert all(len(reordered.neighbours(k)) == 0 for k in range(10, 30))
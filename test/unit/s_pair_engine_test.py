@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+import pytest
+import numpy as np
+import app.solver.model.neighbour_list as m_nl
+import app.solver.model.pair_engine as m_pair
+import app.solver.model.parallel as m_par
+import app.solver.model.particle_arrays as m_arr
+import app.solver.model.solver as m_solver
+import app.solver.model.fluid as m_fluid
+import app.solver.model.vector as m_vec
+
+from app.solver.conf import *
+
+import scene
+
+rng = np.random.RandomState(2)
+
+
+def make_state(n=150, radius=None, density=None):
+    position = rng.rand(n, 3) * 2
+    radius = np.full(n, 0.1) if radius is None else radius
+    mass = 4. / 3. * np.pi * radius ** 3 * scene.WATER.rho0
+    neighbours = m_nl.NeighbourList.from_positions(position, RADIUS_MULTIPLICATIVE * radius)
+    state = {'offsets': neighbours.offsets,
+             'owner': neighbours.owner,
+             'indices': neighbours.indices,
+             'r': neighbours.r,
+             'distance': neighbours.distance,
+             'radius': radius,
+             'search_radius': RADIUS_MULTIPLICATIVE * radius,
+             'mass': mass,
+             'velocity': rng.randn(n, 3),
+             'mu': np.full(n, scene.WATER.mu),
+             'sigma': np.full(n, scene.WATER.sigma),
+             'l': np.full(n, scene.WATER.l)}
+    state['density'] = m_pair.density(state) if density is None else density
+    state['pressure'] = (state['density'] - scene.WATER.rho0) * scene.WATER.k
+    return state
+
+
+class TestUnorderedPairs:
+    def test_every_pair_once(self):
+        state = make_state()
+        i, j, r, distance = m_pair.unordered_pairs(state)
+        keys = set(zip(np.minimum(i, j).tolist(), np.maximum(i, j).tolist()))
+        assert len(keys) == len(i)
+        assert 2 * len(i) == state['indices'].size - len(state['radius'])
+
+    def test_pairs_of_a_single_row(self):
+        # The large particle sees the small ones, which do not see it
+        radius = np.full(100, 0.01)
+        radius[0] = 0.2
+        state = make_state(100, radius, density=np.full(100, scene.WATER.rho0))
+        i, j, r, distance = m_pair.unordered_pairs(state)
+        keys = set(zip(np.minimum(i, j).tolist(), np.maximum(i, j).tolist()))
+        owner, indices = state['owner'], state['indices']
+        expected = {(min(a, b), max(a, b)) for a, b in zip(owner.tolist(), indices.tolist()) if a != b}
+        assert keys == expected
+        assert len(keys) == len(i)
+
+
+class TestSymmetricPhases:
+    def test_density_matches_row_phase(self):
+        state = make_state()
+        assert np.allclose(m_pair.density(state), m_par.density_rows(state, 0, len(state['radius'])), rtol=1e-12)
+
+    def test_forces_match_row_phase_at_uniform_density(self):
+        n = 150
+        state = make_state(n, density=np.full(n, scene.WATER.rho0))
+        state['pressure'] = rng.randn(n) * 10
+        assert np.allclose(m_pair.forces(state), m_par.force_rows(state, 0, n), rtol=1e-9, atol=1e-9)
+
+    def test_momentum_is_conserved(self):
+        state = make_state()
+        force = m_pair.pair_forces(state)
+        scale = np.abs(force).sum()
+        assert scale > 0
+        assert np.all(np.abs(force.sum(axis=0)) < 1e-12 * scale)
+
+    def test_momentum_is_conserved_with_mixed_radii(self):
+        state = make_state(120, rng.choice([0.05, 0.1, 0.15], 120))
+        force = m_pair.pair_forces(state)
+        assert np.all(np.abs(force.sum(axis=0)) < 1e-12 * np.abs(force).sum())
+
+
+class TestSymmetricStep:
+    def test_symmetric_requires_vectorized_step(self):
+        with pytest.raises(TypeError):
+            m_solver.SphSolver(1, 0.1, m_arr.ParticleArrays(), symmetric=True)
+
+    def test_step_conserves_momentum(self):
+        # Without surface tension, the resultant of the forces is the weight
+        water = m_fluid.Fluid(993.29, 0, 3.5, 0., 0.5, 3, 0.02)
+        store = scene.run(scene.cloud(100, 2), 1, collisions_objects=[], fluid=water, vectorized=True,
+                          symmetric=True).particles
+        weight = store.density.sum() * np.asarray(m_vec.Vector([0, 0, -9.8]))
+        assert np.allclose(store.force.sum(axis=0), weight, rtol=1e-12, atol=1e-9 * np.abs(store.force).sum())
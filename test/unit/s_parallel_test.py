@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+import pytest
+import numpy as np
+import app.solver.model.particle_arrays as m_arr
+import app.solver.model.parallel as m_par
+import app.solver.model.solver as m_solver
+
+import scene
+
+positions = scene.cloud(120, 1)
+
+
+def run(workers=None, executor="thread"):
+    return scene.run(positions, vectorized=True, workers=workers, executor=executor).particles
+
+
+@pytest.fixture(scope="module")
+def serial():
+    return run()
+
+
+class TestChunks:
+    def test_chunks_cover_rows(self):
+        assert m_par.chunks(10, 4) == [(0, 4), (4, 8), (8, 10)]
+        assert m_par.chunks(0, 4) == []
+
+    def test_chunks_are_not_smaller_than_group_by(self):
+        executor = m_par.PhaseExecutor(8, group_by=12)
+        assert executor.chunks(30) == [(0, 12), (12, 24), (24, 30)]
+        assert executor.chunks(200)[0] == (0, 25)
+
+    def test_unknown_executor(self):
+        with pytest.raises(ValueError):
+            m_par.PhaseExecutor(2, "cluster")
+
+
+class TestParallelStep:
+    def test_workers_require_vectorized_step(self):
+        with pytest.raises(TypeError):
+            m_solver.SphSolver(1, 0.1, m_arr.ParticleArrays(), workers=2)
+
+    @pytest.mark.parametrize("workers", [2, 3, 7])
+    def test_threads_are_deterministic(self, serial, workers):
+        store = run(workers)
+        assert np.array_equal(store.density, serial.density)
+        assert np.array_equal(store.velocity, serial.velocity)
+        assert np.array_equal(store.position, serial.position)
+
+    def test_processes_are_deterministic(self, serial):
+        store = run(3, "process")
+        assert np.array_equal(store.density, serial.density)
+        assert np.array_equal(store.velocity, serial.velocity)
+        assert np.array_equal(store.position, serial.position)
+
+
+class TestSharedMemory:
+    def test_publish_and_attach(self):
+        shared = m_par.SharedArrays()
+        try:
+            state = {'a': np.arange(6.).reshape(2, 3), 'i': np.arange(4), 'dt': 0.1}
+            descriptor, copied = shared.publish(state)
+            assert copied > state['a'].nbytes + state['i'].nbytes
+            # The values are only copied again when they change
+            descriptor, copied = shared.publish(state)
+            assert copied == state['a'].nbytes + state['i'].nbytes
+            attached = m_par.attach(descriptor)
+            assert np.array_equal(attached['a'], state['a'])
+            assert np.array_equal(attached['i'], state['i'])
+            assert attached['dt'] == 0.1
+            # Blocks are reused while the arrays fit, and grown otherwise
+            size = shared.nbytes
+            shared.publish({'a': np.ones((1, 3)), 'i': np.arange(2)})
+            assert shared.nbytes == size
+            descriptor, copied = shared.publish({'a': np.ones((10, 3)), 'i': np.arange(2)})
+            assert shared.nbytes > size
+            assert np.array_equal(m_par.attach(descriptor)['a'], np.ones((10, 3)))
+        finally:
+            shared.release()
+
+    def test_values_are_unpickled_once_per_change(self):
+        shared = m_par.SharedArrays()
+        try:
+            sphere = scene.tank()
+            descriptor, _ = shared.publish({'a': np.ones(3), 'collisions_objects': [sphere], 'dt': 0.1})
+            first = m_par.attach(descriptor)['collisions_objects'][0]
+            descriptor, _ = shared.publish({'a': np.ones(3), 'collisions_objects': [sphere], 'dt': 0.1})
+            assert m_par.attach(descriptor)['collisions_objects'][0] is first
+            descriptor, _ = shared.publish({'a': np.ones(3), 'collisions_objects': [sphere], 'dt': 0.2})
+            attached = m_par.attach(descriptor)
+            assert attached['dt'] == 0.2
+            assert attached['collisions_objects'][0] is not first
+        finally:
+            shared.release()
+
+    def test_release_at_garbage_collection(self):
+        shared = m_par.SharedArrays()
+        descriptor, _ = shared.publish({'a': np.ones(3)})
+        name = descriptor['arrays']['a'][0]
+        del shared
+        with pytest.raises(FileNotFoundError):
+            m_par.shared_memory.SharedMemory(name=name)
+
+    def test_only_descriptors_are_sent(self):
+        ipc = scene.run(positions, steps=1, vectorized=True, workers=3, executor="process").ipc_statistics
+        assert ipc['tasks'] > 0
+        assert ipc['shared_bytes'] > 0
+        # The neighbour list alone is larger than every descriptor sent
+        assert ipc['sent_bytes'] < ipc['shared_bytes'] / 2
+        assert ipc['sent_bytes'] / ipc['tasks'] < 4096
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import math
+import pytest
+import numpy as np
+import app.solver.model.particle_arrays as m_arr
+import app.solver.model.hash_table as m_hash
+import app.solver.model.particle as m_part
+import app.solver.model.solver as m_solver
+import app.solver.model.fluid as m_fluid
+import app.solver.model.vector as m_vec
+
+fl = m_fluid.Fluid(1000, 0, 1, 1, 1, 3, 0.5)
+
+
+def make_store(n):
+    store = m_arr.ParticleArrays(capacity=2)
+    for i in range(n):
+        store.append(m_vec.Vector([i, 0, 0]), fl, 0.5, speed=m_vec.Vector([0, 0, i]))
+    return store
+
+
+class TestParticleArrays:
+    def test_append_grows_capacity(self):
+        store = make_store(5)
+        assert len(store) == 5
+        assert store.capacity >= 5
+        assert store.position.shape == (5, 3)
+        assert store.position.dtype == np.float64
+        assert store.velocity[4][2] == 4
+
+    def test_mass_is_sphere_volume_times_rest_density(self):
+        store = make_store(1)
+        assert store.mass[0] == pytest.approx(4. / 3. * math.pi * 0.5 ** 3 * 1000)
+
+    def test_columns_are_views(self):
+        store = make_store(3)
+        store.position[1] += 1
+        assert store.position[1][0] == 2
+
+    def test_remove_moves_last_row(self):
+        store = make_store(3)
+        store.remove(0)
+        assert len(store) == 2
+        assert store.position[0][0] == 2
+
+    def test_remove_raise_index_error(self):
+        with pytest.raises(IndexError):
+            make_store(1).remove(3)
+
+    def test_fluid_property(self):
+        store = make_store(3)
+        assert list(store.fluid_property('k')) == [3, 3, 3]
+        assert store.fluid(0) is fl
+
+    def test_neighbour(self):
+        store = make_store(4)
+        assert list(store.neighbour(1, 1.5)) == [0, 1, 2]
+
+    def test_from_hash(self):
+        hashing = m_hash.Hash(1, 10)
+        m_part.ActiveParticle(hashing, m_vec.Vector([1, 2, 3]), fl, 1.)
+        store = m_arr.ParticleArrays.from_hash(hashing)
+        assert len(store) == 1
+        assert list(store.position[0]) == [1, 2, 3]
+
+
+class TestSolverOnParticleArrays:
+    def test_step_applies_gravity(self):
+        store = m_arr.ParticleArrays()
+        solve = m_solver.SphSolver(1, 0.1, store)
+        solve.create_active_particle(m_vec.Vector([0, 0, 0]), fl, 0.5)
+        solve.step()
+        assert store.velocity[0][2] < 0
+        assert store.position[0][2] < 0
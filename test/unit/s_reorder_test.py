@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import numpy as np
+import pytest
+
+import app.solver.model.reorder as m_ord
+import app.solver.model.hash_table as m_hash
+import app.solver.model.solver as m_solver
+
+import scene
+
+
+def scattered(n=400, seed=3):
+    return np.random.RandomState(seed).rand(n, 3) * 4 - 1
+
+
+class TestMortonOrder:
+    def test_sorted_rows_are_local(self):
+        position = scattered()
+        order = m_ord.morton_order(position, 0.5)
+        assert sorted(order) == list(range(len(position)))
+        assert m_ord.locality(position[order], 0.5) < m_ord.locality(position, 0.5) / 2
+
+    def test_cells_follow_the_z_curve(self):
+        position = np.array([[1.5, 1.5, 0.5], [0.5, 0.5, 0.5], [0.5, 1.5, 0.5], [1.5, 0.5, 0.5]])
+        assert list(m_ord.morton_order(position, 1.)) == [1, 3, 2, 0]
+
+
+class TestMortonReorder:
+    def test_period(self):
+        reorder = m_ord.MortonReorder(every=3)
+        position = scattered(50)
+        done = [reorder.order(position, 0.5) is not None for k in range(7)]
+        assert done == [True, False, False, True, False, False, True]
+        assert reorder.statistics['reorders'] == 3
+
+    def test_degradation(self):
+        reorder = m_ord.MortonReorder(every=None, degradation=1.5)
+        position = scattered(50)
+        order = reorder.order(position, 0.5)
+        position = position[order]
+        assert reorder.order(position, 0.5) is None
+        assert reorder.order(position[::-1][np.random.RandomState(0).permutation(50)], 0.5) is not None
+
+    def test_origin(self):
+        reorder = m_ord.MortonReorder(every=1)
+        position = scattered(50)
+        first = reorder.order(position, 0.5)
+        second = reorder.order(position[first] + 1.3, 0.5)
+        assert np.array_equal(reorder.origin, first[second])
+
+    def test_needs_a_criterion(self):
+        with pytest.raises(ValueError):
+            m_ord.MortonReorder(every=None)
+
+
+class TestSolverReorder:
+    def test_requires_particle_arrays(self):
+        with pytest.raises(TypeError):
+            m_solver.SphSolver(1, 0.1, m_hash.Hash(1, 10), reorder=5)
+
+    @pytest.mark.parametrize("vectorized, integrator", [(True, "euler"), (True, "leapfrog"), (False, "euler")])
+    def test_same_trajectories(self, vectorized, integrator):
+        positions = scattered(80, 8) / 2
+        solvers = [scene.run(positions, dt=0.005, collisions_objects=[scene.tank(1.5, (0.75, 0.75, 0.75))],
+                             vectorized=vectorized, verlet_skin=True, integrator=integrator, reorder=reorder)
+                   for reorder in (None, 1)]
+        stores = [solve.particles for solve in solvers]
+        origin = solvers[1].reorder.origin
+        assert solvers[1].reorder.statistics['reorders'] == 3
+        assert np.allclose(stores[0].position[origin], stores[1].position, rtol=1e-9, atol=1e-9)
+        assert np.allclose(stores[0].velocity[origin], stores[1].velocity, rtol=1e-9, atol=1e-9)
+        assert solvers[0].integrator.evaluations == solvers[1].integrator.evaluations
+        assert solvers[1].verlet.builds == solvers[0].verlet.builds
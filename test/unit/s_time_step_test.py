@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+import math
+
+import pytest
+import numpy as np
+import app.solver.model.time_step as m_ts
+import app.solver.model.particle_arrays as m_arr
+import app.solver.model.solver as m_solver
+
+import scene
+
+
+def state(speed=1., acceleration=4., nu=1e-3):
+    h = np.array([0.3, 0.6])
+    u = np.array([[speed, 0, 0], [0, 0, 0]])
+    a = np.array([[0, acceleration, 0], [0, 0, 0]])
+    return h, u, a, np.full(2, nu), np.full(2, 2.)
+
+
+class TestAdaptiveTimeStep:
+    def test_criteria(self):
+        criteria = m_ts.AdaptiveTimeStep(cfl=1., force=1., viscous=1.).criteria(*state())
+        assert criteria['cfl'] == pytest.approx(0.3 / 3.)
+        assert criteria['force'] == pytest.approx(math.sqrt(0.3 / 4.))
+        assert criteria['viscous'] == pytest.approx(0.09 / 1e-3)
+
+    def test_smallest_criterion_with_safety(self):
+        time_step = m_ts.AdaptiveTimeStep(safety=0.5, dt_max=1.)
+        assert time_step(*state()) == pytest.approx(0.5 * 0.4 * 0.1)
+        assert time_step.statistics['limited_by']['cfl'] == 1
+
+    def test_force_criterion(self):
+        time_step = m_ts.AdaptiveTimeStep(dt_max=1.)
+        assert time_step(*state(acceleration=1e4)) == pytest.approx(0.25 * math.sqrt(0.3 / 1e4))
+        assert time_step.statistics['limited_by']['force'] == 1
+
+    def test_clamps(self):
+        time_step = m_ts.AdaptiveTimeStep(dt_min=1e-4)
+        assert time_step(*state(speed=1e6)) == 1e-4
+        assert time_step(*state(speed=0.), dt_max=1e-3) == 1e-3
+        statistics = time_step.statistics
+        assert statistics['limited_by']['dt_min'] == statistics['limited_by']['dt_max'] == 1
+        assert statistics['smallest'] == 1e-4
+        assert statistics['largest'] == 1e-3
+
+    def test_particles_at_rest(self):
+        h, u, a, nu, c = state(speed=0., acceleration=0.)
+        assert m_ts.AdaptiveTimeStep().criteria(h, u, a, nu, c)['force'] == math.inf
+        assert m_ts.AdaptiveTimeStep()(np.zeros(0), np.zeros((0, 3)), np.zeros((0, 3)), np.zeros(0), np.zeros(0),
+                                       dt_max=0.1) == 0.1
+
+
+class TestAdaptiveSolver:
+    def run(self, adaptive, dt):
+        solve = scene.solver(scene.cloud(100, 4), 0.05, dt, collisions_objects=[scene.tank(1.5)], vectorized=True,
+                             adaptive=adaptive)
+        return solve, scene.advance(solve)
+
+    def test_driver_reaches_tt(self):
+        solve, steps = self.run(True, 0.01)
+        assert solve.t == pytest.approx(solve.tt)
+        assert max(steps) <= 0.01
+        assert solve.time_step.statistics['steps'] == len(steps)
+
+    def test_fewer_steps_than_the_smallest_fixed_dt(self):
+        solve, steps = self.run(True, 0.01)
+        assert len(steps) < solve.tt / min(steps)
+
+    def test_fixed_dt_by_default(self):
+        solve, steps = self.run(None, 0.01)
+        assert solve.time_step is None
+        assert steps == [0.01] * len(steps)
+
+
+class TestBlockTimeStep:
+    def test_levels(self):
+        block = m_ts.BlockTimeStep(3)
+        levels = block.levels(np.array([1., 0.5, 0.3, 0.01, 2.]), 1.)
+        assert levels.tolist() == [0, 1, 2, 3, 0]
+
+    def test_active(self):
+        levels = np.array([0, 1, 2])
+        pattern = [m_ts.BlockTimeStep.active(levels, s).tolist() for s in range(4)]
+        assert pattern == [[True, True, True], [False, False, True], [False, True, True], [False, False, True]]
+
+    def test_record(self):
+        block = m_ts.BlockTimeStep(2)
+        block.record(np.array([0, 2, 2]), 9)
+        statistics = block.statistics
+        assert statistics['global_updates'] == 12
+        assert statistics['saved'] == 3
+        assert statistics['levels'] == [1, 0, 2]
+
+
+class TestBlockSolver:
+    def run(self, **kwargs):
+        # Three fast particles among particles at rest
+        speeds = np.zeros((100, 3))
+        speeds[:3, 2] = 30.
+        solve = scene.solver(scene.cloud(100, 5), 0.03, 0.01, collisions_objects=[scene.tank(1.5)], speeds=speeds,
+                             vectorized=True, **kwargs)
+        scene.advance(solve)
+        return solve, solve.particles
+
+    def test_requires_vectorized_step(self):
+        with pytest.raises(TypeError):
+            m_solver.SphSolver(1, 0.1, m_arr.ParticleArrays(), block_levels=2)
+
+    def test_single_level_is_the_vectorized_step(self):
+        reference = self.run()[1]
+        solve, store = self.run(block_levels=0)
+        assert np.array_equal(store.position, reference.position)
+        assert np.array_equal(store.velocity, reference.velocity)
+        assert solve.block.statistics['saved'] == 0
+
+    def test_updates_saved_and_reproducible(self):
+        solve, store = self.run(block_levels=5)
+        statistics = solve.block.statistics
+        assert statistics['blocks'] == 3
+        assert statistics['sub_steps'] > 3
+        assert 0 < statistics['saved'] < statistics['global_updates']
+        assert statistics['updates'] + statistics['saved'] == statistics['global_updates']
+        other, again = self.run(block_levels=5)
+        assert np.array_equal(store.position, again.position)
+        assert other.block.statistics == statistics
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import numpy as np
+import pytest
+
+import app.solver.model.tree_search as m_tree
+import app.solver.model.cell_grid as m_grid
+import app.solver.model.hash_table as m_hash
+import app.solver.model.neighbour_list as m_nl
+import app.solver.model.particle as m_part
+import app.solver.model.solver as m_solver
+import app.solver.model.vector as m_vec
+
+import scene
+
+
+def spray(n=300, seed=4):
+    """
+    A dense block of particles and a few drops far from it, with radii varying by a factor 10.
+    """
+    rng = np.random.RandomState(seed)
+    position = np.concatenate((rng.rand(n, 3), rng.rand(10, 3) * 50 + 20))
+    search_radius = rng.uniform(0.05, 0.5, len(position))
+    return position, search_radius
+
+
+def sweep(monkeypatch):
+    monkeypatch.setattr(m_tree, "cKDTree", None)
+
+
+class TestNeighbourPairs:
+    @pytest.mark.parametrize("scipy", [True, False])
+    def test_same_pairs_as_the_grid(self, scipy, monkeypatch):
+        if not scipy:
+            sweep(monkeypatch)
+        position, search_radius = spray()
+        grid = m_grid.CellGrid(float(search_radius.max()))
+        grid.build(position)
+        tree = m_tree.TreeNeighbourSearch()
+        tree.build(position)
+        for a, b in zip(grid.neighbour_pairs(search_radius), tree.neighbour_pairs(search_radius)):
+            assert np.array_equal(a, b)
+
+    def test_neighbour_list_backends(self):
+        position, search_radius = spray()
+        grid = m_nl.NeighbourList.from_positions(position, search_radius, "grid")
+        for backend in ("tree", "auto"):
+            tree = m_nl.NeighbourList.from_positions(position, search_radius, backend)
+            assert np.array_equal(grid.offsets, tree.offsets)
+            assert np.array_equal(grid.indices, tree.indices)
+        with pytest.raises(ValueError):
+            m_nl.NeighbourList.from_positions(position, search_radius, "octree")
+
+
+class TestChoose:
+    def test_dense_uniform_particles_use_the_grid(self):
+        position = np.mgrid[0:10, 0:10, 0:10].reshape(3, -1).T * 0.1
+        assert m_tree.choose(position, np.full(len(position), 0.25)) == 'grid'
+
+    def test_spray_uses_the_tree(self):
+        position, search_radius = spray()
+        statistics = m_tree.occupancy(position, search_radius)
+        assert statistics['radius_ratio'] > m_tree.RADIUS_RATIO
+        assert m_tree.choose(position, search_radius) == 'tree'
+        assert m_tree.choose(position, np.full(len(position), 0.25)) == 'tree'
+
+
+class TestHashSurface:
+    @pytest.mark.parametrize("scipy", [True, False])
+    def test_search(self, scipy, monkeypatch):
+        if not scipy:
+            sweep(monkeypatch)
+        tree = m_tree.TreeNeighbourSearch()
+        particles = [m_part.ActiveParticle(tree, m_vec.Vector(x), scene.WATER, 1)
+                     for x in ([0, 0, 0], [0.9, 0.9, 0], [0.5, 0, 0], [3, 0, 0])]
+        assert set(tree.search(particles[0], 1., approx=True)) == set(particles[:3])
+        assert set(tree.search(particles[0], 1., approx=False)) == {particles[0], particles[2]}
+
+        particles[3].current_location.value = m_vec.Vector([0.2, 0.2, 0.2])
+        tree.rebin()
+        assert particles[3] in tree.search(particles[0], 1., approx=False)
+        tree.remove(particles[2])
+        assert particles[2] not in tree.search(particles[0], 1., approx=False)
+        with pytest.raises(ValueError):
+            tree.remove(particles[2])
+
+
+class TestSolverBackend:
+    def test_requires_particle_arrays(self):
+        with pytest.raises(TypeError):
+            m_solver.SphSolver(1, 0.1, m_hash.Hash(1, 10), neighbour_search="tree")
+
+    def test_same_step(self):
+        position, _ = spray(60)
+        stores = []
+        for backend in ("grid", "tree", "auto"):
+            solve = scene.run(position, 1, dt=0.005, collisions_objects=[], radius=0.05, vectorized=True,
+                              neighbour_search=backend)
+            stores.append(solve.particles)
+            assert solve.neighbour_backend == ("tree" if backend == "auto" else backend)
+        assert np.array_equal(stores[0].position, stores[1].position)
+        assert np.array_equal(stores[0].position, stores[2].position)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+import math
+
+import numpy as np
+import pytest
+
+import app.solver.model.kernel as m_kern
+import app.solver.model.vector as m_vec
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    return m_vec.Vec3(1., 2., 3.), m_vec.Vector([1., 2., 3.]), m_vec.Vec3(-2., .5, 4.), m_vec.Vector([-2., .5, 4.])
+
+
+class TestVec3:
+    def test_construction(self):
+        assert tuple(m_vec.Vec3()) == (0., 0., 0.)
+        assert tuple(m_vec.Vec3([1, 2, 3])) == (1., 2., 3.)
+        assert tuple(m_vec.Vec3(m_vec.Vec3(1, 2, 3))) == (1., 2., 3.)
+        with pytest.raises(TypeError):
+            m_vec.Vec3(1, 2)
+
+    def test_no_instance_dict(self):
+        a = m_vec.Vec3(1, 2, 3)
+        assert not hasattr(a, '__dict__')
+        with pytest.raises(AttributeError):
+            a.w = 1
+
+    def test_components(self):
+        a = m_vec.Vec3(1, 2, 3)
+        assert (a.x, a.y, a.z) == (a[0], a[1], a[2]) == (1., 2., 3.)
+        a[1] = 5
+        a.z = 7
+        assert tuple(a) == (1., 5., 7.)
+        assert len(a) == 3
+
+    def test_arithmetic_matches_vector(self, vectors):
+        a, va, b, vb = vectors
+        assert np.allclose(tuple(a + b), va + vb)
+        assert np.allclose(tuple(a - b), va - vb)
+        assert np.allclose(tuple(-a), -va)
+        assert np.allclose(tuple(2 * a), 2 * va)
+        assert np.allclose(tuple(a * 2), va * 2)
+        assert np.allclose(tuple(a / 2), va / 2)
+        assert a * b == pytest.approx(va * vb)
+        assert a ** 2 == pytest.approx(va * va)
+
+    def test_operators_return_vec3(self, vectors):
+        a, va, b, vb = vectors
+        for result in (a + b, a - b, (1, 1, 1) - a, -a, 2 * a, a * 2, a / 2, a.cross(b), a.copy(),
+                       m_vec.Vec3._make(1., 2., 3.)):
+            assert type(result) is m_vec.Vec3
+            assert not hasattr(result, '__dict__')
+            assert all(isinstance(c, float) for c in result)
+        c = a.copy()
+        c.x = 10.
+        assert a.x == 1.
+
+    def test_numpy_operands_give_vec3(self, vectors):
+        a, va, b, vb = vectors
+        for result, expected in ((np.float64(2) * a, 2 * va), (a * np.float64(2), va * 2),
+                                 (np.array([1., 1., 1.]) + a, va + 1), (np.array([1., 1., 1.]) - a, 1 - va),
+                                 (a / np.float64(2), va / 2), (-np.float64(0.5) * 4 * a, -2 * va)):
+            assert type(result) is m_vec.Vec3
+            assert np.allclose(tuple(result), expected)
+        # As for Vector, the product with an array is the dot product
+        assert np.array([1., 0., 2.]) * a == pytest.approx(7.)
+        assert a * np.array([1., 0., 2.]) == pytest.approx(7.)
+        assert vb * a == pytest.approx(vb * va)
+        c = m_vec.Vec3(a)
+        c += np.array([1., 1., 1.])
+        assert type(c) is m_vec.Vec3 and tuple(c) == (2., 3., 4.)
+
+    def test_in_place(self):
+        a = m_vec.Vec3(1, 2, 3)
+        b = a
+        a += m_vec.Vec3(1, 1, 1)
+        a -= (0, 1, 0)
+        a *= 2
+        assert a is b
+        assert tuple(a) == (4., 4., 8.)
+
+    def test_geometry_matches_vector(self, vectors):
+        a, va, b, vb = vectors
+        assert a.norm() == pytest.approx(va.norm())
+        assert a.dot(b) == pytest.approx(m_vec.dot(va, vb))
+        assert np.allclose(tuple(a.cross(b)), m_vec.cross(va, vb))
+        assert np.allclose(tuple(m_vec.cross(a, b)), m_vec.cross(va, vb))
+        assert m_vec.dot(a, b) == pytest.approx(m_vec.dot(va, vb))
+        assert np.allclose(a.get_spherical(), va.get_spherical())
+        assert np.allclose(a.get_cylindrical(), va.get_cylindrical())
+        assert a.a_max() == 3.
+
+    def test_spherical_round_trip(self):
+        a = m_vec.Vec3()
+        a.set_spherical(2., math.pi / 3, math.pi / 4)
+        assert np.allclose(a.get_spherical(), (2., math.pi / 3, math.pi / 4))
+        a.set_cylindrical(1., math.pi / 2, 3.)
+        assert a == m_vec.Vec3(0., 1., 3.)
+
+    def test_equality(self):
+        assert m_vec.Vec3(1, 2, 3) == m_vec.Vec3(1, 2, 3)
+        assert m_vec.Vec3(1, 2, 3) != m_vec.Vec3(1, 2, 3.1)
+
+
+class TestConversion:
+    def test_round_trip(self):
+        array = np.arange(12, dtype=np.float64).reshape(4, 3)
+        vectors = m_vec.from_array(array)
+        assert all(isinstance(v, m_vec.Vec3) for v in vectors)
+        assert np.array_equal(m_vec.to_array(vectors), array)
+
+    def test_mixed_and_empty(self):
+        array = m_vec.to_array([m_vec.Vec3(1, 2, 3), m_vec.Vector([4, 5, 6]), (7, 8, 9)])
+        assert array.shape == (3, 3)
+        assert array[2, 2] == 9.
+        assert m_vec.to_array([]).shape == (0, 3)
+        assert m_vec.from_array(np.zeros((0, 3))) == []
+
+
+class TestKernels:
+    @pytest.mark.parametrize("kernel_class", [m_kern.Poly6Kernel, m_kern.SpikyKernel, m_kern.ViscosityKernel])
+    def test_vec3_matches_vector(self, kernel_class):
+        kernel = kernel_class(1.)
+        r, vr = m_vec.Vec3(.1, .2, .3), m_vec.Vector([.1, .2, .3])
+        assert kernel(r) == pytest.approx(kernel(vr))
+        assert kernel.laplacian(r) == pytest.approx(kernel.laplacian(vr))
+        gradient = kernel.gradient(r)
+        assert isinstance(gradient, m_vec.Vec3)
+        assert np.allclose(tuple(gradient), kernel.gradient(vr))
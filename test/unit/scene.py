@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = "Clément Eberhardt," \
+             "Clément Léost," \
+             "Benoit Picq," \
+             "Théo Subtil" \
+             " and Tycho Tatitscheff"
+__copyright__ = "Copyright 2014, DucSph"
+__credits__ = ["Clément Eberhardt",
+               "Clément Léost",
+               "Benoit Picq",
+               "Théo Subtil",
+               "Tycho Tatitscheff"]
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Tycho Tatitscheff"
+__email__ = "tycho.tatitscheff@ensam.eu"
+__status__ = "Production"
+
+
+
+'''
+Scene shared by the solver tests : particles of water at random locations of [0, 2)^3, in a spherical tank.
+'''
+
+import numpy as np
+
+import app.solver.model.collision as m_col
+import app.solver.model.fluid as m_fluid
+import app.solver.model.particle_arrays as m_arr
+import app.solver.model.solver as m_solver
+import app.solver.model.vector as m_vec
+
+WATER = m_fluid.Fluid(993.29, 0, 3.5, .0728, 0.5, 3, 0.02)
+RADIUS = 0.1
+
+
+def cloud(n, seed, scale=2.):
+    """
+    n random locations in [0, scale)^3.
+    """
+    return np.random.RandomState(seed).rand(n, 3) * scale
+
+
+def tank(radius=1.2, center=(1, 1, 1)):
+    """
+    Containing sphere around the cloud.
+    """
+    return m_col.Sphere(m_vec.Vector(list(center)), radius)
+
+
+def store(positions, fluid=WATER, radius=RADIUS):
+    """
+    ParticleArrays of a particle at every location.
+    """
+    particles = m_arr.ParticleArrays()
+    for x in positions:
+        particles.append(x, fluid, radius)
+    return particles
+
+
+def populate(solve, positions, fluid=WATER, radius=RADIUS, speeds=None):
+    """
+    Create a particle at every location, at rest or at the speeds given, and return them.
+    """
+    created = []
+    for k, x in enumerate(positions):
+        speed = m_vec.Vector([0, 0, 0]) if speeds is None else m_vec.Vector(speeds[k])
+        created.append(solve.create_active_particle(m_vec.Vector(x), fluid, radius, speed=speed))
+    return created
+
+
+def solver(positions, tt=1, dt=0.01, particles=None, collisions_objects=None, fluid=WATER, radius=RADIUS,
+           speeds=None, **kwargs):
+    """
+    SphSolver of a particle at every location, in a new ParticleArrays and the tank by default.
+
+        :param kwargs: other arguments of the solver
+    """
+    particles = m_arr.ParticleArrays() if particles is None else particles
+    collisions_objects = [tank()] if collisions_objects is None else collisions_objects
+    solve = m_solver.SphSolver(tt, dt, particles, collisions_objects, **kwargs)
+    populate(solve, positions, fluid, radius, speeds)
+    return solve
+
+
+def run(positions, steps=3, **kwargs):
+    """
+    steps steps of solver(positions, **kwargs), whose workers are stopped afterwards.
+
+        :return: the solver
+    """
+    solve = solver(positions, **kwargs)
+    try:
+        for k in range(steps):
+            solve.step()
+    finally:
+        solve.shutdown()
+    return solve
+
+
+def advance(solve):
+    """
+    Step solve until its total time, as the driver does.
+
+        :return: the time steps
+    """
+    steps = []
+    while solve.t < solve.tt - 1e-12:
+        solve.step()
+        steps.append(solve.dt)
+        solve.t += solve.dt
+    return steps